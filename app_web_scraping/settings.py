@@ -93,6 +93,137 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Cache of scraping results (see blog/src/scripts/result_cache.py). With 'memory', each worker keeps
+# its own LRU cache of at most MAX_BYTES bytes. With 'django', results are stored in the CACHES entry
+# named CACHE_ALIAS, which can be shared by all workers (e.g. with a file or memcached backend).
+# Results are fresh during TTL seconds, then served during STALE_TTL more seconds when a website cannot
+# be scraped (throttled, or unavailable).
+
+SCRAPER_RESULT_CACHE = {
+    'BACKEND': 'memory',
+    'TTL': 600,
+    'STALE_TTL': 3600,
+    'MAX_BYTES': 32 * 1024 * 1024,
+    'CACHE_ALIAS': 'default',
+}
+
+# Persistent cache of data scraped on eBay item pages (see blog/src/scripts/item_cache.py). Entries
+# are used for TTL seconds, then revalidated with ETag/Last-Modified conditional requests. The database
+# is stored in the user's cache directory, outside of the source tree.
+
+SCRAPER_ITEM_CACHE = {
+    'ENABLED': True,
+    'PATH': Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'app_web_scraping' / 'item_cache.sqlite3',
+    'TTL': 24 * 3600,
+}
+
+# Parsing of eBay item pages in a pool of MAX_WORKERS processes (see blog/src/scripts/parser_pool.py),
+# one per core if None, instead of the scraping threads whose parsing is serialized by the GIL.
+
+SCRAPER_PARSER_POOL = {
+    'ENABLED': False,
+    'MAX_WORKERS': None,
+}
+
+# Scraping jobs submitted by the page run in MAX_WORKERS background threads (see blog/jobs.py),
+# finished jobs can be polled during RETENTION seconds.
+
+SCRAPER_JOBS = {
+    'MAX_WORKERS': 4,
+    'RETENTION': 3600,
+}
+
+# Search on all websites at once ('all' option, see blog/src/scripts/merging.py). Prices are converted
+# to dollars with CURRENCY_RATES (value of a unit of each currency in dollars), and merged items are
+# ranked by SCORE_FUNCTION (dotted path of a function(items, user_input) -> list of floats, items being
+# records.ItemRecord objects, the higher the better), merging.default_score if None.
+
+SCRAPER_FAN_OUT = {
+    'CURRENCY_RATES': {'USD': 1.0, 'EUR': 1.08},
+    'SCORE_FUNCTION': None,
+}
+
+# Store of scraped listings in the ScrapedListing table (see blog/listings.py). Listings are written
+# by a background thread, at most BATCH_SIZE per query, and dropped when MAX_PENDING scrapings (each
+# streamed item counting as one) are already waiting to be written.
+
+SCRAPER_LISTING_STORE = {
+    'ENABLED': True,
+    'BATCH_SIZE': 500,
+    'MAX_PENDING': 1000,
+}
+
+# JSON API running batches of at most MAX_QUERIES queries (see blog/api.py).
+
+SCRAPER_API = {
+    'MAX_QUERIES': 50,
+}
+
+# Background refresh of the cached results of popular queries (see blog/warming.py). Every INTERVAL
+# seconds, the TOP_N queries most submitted during the last WINDOW seconds are scraped again (MAX_WORKERS
+# at a time) if their cached result expires within REFRESH_MARGIN seconds. With IN_PROCESS, the warmer
+# runs in a thread of the web process, started by the first submitted query; otherwise run the
+# warm_cache command. Both need the 'django' backend of SCRAPER_RESULT_CACHE, shared by the workers.
+# Submitted queries are written by a background thread, and dropped when MAX_PENDING_QUERIES queries
+# are already waiting to be written.
+
+SCRAPER_CACHE_WARMER = {
+    'ENABLED': False,
+    'IN_PROCESS': True,
+    'TOP_N': 20,
+    'MAX_WORKERS': 2,
+    'INTERVAL': 60,
+    'REFRESH_MARGIN': 180,
+    'WINDOW': 7 * 24 * 3600,
+    'MAX_PENDING_QUERIES': 1000,
+}
+
+# Tables of results rendered for the page and the results view (see blog/fragments.py), cached TIMEOUT
+# seconds in the CACHES entry named CACHE_ALIAS. Fresh results get an ETag and can be kept MAX_AGE
+# seconds by browsers and proxies, which then revalidate them with conditional requests.
+
+SCRAPER_RESULTS_TABLE = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 600,
+    'MAX_AGE': 60,
+}
+
+# Import of the scraping stack (pandas, bs4, requests...) when Django starts (see blog/apps.py), rather
+# than by the first query of each worker. With a server importing the application before forking its
+# workers (e.g. gunicorn --preload), the workers share these modules instead of each importing them.
+# Set SCRAPER_PRELOAD=1 to enable it.
+
+SCRAPER_PRELOAD = {
+    'ENABLED': os.environ.get('SCRAPER_PRELOAD') == '1',
+}
+
+# Logging of the scraping scripts (loggers 'blog.*'). Set SCRAPER_LOG_LEVEL=DEBUG to log each page
+# and scraped item, debug messages are not formatted at all with the default level.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{asctime} {levelname} {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'blog': {'handlers': ['console'], 'level': os.environ.get('SCRAPER_LOG_LEVEL', 'INFO')},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
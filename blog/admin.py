@@ -1,6 +1,13 @@
 from django.contrib import admin
 
-from .models import UserInput
+from .models import ScrapedListing, UserInput
 
 # Register your models here.
 admin.site.register(UserInput)
+
+
+@admin.register(ScrapedListing)
+class ScrapedListingAdmin(admin.ModelAdmin):
+    list_display = ('title', 'website', 'query', 'price_dollars', 'nb_items_sold', 'scraped_at')
+    list_filter = ('website',)
+    search_fields = ('title', 'query')
@@ -0,0 +1,129 @@
+"""
+Bulk queries of the JSON API: a batch of queries is validated, scheduled on the job queue (so that a
+query already in flight, in this batch or in another request, is scraped once, and all scrapings
+share the connection pools of the fetcher), and the result of each query is yielded as soon as its
+job is finished.
+"""
+import json
+import time
+from concurrent.futures import as_completed
+from typing import Any, Iterator
+
+from django.conf import settings
+
+from .forms import UserInputForm
+from .jobs import DONE, Job, get_job_queue
+from .src.scripts.result_cache import get_result_cache
+from .warming import record_query
+
+# Columns of the rows returned for each query (other columns of the results are left out)
+RESULT_COLUMNS: tuple[str, ...] = ('index', 'website', 'title', 'price_dollars', 'rating_avg',
+                                   'positive_feedback_percentage', 'nb_items_sold', 'item_url')
+
+
+class InvalidQueriesError(ValueError):
+    """Raised when the body of a bulk request is not a valid batch of queries."""
+
+    def __init__(self, errors: dict[str, Any]) -> None:
+        super().__init__(json.dumps(errors))
+        self.errors = errors
+
+
+def parse_queries(body: bytes) -> list[tuple[str, str]]:
+    """
+    Parses the body of a bulk request: {"queries": [{"website": "ebay", "query": "iphone"}, ...]}.
+    Websites and queries are validated with UserInputForm, like the queries of the page.
+    :param body: JSON body of the request
+    :return: list of (website, user input) tuples, in request order
+    :raise InvalidQueriesError: if the body or one of its queries is invalid
+    """
+    try:
+        queries = json.loads(body)['queries']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidQueriesError({'body': 'Expected a JSON object with a "queries" list'})
+    max_queries = getattr(settings, 'SCRAPER_API', {}).get('MAX_QUERIES', 50)
+    if not isinstance(queries, list) or not 0 < len(queries) <= max_queries:
+        raise InvalidQueriesError({'queries': f'Expected a list of 1 to {max_queries} queries'})
+    parsed = []
+    errors = {}
+    for i, query in enumerate(queries):
+        form = UserInputForm({'option': query.get('website'), 'text_input': query.get('query')}
+                             if isinstance(query, dict) else {})
+        if form.is_valid():
+            parsed.append((form.cleaned_data['option'], form.cleaned_data['text_input']))
+        else:
+            errors[str(i)] = form.errors
+    if errors:
+        raise InvalidQueriesError({'queries': errors})
+    return parsed
+
+
+def compact_rows(output: list[dict[str, Any]] | None) -> list[dict[str, Any]]:
+    """Keeps the RESULT_COLUMNS of result records."""
+    return [{column: row[column] for column in RESULT_COLUMNS if column in row} for row in output or []]
+
+
+def job_to_result(job: Job, cached: bool) -> dict[str, Any]:
+    """
+    Converts a finished job to the result of a query.
+    :param job: finished job
+    :param cached: True if the result of the query was cached when it was submitted
+    :return: JSON serializable dict
+    """
+    result = {
+        'website': job.website,
+        'query': job.user_input,
+        'status': job.status,
+        'cached': cached,
+        'stale': bool(job.attrs.get('stale')),
+        'duration_ms': round((job.finished_at - job.created_at) * 1000, 1),
+    }
+    if 'failed_websites' in job.attrs:
+        result['failed_websites'] = job.attrs['failed_websites']
+    if job.status == DONE:
+        result['results'] = compact_rows(job.output)
+    else:
+        result['error'] = job.error
+    return result
+
+
+def is_cached(website: str, user_input: str) -> bool:
+    """True if the result of a query is cached and fresh (for all websites, if website is 'all')."""
+    from .src import main
+
+    cache = get_result_cache()
+    websites = main.SCRAPING_FUNCTIONS if website == main.ALL_WEBSITES else [website]
+    return all((cache.get_expiration(name, user_input) or 0) > 0 for name in websites)
+
+
+def run_queries(queries: list[tuple[str, str]]) -> Iterator[dict[str, Any]]:
+    """
+    Schedules queries on the job queue, and yields the result of each one as soon as it is finished.
+    A query submitted several times in the batch is scraped once, its result being yielded for each
+    submission.
+    :param queries: list of (website, user input) tuples
+    :return: iterator over query results, in completion order
+    """
+    job_queue = get_job_queue()
+    submissions: dict[str, list[tuple[str, str, bool]]] = {}
+    jobs = {}
+    for website, user_input in queries:
+        record_query(website, user_input)
+        cached = is_cached(website, user_input)
+        job = job_queue.submit(website=website, user_input=user_input)
+        jobs[job.future] = job
+        submissions.setdefault(job.id, []).append((website, user_input, cached))
+    for future in as_completed(jobs):
+        job = jobs[future]
+        for website, user_input, cached in submissions[job.id]:
+            yield {**job_to_result(job, cached), 'website': website, 'query': user_input}
+
+
+def iter_ndjson(queries: list[tuple[str, str]]) -> Iterator[str]:
+    """Yields the result of each query as a JSON line, then a summary line."""
+    start = time.perf_counter()
+    counts = {'done': 0, 'failed': 0}
+    for result in run_queries(queries):
+        counts['done' if result['status'] == DONE else 'failed'] += 1
+        yield json.dumps(result) + '\n'
+    yield json.dumps({'summary': {**counts, 'duration_ms': round((time.perf_counter() - start) * 1000, 1)}}) + '\n'
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self) -> None:
+        """Imports the scraping stack when Django starts if SCRAPER_PRELOAD is enabled (see settings)."""
+        if getattr(settings, 'SCRAPER_PRELOAD', {}).get('ENABLED', False):
+            from .src import main  # noqa: F401
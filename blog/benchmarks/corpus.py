@@ -0,0 +1,171 @@
+"""
+Corpus of eBay and Amazon pages used to benchmark the scraping pipeline without network.
+
+A corpus is a directory with one sub-directory per website:
+    ebay/search_<page>.html, ebay/item_<id>.html, amazon/search_<page>.html
+Links to item pages are written {{BASE_URL}}/itm/<id>, and replaced by the url of the replay server
+when pages are served. A corpus is either recorded from the live websites (record_ebay_corpus,
+record_amazon_corpus), or generated with the same markup as the live pages (generate_corpus).
+"""
+import os
+import random
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+BASE_URL_PLACEHOLDER: str = '{{BASE_URL}}'
+
+# Words used to generate item titles
+TITLE_WORDS: list[str] = ['apple', 'iphone', 'samsung', 'galaxy', 'case', 'charger', 'unlocked', 'refurbished',
+                          'new', 'black', 'white', '128GB', '256GB', 'pro', 'max', 'mini', 'screen', 'protector']
+
+
+def search_page_path(corpus_dir: str | Path, website: str, page: int) -> Path:
+    return Path(corpus_dir) / website / f"search_{page}.html"
+
+
+def item_page_path(corpus_dir: str | Path, website: str, item_id: int | str) -> Path:
+    return Path(corpus_dir) / website / f"item_{item_id}.html"
+
+
+def get_filler(rng: random.Random, nb_bytes: int) -> str:
+    """Returns markup that scrapers do not read, making generated pages as large as live ones."""
+    blocks = []
+    size = 0
+    while size < nb_bytes:
+        block = (f'<div class="x-filler"><a href="#">{" ".join(rng.choices(TITLE_WORDS, k=6))}</a>'
+                 f'<script>var v{size} = {rng.random()};</script></div>')
+        blocks.append(block)
+        size += len(block)
+    return ''.join(blocks)
+
+
+def generate_ebay_search_page(rng: random.Random, first_id: int, nb_items: int, query: str,
+                              filler_bytes: int) -> str:
+    items = ['<li class="s-item s-item__pl-on-bottom"><div class="s-item__wrapper"></div></li>']
+    for item_id in range(first_id, first_id + nb_items):
+        words = rng.choices(TITLE_WORDS, k=4)
+        if rng.random() < 0.7:
+            words.insert(rng.randrange(len(words)), query)
+        items.append(
+            f'<li class="s-item s-item__pl-on-bottom"><div class="s-item__info">'
+            f'<a class="s-item__link" href="{BASE_URL_PLACEHOLDER}/itm/{item_id}?hash=item{item_id}&amp;_trkparms=x">'
+            f'<span role="heading">{" ".join(words)}</span></a>'
+            f'<span class="s-item__price">${rng.randint(5, 900)}.{rng.randint(0, 99):02d}</span>'
+            f'</div></li>'
+        )
+    return (f'<!DOCTYPE html><html><head><title>{query} | eBay</title></head><body>'
+            f'{get_filler(rng, filler_bytes // 2)}<ul class="srp-results">{"".join(items)}</ul>'
+            f'{get_filler(rng, filler_bytes // 2)}</body></html>')
+
+
+def generate_ebay_item_page(rng: random.Random, filler_bytes: int) -> str:
+    ratings = ''.join(
+        f'<div class="fdbk-detail-seller-rating"><span class="fdbk-detail-seller-rating__label">{label}</span>'
+        f'<span class="fdbk-detail-seller-rating__value">{rng.choice(["4.8", "4.9", "5.0", "4.7", "5"])}</span></div>'
+        for label in ('Accurate description', 'Reasonable shipping cost', 'Shipping speed', 'Communication')
+    )
+    nb_items_sold = rng.choice([str(rng.randint(1, 999)), f"{rng.randint(1, 99)}.{rng.randint(0, 9)}K",
+                                f"{rng.randint(1, 9)}M"])
+    store_info = ''.join(
+        f'<div class="d-stores-info-categories__container__info__section__item">'
+        f'<span class="ux-textspans ux-textspans--BOLD">{value}</span><span> {label}</span></div>'
+        for value, label in ((f"{rng.choice([97.5, 98.9, 99.2, 100])}%", 'positive feedback'),
+                             (nb_items_sold, 'items sold'))
+    )
+    return (f'<!DOCTYPE html><html><head><title>item | eBay</title></head><body>'
+            f'{get_filler(rng, filler_bytes // 2)}{store_info}{get_filler(rng, filler_bytes // 4)}'
+            f'{ratings}{get_filler(rng, filler_bytes // 4)}</body></html>')
+
+
+def generate_amazon_search_page(rng: random.Random, nb_items: int, query: str, filler_bytes: int) -> str:
+    items = ''.join(
+        f'<div data-component-type="s-search-result" data-asin="B0{rng.randrange(16 ** 8):08X}"><h2><span class="a-size-base-plus a-color-base a-text-normal">'
+        f'{query} {" ".join(rng.choices(TITLE_WORDS, k=4))}</span></h2>'
+        f'<span class="a-price"><span class="a-price-whole">{rng.randint(5, 900)},</span>'
+        f'<span class="a-price-fraction">{rng.randint(0, 99):02d}</span></span></div>'
+        for _ in range(nb_items)
+    )
+    return (f'<!DOCTYPE html><html><head><title>Amazon.fr : {query}</title></head><body>'
+            f'{get_filler(rng, filler_bytes // 2)}<div class="s-main-slot">{items}</div>'
+            f'{get_filler(rng, filler_bytes // 2)}</body></html>')
+
+
+def generate_corpus(corpus_dir: str | Path, nb_pages: int = 1, items_per_page: int = 60,
+                    query: str = 'iphone', search_filler_bytes: int = 300_000,
+                    item_filler_bytes: int = 400_000, seed: int = 0) -> Path:
+    """
+    Writes a corpus of generated pages, with the markup read by the scrapers and filler markup to
+    reach the size of live pages. A same seed always gives the same corpus.
+    :param corpus_dir: directory of the corpus, created if needed
+    :param nb_pages: number of search pages of each website
+    :param items_per_page: number of items on each search page
+    :param query: user input of the search
+    :param search_filler_bytes: approximate size of filler markup on search pages
+    :param item_filler_bytes: approximate size of filler markup on item pages
+    :param seed: seed of the random generator
+    :return: path of the corpus
+    """
+    rng = random.Random(seed)
+    corpus_dir = Path(corpus_dir)
+    for website in ('ebay', 'amazon'):
+        os.makedirs(corpus_dir / website, exist_ok=True)
+    for page in range(1, nb_pages + 1):
+        first_id = (page - 1) * items_per_page
+        search_page_path(corpus_dir, 'ebay', page).write_text(
+            generate_ebay_search_page(rng, first_id, items_per_page, query, search_filler_bytes)
+        )
+        for item_id in range(first_id, first_id + items_per_page):
+            item_page_path(corpus_dir, 'ebay', item_id).write_text(generate_ebay_item_page(rng, item_filler_bytes))
+        search_page_path(corpus_dir, 'amazon', page).write_text(
+            generate_amazon_search_page(rng, items_per_page, query, search_filler_bytes)
+        )
+    return corpus_dir
+
+
+def record_ebay_corpus(corpus_dir: str | Path, search_urls: list[str]) -> Path:
+    """
+    Records live eBay search pages and the item pages they link to. Links are rewritten to point to
+    the replay server.
+    :param corpus_dir: directory of the corpus, created if needed
+    :param search_urls: urls of the search pages to record (page 1, 2...)
+    :return: path of the corpus
+    """
+    from blog.src.scripts.fetcher import get_default_fetcher
+
+    fetcher = get_default_fetcher()
+    corpus_dir = Path(corpus_dir)
+    os.makedirs(corpus_dir / 'ebay', exist_ok=True)
+    item_id = 0
+    for page, search_url in enumerate(search_urls, start=1):
+        html = fetcher.get(search_url).text
+        soup = BeautifulSoup(html, 'html.parser')
+        for link in soup.find_all('a', class_='s-item__link'):
+            href = link.get('href')
+            if not href or BASE_URL_PLACEHOLDER in href:
+                continue
+            item_page_path(corpus_dir, 'ebay', item_id).write_text(fetcher.get(href).text)
+            replay_href = f"{BASE_URL_PLACEHOLDER}/itm/{item_id}"
+            html = html.replace(href.replace('&', '&amp;'), replay_href).replace(href, replay_href)
+            item_id += 1
+        search_page_path(corpus_dir, 'ebay', page).write_text(html)
+    return corpus_dir
+
+
+def record_amazon_corpus(corpus_dir: str | Path, search_urls: list[str]) -> Path:
+    """
+    Records live Amazon search pages.
+    :param corpus_dir: directory of the corpus, created if needed
+    :param search_urls: urls of the search pages to record (page 1, 2...)
+    :return: path of the corpus
+    """
+    from blog.src.scripts.fetcher import get_default_fetcher
+
+    fetcher = get_default_fetcher()
+    corpus_dir = Path(corpus_dir)
+    os.makedirs(corpus_dir / 'amazon', exist_ok=True)
+    for page, search_url in enumerate(search_urls, start=1):
+        search_page_path(corpus_dir, 'amazon', page).write_text(
+            fetcher.get(search_url, random_user_agent=True).text
+        )
+    return corpus_dir
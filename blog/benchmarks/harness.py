@@ -0,0 +1,267 @@
+"""
+Benchmarks of the scraping pipeline on corpora of several sizes, replayed by a local server:
+- parse time of search and item pages (parsing and extraction, without network),
+- item pages parsed per second in process and by a pool of parser processes,
+- items scraped per second by each scraper,
+- latency percentiles and peak memory of main.main (with result and item caches disabled).
+Results are saved as JSON, and can be compared to a baseline to detect regressions.
+"""
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from django.test import override_settings
+
+from .corpus import generate_corpus
+from .replay_server import ReplayServer
+
+# Metrics for which a higher value is better (for all other metrics, lower is better)
+HIGHER_IS_BETTER: frozenset[str] = frozenset({'ebay_items_per_second', 'amazon_items_per_second',
+                                              'ebay_item_pages_per_second', 'ebay_item_pages_per_second_pool'})
+
+QUERY: str = 'iphone'
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Returns the q-th percentile (0 to 100) of values, with the nearest-rank method."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def time_ms(func: Callable[[], Any], repeat: int) -> float:
+    """Returns the median duration of func calls, in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+@contextmanager
+def replayed_pipeline(server: ReplayServer, max_pages: int, max_items: int) -> Iterator[Any]:
+    """
+    Points main.main to the replay server during the block, crawling up to max_pages pages and
+    max_items items (with no enrichment budget), with result and item caches disabled so that every
+    call scrapes the pages (and with the listing store disabled). Requests to the server are not
+    rate limited.
+    :return: main module
+    """
+    from blog.src import main
+    from blog.src.scripts import fetcher, result_cache
+
+    patched = {
+        'EBAY_BASE_URL': server.ebay_base_url,
+        'AMAZON_BASE_URL': server.amazon_base_url,
+        'MAX_PAGES': max_pages,
+        'MAX_ITEMS': max_items,
+        'ENOUGH_ITEMS': max_items + 1,
+        'ENRICH_BUDGET': None,
+    }
+    previous = {name: getattr(main, name) for name in patched}
+    previous_cache = result_cache.get_result_cache()
+    previous_fetcher = fetcher.get_default_fetcher()
+    for name, value in patched.items():
+        setattr(main, name, value)
+    result_cache.set_result_cache(result_cache.ResultCache(result_cache.MemoryCacheBackend(max_bytes=0)))
+    fetcher.set_default_fetcher(fetcher.Fetcher(pool_maxsize=main.MAX_WORKERS, timeout=main.TIMEOUT,
+                                                max_retries=main.MAX_RETRIES, rate_per_host=None))
+    try:
+        with override_settings(SCRAPER_ITEM_CACHE={'ENABLED': False}, SCRAPER_LISTING_STORE={'ENABLED': False}):
+            yield main
+    finally:
+        for name, value in previous.items():
+            setattr(main, name, value)
+        result_cache.set_result_cache(previous_cache)
+        fetcher.set_default_fetcher(previous_fetcher)
+
+
+def bench_parsing(corpus_dir: Path, repeat: int) -> dict[str, float]:
+    """Measures the median time to parse and extract the data of each kind of page."""
+    from blog.src.scripts import amazon_scraping, ebay_scraping
+    from blog.src.scripts.parsing import make_soup
+
+    # Extraction methods only use the url of the search from the state set by the constructors (which
+    # open the item cache and the parser pool)
+    ebay_scraper = object.__new__(ebay_scraping.EBayScraper)
+    amazon_scraper = object.__new__(amazon_scraping.AmazonScraper)
+    amazon_scraper.complete_url = amazon_scraper.get_complete_url(base_url='https://www.amazon.fr/s?k=',
+                                                                  user_input=QUERY)
+
+    def parse_ebay_search_page(content: bytes) -> None:
+        soup = make_soup(content, parse_only=ebay_scraping.SEARCH_PAGE_STRAINER)
+        for li_tag in ebay_scraper.get_item_tags(soup):
+            ebay_scraping.SEARCH_ITEM_EXTRACTOR.extract(li_tag)
+
+    def parse_ebay_item_page(content: bytes) -> None:
+        ebay_scraper.scrape_item_data(make_soup(content, parse_only=ebay_scraping.ITEM_PAGE_STRAINER))
+
+    def parse_amazon_search_page(content: bytes) -> None:
+        soup = make_soup(content, parse_only=amazon_scraping.SEARCH_PAGE_STRAINER)
+        for tag in amazon_scraper.get_item_tags(soup):
+            amazon_scraper.extract_item_data(tag)
+
+    metrics = {}
+    for name, pattern, parse in (('ebay_search_page_parse_ms', 'ebay/search_*.html', parse_ebay_search_page),
+                                 ('ebay_item_page_parse_ms', 'ebay/item_*.html', parse_ebay_item_page),
+                                 ('amazon_search_page_parse_ms', 'amazon/search_*.html', parse_amazon_search_page)):
+        pages = [path.read_bytes() for path in sorted(corpus_dir.glob(pattern))[:20]]
+        if pages:
+            metrics[name] = statistics.median(time_ms(lambda: parse(page), repeat) for page in pages)
+    return metrics
+
+
+def bench_parser_pool(corpus_dir: Path, repeat: int, max_workers: int | None = None) -> dict[str, float]:
+    """
+    Measures the number of eBay item pages parsed per second in the calling process, and by a pool of
+    max_workers parser processes (one per core by default).
+    """
+    from blog.src.scripts.ebay_scraping import parse_item_page
+    from blog.src.scripts.parser_pool import ParserPool
+
+    pages = [path.read_bytes() for path in sorted(corpus_dir.glob('ebay/item_*.html'))] * repeat
+    if not pages:
+        return {}
+    start = time.perf_counter()
+    for page in pages:
+        parse_item_page(page)
+    metrics = {'ebay_item_pages_per_second': len(pages) / (time.perf_counter() - start)}
+    pool = ParserPool(max_workers=max_workers)
+    try:
+        pool.start()
+        start = time.perf_counter()
+        list(pool.get_executor().map(parse_item_page, pages))
+        metrics['ebay_item_pages_per_second_pool'] = len(pages) / (time.perf_counter() - start)
+    finally:
+        pool.shutdown()
+    return metrics
+
+
+def bench_scraping(main, website: str) -> float:
+    """Returns the number of items scraped per second by the scraper of a website."""
+    create_scraper = {'ebay': main.create_ebay_scraper, 'amazon': main.create_amazon_scraper}[website]
+    start = time.perf_counter()
+    nb_items = sum(1 for _ in create_scraper(QUERY).iter_items())
+    return nb_items / (time.perf_counter() - start)
+
+
+def bench_main(main, website: str, runs: int) -> dict[str, float]:
+    """Measures latency percentiles of main.main, then its peak memory during one more run."""
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        main.main(QUERY, website)
+        latencies.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        main.main(QUERY, website)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        f'{website}_main_p50_ms': percentile(latencies, 50),
+        f'{website}_main_p90_ms': percentile(latencies, 90),
+        f'{website}_main_p99_ms': percentile(latencies, 99),
+        f'{website}_main_peak_memory_kb': peak / 1024,
+    }
+
+
+def bench_corpus(corpus_dir: Path, nb_items: int, runs: int, latency: float) -> dict[str, float]:
+    """Runs all benchmarks on a corpus, crawling up to nb_items items."""
+    metrics = bench_parsing(corpus_dir, repeat=runs)
+    metrics.update(bench_parser_pool(corpus_dir, repeat=runs))
+    nb_pages = len(list(corpus_dir.glob('ebay/search_*.html')))
+    with ReplayServer(corpus_dir, latency=latency) as server, \
+            replayed_pipeline(server, nb_pages, nb_items) as main:
+        for website in ('ebay', 'amazon'):
+            metrics[f'{website}_items_per_second'] = bench_scraping(main, website)
+            metrics.update(bench_main(main, website, runs))
+    return metrics
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes: list[int], runs: int = 5, latency: float = 0.02,
+                   corpus_dir: str | Path | None = None, items_per_page: int = 60) -> dict[str, Any]:
+    """
+    Runs the benchmarks on a corpus of each size, generated in a temporary directory, or on a
+    recorded corpus.
+    :param sizes: numbers of items of the corpora to generate
+    :param runs: number of runs of each measure
+    :param latency: simulated network latency of each response, in seconds
+    :param corpus_dir: directory of a recorded corpus, used instead of generated ones if given (sizes
+        are then the numbers of items crawled in it)
+    :param items_per_page: number of items on each generated search page
+    :return: dict with environment information and the metrics of each corpus size
+    """
+    from blog.src.scripts.parsing import PARSER
+
+    results = []
+    for size in sizes:
+        if corpus_dir is not None:
+            metrics = bench_corpus(Path(corpus_dir), size, runs, latency)
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                generate_corpus(tmp_dir, nb_pages=math.ceil(size / items_per_page),
+                                items_per_page=min(size, items_per_page), query=QUERY)
+                metrics = bench_corpus(Path(tmp_dir), size, runs, latency)
+        results.append({'corpus_size': size, 'metrics': metrics})
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': get_git_commit(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'parser': PARSER,
+        'runs': runs,
+        'latency': latency,
+        'results': results,
+    }
+
+
+def save_results(results: dict[str, Any], path: str | Path) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(results, indent=2))
+
+
+def load_results(path: str | Path) -> dict[str, Any]:
+    return json.loads(Path(path).read_text())
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any], tolerance: float = 0.2) -> list[str]:
+    """
+    Compares benchmark results to a baseline, for the corpus sizes and metrics present in both.
+    :param baseline: results loaded from a previous run
+    :param current: results of the current run
+    :param tolerance: relative change accepted before a metric is reported as a regression
+    :return: description of each regression
+    """
+    baseline_metrics = {result['corpus_size']: result['metrics'] for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_metrics.get(result['corpus_size'], {})
+        for name, value in result['metrics'].items():
+            if name not in previous or not previous[name]:
+                continue
+            change = (value - previous[name]) / previous[name]
+            if name in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append(f"{name} (corpus of {result['corpus_size']} items): "
+                                   f"{previous[name]:.2f} -> {value:.2f} ({change:+.0%} worse)")
+    return regressions
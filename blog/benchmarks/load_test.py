@@ -0,0 +1,193 @@
+"""
+Load test of the page, comparing the throughput of the sync view (process_input, as served by a WSGI
+server with a fixed number of threads) and of the async view (process_input_async, as served by one
+ASGI worker) when many users run queries at the same time. Requests go through the Django handlers
+with the test clients, in process, and pages are scraped from a replayed corpus (see harness.py).
+Pages are small by default, so that requests wait for the network rather than for parsing (which
+holds the GIL, whatever the server).
+"""
+import asyncio
+import math
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+from django.db import connections
+from django.urls import reverse
+
+from .corpus import generate_corpus
+from .harness import QUERY, percentile, replayed_pipeline
+from .replay_server import ReplayServer
+
+
+def count_threads() -> int:
+    """Returns the number of threads of the process, except the ones of the replay server and of the users."""
+    return sum(1 for thread in threading.enumerate()
+               if 'process_request_thread' not in thread.name and not thread.name.startswith('load-test-user'))
+
+
+class ThreadCounter:
+    """Samples the number of threads of the process in background, to report the highest one."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.max_threads = count_threads()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.max_threads = max(self.max_threads, count_threads())
+
+    def __enter__(self) -> 'ThreadCounter':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+@contextmanager
+def test_environment(tmp_dir: str) -> Iterator[None]:
+    """
+    Runs the block in the environment of the tests (so that the test clients are allowed), with test
+    databases so that the queries of the load test are not recorded. SQLite test databases are files
+    of tmp_dir rather than in memory, so that concurrent writes wait for each other instead of failing.
+    """
+    for connection in connections.all():
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = str(Path(tmp_dir) / f'test_{connection.alias}.sqlite3')
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def get_form_data(website: str, i: int) -> dict[str, str]:
+    """Returns the form data of the i-th request, each request having its own query."""
+    # Distinct queries, so that concurrent requests are not served by a same scraping
+    return {'option': website, 'text_input': f'{QUERY} {i}'}
+
+
+def summarize(latencies: list[float], nb_errors: int, duration: float, max_threads: int) -> dict[str, float]:
+    """Returns the throughput and latency percentiles (in milliseconds) of a load test."""
+    return {
+        'requests_per_second': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'errors': nb_errors,
+        'max_threads': max_threads,
+    }
+
+
+def run_wsgi(website: str, concurrency: int, nb_requests: int, threads: int) -> dict[str, float]:
+    """
+    Sends nb_requests requests to the sync view, from concurrency users at the same time, a request
+    being handled when one of the threads of the server is free (latencies include this wait).
+    """
+    url = reverse('process_input')
+    server_threads = threading.Semaphore(threads)
+    counter = iter(range(nb_requests))
+    counter_lock = threading.Lock()
+    latencies = []
+    nb_errors = 0
+
+    def user() -> None:
+        nonlocal nb_errors
+        client = Client()
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            with server_threads:
+                response = client.post(url, get_form_data(website, i))
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                nb_errors += 1
+
+    with ThreadCounter() as thread_counter:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load-test-user') as executor:
+            for future in [executor.submit(user) for _ in range(concurrency)]:
+                future.result()
+        duration = time.perf_counter() - start
+    return summarize(latencies, nb_errors, duration, thread_counter.max_threads)
+
+
+async def run_asgi(website: str, concurrency: int, nb_requests: int) -> dict[str, float]:
+    """Sends nb_requests requests to the async view, from concurrency users at the same time."""
+    from blog.src.scripts.async_fetcher import get_default_async_fetcher
+
+    url = reverse('process_input_async')
+    counter = iter(range(nb_requests))
+    latencies = []
+    nb_errors = 0
+
+    async def user() -> None:
+        nonlocal nb_errors
+        client = AsyncClient()
+        for i in counter:
+            start = time.perf_counter()
+            response = await client.post(url, get_form_data(website, i))
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                nb_errors += 1
+
+    with ThreadCounter() as thread_counter:
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(user() for _ in range(concurrency)))
+        finally:
+            await get_default_async_fetcher().aclose()
+        duration = time.perf_counter() - start
+    return summarize(latencies, nb_errors, duration, thread_counter.max_threads)
+
+
+def run_load_test(website: str = 'ebay', concurrency: int = 50, nb_requests: int = 200, wsgi_threads: int = 8,
+                  latency: float = 0.5, nb_items: int = 20, items_per_page: int = 20,
+                  filler_bytes: int = 5_000) -> dict[str, Any]:
+    """
+    Runs the load test of both views on a generated corpus.
+    :param website: website option of the queries
+    :param concurrency: number of users sending requests at the same time
+    :param nb_requests: number of requests sent to each view
+    :param wsgi_threads: number of threads of the WSGI server
+    :param latency: simulated network latency of each response of the scraped websites, in seconds
+    :param nb_items: number of items scraped by each request
+    :param items_per_page: number of items on each generated search page
+    :param filler_bytes: approximate size of filler markup on generated pages
+    :return: dict with the parameters and the metrics of each view
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir, test_environment(tmp_dir), \
+            override_settings(SCRAPER_CACHE_WARMER={'ENABLED': False}):
+        nb_pages = math.ceil(nb_items / items_per_page)
+        generate_corpus(tmp_dir, nb_pages=nb_pages, items_per_page=min(nb_items, items_per_page), query=QUERY,
+                        search_filler_bytes=filler_bytes, item_filler_bytes=filler_bytes)
+        with ReplayServer(Path(tmp_dir), latency=latency) as server, replayed_pipeline(server, nb_pages, nb_items):
+            results = {
+                'wsgi': run_wsgi(website, concurrency, nb_requests, wsgi_threads),
+                'asgi': asyncio.run(run_asgi(website, concurrency, nb_requests)),
+            }
+    return {
+        'website': website,
+        'concurrency': concurrency,
+        'requests': nb_requests,
+        'wsgi_threads': wsgi_threads,
+        'latency': latency,
+        'items': nb_items,
+        'filler_bytes': filler_bytes,
+        'results': results,
+    }
@@ -0,0 +1,139 @@
+"""
+Local HTTP server replaying a corpus of pages (see corpus.py), used instead of eBay and Amazon to
+benchmark the scraping pipeline without network. Pages are gzipped when the client accepts it.
+"""
+import gzip
+import hashlib
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from .corpus import BASE_URL_PLACEHOLDER, item_page_path, search_page_path
+
+EBAY_SEARCH_PATH: str = '/sch/i.html'
+
+AMAZON_SEARCH_PATH: str = '/s'
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    """Serves corpus pages, with an ETag so that conditional requests get 304 responses."""
+    protocol_version = 'HTTP/1.1'
+    server: 'ReplayServer'
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        item_match = re.match(r'^/itm/([\w-]+)$', url.path)
+        if url.path == EBAY_SEARCH_PATH:
+            path = search_page_path(self.server.corpus_dir, 'ebay', int(query.get('_pgn', ['1'])[0]))
+        elif url.path == AMAZON_SEARCH_PATH:
+            path = search_page_path(self.server.corpus_dir, 'amazon', int(query.get('page', ['1'])[0]))
+        elif item_match is not None:
+            path = item_page_path(self.server.corpus_dir, 'ebay', item_match.group(1))
+        else:
+            path = None
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if path is None or not path.exists():
+            self.send_body(404, b'Not found')
+            return
+        body = self.server.read_page(path)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_body(304, b'', etag=etag)
+            return
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            self.send_body(200, self.server.read_compressed_page(path), etag=etag, content_encoding='gzip')
+        else:
+            self.send_body(200, body, etag=etag)
+
+    def send_body(self, status: int, body: bytes, etag: str | None = None,
+                  content_encoding: str | None = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if content_encoding is not None:
+            self.send_header('Content-Encoding', content_encoding)
+        self.end_headers()
+        if body:
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading the body (see fetcher.read_until_markers)
+                self.close_connection = True
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Replay server listening on a free local port, in a background thread.
+    Usage:
+        with ReplayServer(corpus_dir, latency=0.05) as server:
+            requests.get(f"{server.url}/sch/i.html?_nkw=iphone")
+    """
+    daemon_threads = True
+    # Many connections are opened at once by concurrent scrapings
+    request_queue_size = 128
+
+    def __init__(self, corpus_dir: str | Path, latency: float = 0.0) -> None:
+        """
+        Constructor of ReplayServer class.
+        :param corpus_dir: directory of the corpus to replay
+        :param latency: number of seconds waited before each response, to simulate the network
+        """
+        super().__init__(('127.0.0.1', 0), ReplayRequestHandler)
+        self.corpus_dir = Path(corpus_dir)
+        self.latency = latency
+        self._pages: dict[Path, bytes] = {}
+        self._compressed_pages: dict[Path, bytes] = {}
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    @property
+    def ebay_base_url(self) -> str:
+        """Replacement of main.EBAY_BASE_URL."""
+        return f"{self.url}{EBAY_SEARCH_PATH}?_nkw="
+
+    @property
+    def amazon_base_url(self) -> str:
+        """Replacement of main.AMAZON_BASE_URL."""
+        return f"{self.url}{AMAZON_SEARCH_PATH}?k="
+
+    def read_page(self, path: Path) -> bytes:
+        """Returns a corpus page with links to the server, pages being read once."""
+        page = self._pages.get(path)
+        if page is None:
+            page = path.read_text().replace(BASE_URL_PLACEHOLDER, self.url).encode()
+            self._pages[path] = page
+        return page
+
+    def read_compressed_page(self, path: Path) -> bytes:
+        """Returns a gzipped corpus page, pages being compressed once."""
+        page = self._compressed_pages.get(path)
+        if page is None:
+            page = self._compressed_pages[path] = gzip.compress(self.read_page(path), compresslevel=6)
+        return page
+
+    def handle_error(self, request, client_address) -> None:
+        """Ignores connections closed by clients which stopped reading a body, reports other errors."""
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def __enter__(self) -> 'ReplayServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
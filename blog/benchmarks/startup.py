@@ -0,0 +1,109 @@
+"""
+Startup benchmark of the web workers: import time and memory of a worker when it starts (WSGI
+application and URLconf, enough to render the form), then when it runs its first query (import of the
+scraping stack). Each measure runs in a new interpreter. The worker is forked from the process which
+imported the application, like the workers of a preloading server (e.g. gunicorn --preload): with
+SCRAPER_PRELOAD, the scraping stack is imported before the fork, and shared by the workers.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+# Modules imported by the scraping stack, reported when they are loaded at startup
+HEAVY_MODULES: tuple[str, ...] = ('pandas', 'numpy', 'bs4', 'lxml', 'requests', 'fake_useragent', 'httpx')
+
+BASE_DIR: Path = Path(__file__).resolve().parent.parent.parent
+
+
+def get_memory_mb() -> dict[str, float | None]:
+    """
+    Returns the resident memory of the process, and the part of it which is not shared with other
+    processes (None if /proc is not available), in MB.
+    """
+    memory = {'rss_mb': None, 'private_mb': None}
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            fields = dict(line.split(':', 1) for line in smaps if ':' in line)
+    except OSError:
+        import resource
+
+        memory['rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return memory
+    to_mb = lambda name: int(fields[name].split()[0]) / 1024  # noqa: E731
+    memory['rss_mb'] = to_mb('Rss')
+    memory['private_mb'] = to_mb('Private_Clean') + to_mb('Private_Dirty')
+    return memory
+
+
+def measure_first_query() -> dict[str, Any]:
+    """Imports the scraping stack, as the first query of a worker does, and measures it."""
+    start = time.perf_counter()
+    from blog.src import main  # noqa: F401
+    return {'first_query_import_ms': (time.perf_counter() - start) * 1000, **get_memory_mb()}
+
+
+def measure_worker() -> dict[str, Any]:
+    """
+    Measures the startup of a worker in this (new) process, and prints the results as JSON. Its first
+    query runs in a forked process if possible, so that its private memory excludes what is shared
+    with the parent.
+    """
+    from importlib import import_module
+
+    start = time.perf_counter()
+    from app_web_scraping.wsgi import application  # noqa: F401
+    from django.conf import settings
+
+    import_module(settings.ROOT_URLCONF)
+    results = {
+        'startup_ms': (time.perf_counter() - start) * 1000,
+        'startup_rss_mb': get_memory_mb()['rss_mb'],
+        'startup_modules': [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+    if not hasattr(os, 'fork'):
+        print(json.dumps({**results, **measure_first_query()}))
+        return
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        with os.fdopen(write_fd, 'w') as pipe:
+            pipe.write(json.dumps(measure_first_query()))
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        results.update(json.loads(pipe.read()))
+    os.waitpid(pid, 0)
+    print(json.dumps(results))
+
+
+def run_worker(preload: bool) -> dict[str, Any]:
+    """Measures the startup of a worker in a new interpreter, with or without SCRAPER_PRELOAD."""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'app_web_scraping.settings',
+           'SCRAPER_PRELOAD': '1' if preload else '0'}
+    output = subprocess.run([sys.executable, '-c', 'from blog.benchmarks.startup import measure_worker; '
+                                                   'measure_worker()'],
+                            cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_startup_benchmark(runs: int = 3) -> dict[str, dict[str, Any]]:
+    """
+    Measures the startup of workers without and with SCRAPER_PRELOAD.
+    :param runs: number of workers started for each mode, times are their medians
+    :return: dict with the measures of each mode ('lazy' and 'preload')
+    """
+    results = {}
+    for mode, preload in (('lazy', False), ('preload', True)):
+        workers = [run_worker(preload) for _ in range(runs)]
+        results[mode] = {
+            **workers[-1],
+            'startup_ms': statistics.median(worker['startup_ms'] for worker in workers),
+            'first_query_import_ms': statistics.median(worker['first_query_import_ms'] for worker in workers),
+        }
+    return results
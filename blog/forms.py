@@ -13,6 +13,7 @@ class UserInputForm(forms.Form):
     option = forms.ChoiceField(choices=(
         ('ebay', 'eBay'),
         ('amazon', 'Amazon'),
+        ('all', 'eBay + Amazon'),
     ))
     text_input = forms.CharField(
         widget=NoResizeTextarea(attrs={
@@ -0,0 +1,67 @@
+"""
+Tables of results shown on the page, rendered once for each version of the results (see
+ResultSet.get_version) and cached by their ETag: pages showing results already rendered do not run the
+loop of the template again, and the results view answers conditional requests of browsers and proxies
+which already have them with a 304 response.
+"""
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import SafeString, mark_safe
+
+from .src.scripts import metrics
+
+# Version of the blog/results_table.html template, to change with it: tables rendered by an older
+# template are then neither read from the cache nor validated by the ETags of browsers and proxies
+TEMPLATE_VERSION: int = 1
+
+DEFAULT_TIMEOUT: int = 600
+
+DEFAULT_MAX_AGE: int = 60
+
+metrics.registry.describe('scraping_results_tables_total', "Tables of results served, by result.")
+
+
+def get_etag(output) -> str:
+    """
+    Returns the strong ETag (unquoted) of the table of given results.
+    :param output: ResultSet returned by main.main
+    :return: ETag, changing with the results and the template
+    """
+    return f"t{TEMPLATE_VERSION}-{output.get_version()}"
+
+
+def render_results_table(output) -> SafeString:
+    """
+    Renders the table of given results with blog/results_table.html, or returns it from the cache
+    (see SCRAPER_RESULTS_TABLE setting).
+    :param output: ResultSet returned by main.main, or None
+    :return: HTML of the head and body of the table, empty without results
+    """
+    if output is None or output.empty:
+        return mark_safe('')
+    config = getattr(settings, 'SCRAPER_RESULTS_TABLE', {})
+    cache = caches[config.get('CACHE_ALIAS', 'default')]
+    key = f"results_table:{get_etag(output)}"
+    table = cache.get(key)
+    metrics.increment('scraping_results_tables_total', result='rendered' if table is None else 'cached')
+    if table is None:
+        table = render_to_string('blog/results_table.html', {'output': output.to_dicts()})
+        cache.set(key, table, timeout=config.get('TIMEOUT', DEFAULT_TIMEOUT))
+    return mark_safe(table)
+
+
+def get_cache_control(output) -> dict[str, Any]:
+    """
+    Returns the Cache-Control directives of a response with given results (see patch_cache_control):
+    fresh results can be kept MAX_AGE seconds by browsers and proxies, results which are stale or miss
+    a website are revalidated on each request.
+    :param output: ResultSet returned by main.main
+    :return: dict of directives
+    """
+    if output.attrs.get('stale') or output.attrs.get('stale_websites') or output.attrs.get('failed_websites'):
+        return {'no_cache': True}
+    max_age = getattr(settings, 'SCRAPER_RESULTS_TABLE', {}).get('MAX_AGE', DEFAULT_MAX_AGE)
+    return {'public': True, 'max_age': max_age}
@@ -0,0 +1,135 @@
+"""
+Scraping jobs run in a pool of background threads, so that the HTTP request submitting a query
+returns at once and the page polls the result.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.conf import settings
+
+from .serializers import output_to_records
+from .src.scripts.result_cache import get_cache_key
+
+PENDING: str = 'pending'
+RUNNING: str = 'running'
+DONE: str = 'done'
+FAILED: str = 'failed'
+
+
+@dataclass
+class Job:
+    """Scraping of a query on a website, run in background."""
+    website: str
+    user_input: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = PENDING
+    output: list[dict[str, Any]] | None = None
+    # Attributes of the result (e.g. stale, failed_websites)
+    attrs: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    # Done once the job is finished
+    future: Future | None = field(default=None, repr=False)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns the job as a JSON serializable dict, sent to the page polling it."""
+        return {
+            'id': self.id,
+            'website': self.website,
+            'user_input': self.user_input,
+            'status': self.status,
+            'output': self.output,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """
+    Runs jobs in a pool of threads. A query submitted while the same query (same website and
+    normalized input) is still pending or running gets the job already in flight.
+    """
+
+    def __init__(self, max_workers: int = 4, retention: float = 3600) -> None:
+        """
+        Constructor of JobQueue class.
+        :param max_workers: number of jobs running at the same time
+        :param retention: number of seconds during which a finished job can be polled
+        """
+        self.retention = retention
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scraping-job')
+        self.jobs: dict[str, Job] = {}
+        self.in_flight: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, website: str, user_input: str) -> Job:
+        """
+        Enqueues the scraping of a query, unless the same query is already in flight.
+        :param website: name of the website to scrape
+        :param user_input: user input given from website's form
+        :return: job scraping the query
+        """
+        key = get_cache_key(website, user_input)
+        with self._lock:
+            self._remove_old_jobs()
+            job = self.in_flight.get(key)
+            if job is not None:
+                return job
+            job = Job(website=website, user_input=user_input)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+            job.future = self.executor.submit(self._run, key, job)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """Returns the job with given id, or None if it does not exist (anymore)."""
+        return self.jobs.get(job_id)
+
+    def _run(self, key: str, job: Job) -> None:
+        """Runs a job in a worker thread."""
+        from .src import main
+
+        job.status = RUNNING
+        try:
+            output = main.main(job.user_input, job.website)
+            job.output = output_to_records(output)
+            job.attrs = dict(output.attrs) if output is not None else {}
+            job.status = DONE
+        except Exception as error:
+            job.error = str(error)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self.in_flight.pop(key, None)
+
+    def _remove_old_jobs(self) -> None:
+        """Forgets jobs finished for more than retention seconds, the lock must be held by the caller."""
+        limit = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.is_finished and job.finished_at < limit]:
+            del self.jobs[job_id]
+
+
+_job_queue: JobQueue | None = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Returns the JobQueue of the process, created from the SCRAPER_JOBS setting on first call."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                config = getattr(settings, 'SCRAPER_JOBS', {})
+                _job_queue = JobQueue(max_workers=config.get('MAX_WORKERS', 4),
+                                      retention=config.get('RETENTION', 3600))
+    return _job_queue
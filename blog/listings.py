@@ -0,0 +1,182 @@
+"""
+Store of scraped listings: items scraped for a query are written to the ScrapedListing table by a
+background thread, in bulk, so that requests never wait for the database.
+"""
+import logging
+import math
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from .models import ScrapedListing
+from .src.scripts import metrics
+from .src.scripts.item_cache import canonical_item_url
+from .src.scripts.result_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+metrics.registry.describe('scraping_dropped_listings_total', "Listings not stored because the store was full.")
+
+# Columns updated when an item already stored for a query is scraped again
+UPDATED_FIELDS: list[str] = ['title', 'price_dollars', 'rating_avg', 'positive_feedback_percentage',
+                             'nb_items_sold', 'scraped_at']
+
+
+def get_listing_query(user_input: str) -> str:
+    """
+    Returns the query of the listings of a user input: the normalized user input, truncated to the
+    length of the query column (the form does not limit the length of user inputs).
+    :param user_input: user input given from website's form
+    :return: query stored with the listings
+    """
+    return normalize_query(user_input)[:ScrapedListing._meta.get_field('query').max_length]
+
+
+def to_float(value: Any) -> float | None:
+    """Converts a scraped value to a float, None and NaN giving None."""
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def to_int(value: Any) -> int | None:
+    """Converts a number of items sold (NbItems object or number) to an integer, or None."""
+    if hasattr(value, 'as_int'):
+        return value.as_int
+    value = to_float(value)
+    return int(value) if value is not None else None
+
+
+def make_listings(website: str, user_input: str, items: Iterable[dict[str, Any]],
+                  scraped_at: datetime) -> list[ScrapedListing]:
+    """
+    Creates the listings of scraped items. Items without url are skipped, and an item scraped twice
+    for the query only gives one listing (the last one).
+    :param website: name of the scraped website
+    :param user_input: user input given from website's form
+    :param items: dicts yielded by the iter_items method of a scraper
+    :param scraped_at: time of the scraping
+    :return: list of unsaved ScrapedListing objects
+    """
+    website = website.lower()
+    query = get_listing_query(user_input)
+    listings = {}
+    for item in items:
+        item_url = item.get('item_url')
+        if not isinstance(item_url, str) or not item_url:
+            continue
+        item_url = canonical_item_url(item_url)
+        listings[item_url] = ScrapedListing(
+            website=website,
+            query=query,
+            item_url=item_url,
+            title=item.get('title') or '',
+            price_dollars=to_float(item.get('price_dollars')),
+            rating_avg=to_float(item.get('rating_avg')),
+            positive_feedback_percentage=to_float(item.get('positive_feedback_percentage')),
+            nb_items_sold=to_int(item.get('nb_items_sold')),
+            scraped_at=scraped_at,
+        )
+    return list(listings.values())
+
+
+class ListingStore:
+    """
+    Writes scraped listings in a background thread. Listings of an item already stored for the same
+    query are updated. When more than max_pending scrapings wait to be written, new ones are dropped
+    (the items of a streamed scraping are enqueued one by one, each one counting as a scraping).
+    """
+
+    def __init__(self, batch_size: int = 500, max_pending: int = 1000) -> None:
+        """
+        Constructor of ListingStore class.
+        :param batch_size: maximum number of listings inserted by a single query
+        :param max_pending: maximum number of scrapings (or streamed items) waiting to be written
+        """
+        self.batch_size = batch_size
+        self.queue: queue.Queue[list[ScrapedListing]] = queue.Queue(maxsize=max_pending)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def save(self, website: str, user_input: str, items: Iterable[dict[str, Any]]) -> None:
+        """
+        Enqueues the listings of scraped items, to be written in background.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :param items: dicts yielded by the iter_items method of a scraper
+        """
+        listings = make_listings(website, user_input, items, scraped_at=datetime.now(timezone.utc))
+        if not listings:
+            return
+        self._start()
+        try:
+            self.queue.put_nowait(listings)
+        except queue.Full:
+            metrics.increment('scraping_dropped_listings_total', len(listings))
+            logger.warning("Listing store is full, %d listings dropped", len(listings))
+
+    def flush(self) -> None:
+        """Blocks until all enqueued listings are written."""
+        self.queue.join()
+
+    def write(self, listings: list[ScrapedListing]) -> None:
+        """Inserts listings, or updates the ones already stored for the same item and query."""
+        ScrapedListing.objects.bulk_create(
+            listings, batch_size=self.batch_size, update_conflicts=True,
+            unique_fields=['website', 'query', 'item_url'], update_fields=UPDATED_FIELDS,
+        )
+
+    def _start(self) -> None:
+        """Starts the writing thread on first call."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='listing-store', daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        """Writes enqueued listings, grouping the scrapings waiting at the same time in a single batch."""
+        while True:
+            batches = [self.queue.get()]
+            while True:
+                try:
+                    batches.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                close_old_connections()
+                # An item scraped again by a later scraping of the query keeps its last values
+                listings = {(listing.website, listing.query, listing.item_url): listing
+                            for batch in batches for listing in batch}
+                self.write(list(listings.values()))
+            except DatabaseError:
+                logger.exception("Could not write %d scrapings to the listing store", len(batches))
+            finally:
+                for _ in batches:
+                    self.queue.task_done()
+
+
+_listing_store: ListingStore | None = None
+_listing_store_lock = threading.Lock()
+
+
+def get_listing_store() -> ListingStore | None:
+    """
+    Returns the ListingStore of the process, created from the SCRAPER_LISTING_STORE setting on first
+    call, or None if the store is disabled.
+    """
+    global _listing_store
+    config = getattr(settings, 'SCRAPER_LISTING_STORE', {})
+    if not config.get('ENABLED', True):
+        return None
+    if _listing_store is None:
+        with _listing_store_lock:
+            if _listing_store is None:
+                _listing_store = ListingStore(batch_size=config.get('BATCH_SIZE', 500),
+                                              max_pending=config.get('MAX_PENDING', 1000))
+    return _listing_store
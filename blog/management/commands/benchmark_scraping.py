@@ -0,0 +1,44 @@
+"""
+Runs the scraping benchmarks (see blog/benchmarks/harness.py), e.g.:
+    python manage.py benchmark_scraping --sizes 60 180 --compare blog/benchmarks/results/baseline.json
+"""
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.benchmarks.harness import compare_results, load_results, run_benchmarks, save_results
+
+RESULTS_DIR: Path = Path(__file__).resolve().parents[2] / 'benchmarks' / 'results'
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the scraping pipeline on replayed corpora, and compares results to a baseline."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--sizes', type=int, nargs='+', default=[20, 60],
+                            help="numbers of items of the generated corpora")
+        parser.add_argument('--runs', type=int, default=3, help="number of runs of each measure")
+        parser.add_argument('--latency', type=float, default=0.02,
+                            help="simulated network latency of each response, in seconds")
+        parser.add_argument('--corpus', help="directory of a recorded corpus, used instead of generated ones")
+        parser.add_argument('--output', help="path of the JSON results file")
+        parser.add_argument('--compare', help="path of a baseline JSON results file")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="relative change accepted before a metric is reported as a regression")
+
+    def handle(self, *args, **options) -> None:
+        results = run_benchmarks(options['sizes'], runs=options['runs'], latency=options['latency'],
+                                 corpus_dir=options['corpus'])
+        for result in results['results']:
+            self.stdout.write(f"Corpus of {result['corpus_size']} items")
+            for name, value in result['metrics'].items():
+                self.stdout.write(f"    {name:<35} {value:12.2f}")
+        output = options['output'] or RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}.json"
+        save_results(results, output)
+        self.stdout.write(f"Results saved to {output}")
+        if options['compare']:
+            regressions = compare_results(load_results(options['compare']), results, options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions found:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regression found"))
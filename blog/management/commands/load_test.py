@@ -0,0 +1,36 @@
+"""
+Compares the throughput of the sync and async views under load (see blog/benchmarks/load_test.py), e.g.:
+    python manage.py load_test --concurrency 50 --requests 200 --wsgi-threads 8
+"""
+from django.core.management.base import BaseCommand
+
+from blog.benchmarks.load_test import run_load_test
+
+
+class Command(BaseCommand):
+    help = "Load tests the sync (WSGI) and async (ASGI) views of the page on a replayed corpus."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--website', default='ebay', help="website option of the queries")
+        parser.add_argument('--concurrency', type=int, default=50, help="number of users at the same time")
+        parser.add_argument('--requests', type=int, default=200, help="number of requests sent to each view")
+        parser.add_argument('--wsgi-threads', type=int, default=8, help="number of threads of the WSGI server")
+        parser.add_argument('--latency', type=float, default=0.5,
+                            help="simulated network latency of each response, in seconds")
+        parser.add_argument('--items', type=int, default=20, help="number of items scraped by each request")
+        parser.add_argument('--page-bytes', type=int, default=5_000,
+                            help="approximate size of filler markup on generated pages")
+
+    def handle(self, *args, **options) -> None:
+        results = run_load_test(website=options['website'], concurrency=options['concurrency'],
+                                nb_requests=options['requests'], wsgi_threads=options['wsgi_threads'],
+                                latency=options['latency'], nb_items=options['items'],
+                                filler_bytes=options['page_bytes'])
+        self.stdout.write(f"{results['requests']} requests on {results['website']}, "
+                          f"{results['concurrency']} users at the same time")
+        for server, metrics in results['results'].items():
+            self.stdout.write(f"{server.upper()}: {metrics['requests_per_second']:.1f} req/s, "
+                              f"p50 {metrics['p50_ms']:.0f} ms, p95 {metrics['p95_ms']:.0f} ms, "
+                              f"{metrics['errors']} errors, {metrics['max_threads']} threads")
+        speedup = results['results']['asgi']['requests_per_second'] / results['results']['wsgi']['requests_per_second']
+        self.stdout.write(self.style.SUCCESS(f"ASGI / WSGI throughput: {speedup:.2f}x"))
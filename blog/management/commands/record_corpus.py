@@ -0,0 +1,28 @@
+"""
+Records live eBay and Amazon search pages (and eBay item pages) in a corpus replayed by the
+benchmarks, e.g.:
+    python manage.py record_corpus blog/benchmarks/corpus/iphone --query iphone --pages 2
+"""
+from django.core.management.base import BaseCommand
+
+from blog.benchmarks.corpus import record_amazon_corpus, record_ebay_corpus
+from blog.src import main
+from blog.src.scripts.amazon_scraping import AmazonScraper
+from blog.src.scripts.ebay_scraping import EBayScraper
+
+
+class Command(BaseCommand):
+    help = "Records live search pages in a corpus for the scraping benchmarks."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('corpus_dir', help="directory of the corpus, created if needed")
+        parser.add_argument('--query', default='iphone', help="user input of the search")
+        parser.add_argument('--pages', type=int, default=1, help="number of search pages to record")
+
+    def handle(self, *args, **options) -> None:
+        pages = range(1, options['pages'] + 1)
+        ebay_url = EBayScraper.get_complete_url(main.EBAY_BASE_URL, options['query'])
+        record_ebay_corpus(options['corpus_dir'], [f"{ebay_url}&_pgn={page}" for page in pages])
+        amazon_url = AmazonScraper.get_complete_url(main.AMAZON_BASE_URL, options['query'])
+        record_amazon_corpus(options['corpus_dir'], [f"{amazon_url}&page={page}" for page in pages])
+        self.stdout.write(self.style.SUCCESS(f"Corpus recorded in {options['corpus_dir']}"))
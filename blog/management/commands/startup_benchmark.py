@@ -0,0 +1,25 @@
+"""
+Measures the import time and memory of a web worker, without and with SCRAPER_PRELOAD (see
+blog/benchmarks/startup.py), e.g.:
+    python manage.py startup_benchmark --runs 5
+"""
+from django.core.management.base import BaseCommand
+
+from blog.benchmarks.startup import run_startup_benchmark
+
+
+class Command(BaseCommand):
+    help = "Measures the startup time and memory of a web worker, and the import cost of its first query."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--runs', type=int, default=3, help="number of workers started for each mode")
+
+    def handle(self, *args, **options) -> None:
+        results = run_startup_benchmark(runs=options['runs'])
+        for mode, worker in results.items():
+            private = f", {worker['private_mb']:.1f} MB private" if worker['private_mb'] is not None else ""
+            self.stdout.write(f"{mode.upper()}: startup {worker['startup_ms']:.0f} ms, "
+                              f"{worker['startup_rss_mb']:.1f} MB "
+                              f"({', '.join(worker['startup_modules']) or 'no scraping module'}); "
+                              f"first query imports {worker['first_query_import_ms']:.0f} ms, "
+                              f"then {worker['rss_mb']:.1f} MB{private}")
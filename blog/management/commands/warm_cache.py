@@ -0,0 +1,41 @@
+"""
+Runs the cache warmer in its own process, e.g.:
+    python manage.py warm_cache --top 50 --workers 4
+With the 'memory' backend of SCRAPER_RESULT_CACHE, results would only be cached in this process: use
+the 'django' backend with a cache shared by the web workers (file, memcached, redis...).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.src.scripts.result_cache import MemoryCacheBackend, get_result_cache
+from blog.warming import create_cache_warmer
+
+
+class Command(BaseCommand):
+    help = "Scrapes the popular queries again before their cached results expire."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--once', action='store_true', help="refresh the popular queries once and exit")
+        parser.add_argument('--top', type=int, help="number of popular queries kept warm")
+        parser.add_argument('--workers', type=int, help="number of queries scraped at the same time")
+        parser.add_argument('--interval', type=float, help="number of seconds between two checks")
+
+    def handle(self, *args, **options) -> None:
+        if isinstance(get_result_cache().backend, MemoryCacheBackend):
+            self.stderr.write(self.style.WARNING(
+                "SCRAPER_RESULT_CACHE uses the 'memory' backend: results are only cached in this process"
+            ))
+        config = dict(getattr(settings, 'SCRAPER_CACHE_WARMER', {}))
+        for option, key in (('top', 'TOP_N'), ('workers', 'MAX_WORKERS'), ('interval', 'INTERVAL')):
+            if options[option] is not None:
+                config[key] = options[option]
+        warmer = create_cache_warmer(config)
+        if options['once']:
+            nb_refreshed = warmer.run_once()
+            self.stdout.write(self.style.SUCCESS(f"{nb_refreshed} queries refreshed"))
+            return
+        self.stdout.write(f"Warming the top {warmer.top_n} queries every {warmer.interval} seconds")
+        try:
+            warmer.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Option',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=50)),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScrapedListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('website', models.CharField(max_length=20)),
+                ('query', models.CharField(max_length=200)),
+                ('item_url', models.URLField(max_length=1000)),
+                ('title', models.TextField()),
+                ('price_dollars', models.FloatField(null=True)),
+                ('rating_avg', models.FloatField(null=True)),
+                ('positive_feedback_percentage', models.FloatField(null=True)),
+                ('nb_items_sold', models.BigIntegerField(null=True)),
+                ('scraped_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item_url'], name='listing_item_url_idx'), models.Index(fields=['scraped_at'], name='listing_scraped_at_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scrapedlisting',
+            constraint=models.UniqueConstraint(fields=('website', 'query', 'item_url'), name='unique_listing_per_query'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_option_scrapedlisting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userinput',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userinput',
+            name='website',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='userinput',
+            name='output',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='userinput',
+            index=models.Index(fields=['created_at'], name='user_input_created_at_idx'),
+        ),
+    ]
@@ -3,8 +3,16 @@ from django.db import models
 
 # Create your models here.
 class UserInput(models.Model):
+    """Query submitted on the page, counted to find the popular queries warmed in cache (see blog/warming.py)."""
     text_input = models.TextField()
-    output = models.TextField()
+    output = models.TextField(blank=True)
+    website = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='user_input_created_at_idx'),
+        ]
 
 
 class Option(models.Model):
@@ -13,3 +21,40 @@ class Option(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ScrapedListingQuerySet(models.QuerySet):
+
+    def for_query(self, website: str, query: str):
+        """Listings scraped for a query (query being given by listings.get_listing_query)."""
+        return self.filter(website=website.lower(), query=query)
+
+
+class ScrapedListing(models.Model):
+    """
+    Item scraped on a website for a query. Each item is stored once per query, with the values of
+    its last scraping (see blog/listings.py).
+    """
+    website = models.CharField(max_length=20)
+    query = models.CharField(max_length=200)
+    item_url = models.URLField(max_length=1000)
+    title = models.TextField()
+    price_dollars = models.FloatField(null=True)
+    rating_avg = models.FloatField(null=True)
+    positive_feedback_percentage = models.FloatField(null=True)
+    nb_items_sold = models.BigIntegerField(null=True)
+    scraped_at = models.DateTimeField()
+
+    objects = ScrapedListingQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['website', 'query', 'item_url'], name='unique_listing_per_query'),
+        ]
+        indexes = [
+            models.Index(fields=['item_url'], name='listing_item_url_idx'),
+            models.Index(fields=['scraped_at'], name='listing_scraped_at_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
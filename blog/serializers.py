@@ -0,0 +1,33 @@
+"""
+Conversion of scraping results to JSON serializable records, sent to the page.
+"""
+import math
+from typing import Any
+
+
+def output_to_records(output) -> list[dict[str, Any]]:
+    """
+    Converts the ResultSet returned by main.main to JSON serializable records (NbItems objects are
+    converted to their string representation and NaN values to None).
+    :param output: ResultSet returned by main.main, or None
+    :return: list of dicts, one per item
+    """
+    if output is None:
+        return []
+    return [item_to_record(item) for item in output.to_dicts()]
+
+
+def item_to_record(item: dict[str, Any]) -> dict[str, Any]:
+    """
+    Converts the data of a single scraped item to a JSON serializable record, like output_to_records.
+    :param item: dict yielded by the iter_items method of a scraper
+    :return: dict with JSON serializable values
+    """
+    record = {}
+    for key, value in item.items():
+        if isinstance(value, float) and math.isnan(value):
+            value = None
+        elif value is not None and not isinstance(value, (str, int, float, bool)):
+            value = repr(value)
+        record[key] = value
+    return record
@@ -1,35 +1,337 @@
 """
 Main script. This script is called by python anywhere website to scrape data on given URL.
 """
-import pandas as pd
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Iterator
 
-from .scripts import ebay_scraping, compute_item_data, amazon_scraping
+from .scripts import (ebay_scraping, amazon_scraping, async_scraping, fetcher, merging, metrics, ranking,
+                      result_cache)
+from .scripts.records import ResultSet
+from .scripts.scraper import Scraper
 
 EBAY_BASE_URL: str = 'https://www.ebay.com/sch/i.html?_from=R40&_trksid=p4432023.m570.l1313&_nkw='
 
 AMAZON_BASE_URL: str = 'https://www.amazon.fr/s?k='
 
+# Number of items displayed on the website
+NB_RESULTS: int = 10
 
-def scrape_ebay(user_input: str) -> pd.DataFrame:
+# Number of item pages fetched at the same time by a search, and on each host by all searches
+MAX_WORKERS: int = 8
+
+MAX_PER_HOST: int = 4
+
+# Number of results pages crawled, and of items scraped. The crawl stops early once ENOUGH_ITEMS
+# items have the full user input in their title.
+MAX_PAGES: int = 3
+
+MAX_ITEMS: int = 150
+
+ENOUGH_ITEMS: int = 40
+
+# Maximum number of eBay item pages requested per search, for the items which can reach the results
+# (see planning.EnrichmentPlanner), and price bounds of these items (no bound if None)
+ENRICH_BUDGET: int = 40
+
+MIN_PRICE: float | None = None
+
+MAX_PRICE: float | None = None
+
+# Connect and read timeouts of requests (in seconds), and number of retries on 429/5xx errors
+TIMEOUT: tuple[float, float] = (5.0, 20.0)
+
+MAX_RETRIES: int = 3
+
+# Initial number of requests per second to each host, adapted to its throttling responses. A host
+# failing FAILURE_THRESHOLD times in a row is not requested during RESET_TIMEOUT seconds.
+RATE_PER_HOST: float = 10.0
+
+FAILURE_THRESHOLD: int = 5
+
+RESET_TIMEOUT: float = 30.0
+
+# Website option scraping all websites of SCRAPING_FUNCTIONS at the same time, and maximum number of
+# seconds waited for them (results of websites which did not answer in time are left out)
+ALL_WEBSITES: str = 'all'
+
+FAN_OUT_TIMEOUT: float = 60
+
+logger = logging.getLogger(__name__)
+
+
+def create_fetcher() -> fetcher.Fetcher:
+    """Creates the Fetcher shared by all scrapers of the process, with the settings of this module."""
+    return fetcher.Fetcher(pool_maxsize=MAX_WORKERS, timeout=TIMEOUT, max_retries=MAX_RETRIES,
+                           rate_per_host=RATE_PER_HOST, failure_threshold=FAILURE_THRESHOLD,
+                           reset_timeout=RESET_TIMEOUT)
+
+
+# HTTP connections are kept alive and shared by all scrapers of the process, from the first scraping
+fetcher.set_default_fetcher_factory(create_fetcher)
+
+
+def create_ebay_scraper(user_input: str) -> ebay_scraping.EBayScraper:
+    """Creates the scraper of eBay search results for given user input."""
+    return ebay_scraping.EBayScraper(url=EBAY_BASE_URL, user_input=user_input,
+                                     max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                                     max_pages=MAX_PAGES, max_items=MAX_ITEMS,
+                                     enough_items=ENOUGH_ITEMS, enrich_budget=ENRICH_BUDGET,
+                                     min_price=MIN_PRICE, max_price=MAX_PRICE)
+
+
+def create_amazon_scraper(user_input: str) -> amazon_scraping.AmazonScraper:
+    """Creates the scraper of Amazon search results for given user input."""
+    return amazon_scraping.AmazonScraper(url=AMAZON_BASE_URL, user_input=user_input,
+                                         max_pages=MAX_PAGES, max_items=MAX_ITEMS,
+                                         enough_items=ENOUGH_ITEMS)
+
+
+def create_async_ebay_scraper(user_input: str) -> async_scraping.AsyncEBayScraper:
+    """Creates the asynchronous scraper of eBay search results for given user input."""
+    return async_scraping.AsyncEBayScraper(url=EBAY_BASE_URL, user_input=user_input,
+                                           max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                                           max_pages=MAX_PAGES, max_items=MAX_ITEMS,
+                                           enough_items=ENOUGH_ITEMS, enrich_budget=ENRICH_BUDGET,
+                                           min_price=MIN_PRICE, max_price=MAX_PRICE)
+
+
+def create_async_amazon_scraper(user_input: str) -> async_scraping.AsyncAmazonScraper:
+    """Creates the asynchronous scraper of Amazon search results for given user input."""
+    return async_scraping.AsyncAmazonScraper(url=AMAZON_BASE_URL, user_input=user_input,
+                                             max_pages=MAX_PAGES, max_items=MAX_ITEMS,
+                                             enough_items=ENOUGH_ITEMS)
+
+
+def rank_ebay_items(items: list[dict[str, Any]], user_input: str) -> ResultSet:
+    """Ranks scraped eBay items and returns the 10 best ones, with their rank in the index column."""
+    with metrics.timer('rank', website='ebay'):
+        ranker = ranking.ItemRanker(user_input, k=NB_RESULTS)
+        for item in items:
+            ranker.add(item)
+        return ranker.result()
+
+
+def rank_amazon_items(items: list[dict[str, Any]], user_input: str) -> ResultSet:
+    """Returns the 10 first scraped Amazon items."""
+    return ResultSet.from_items(items[:NB_RESULTS])
+
+
+def store_listings(website: str, user_input: str, items: list[dict[str, Any]]) -> None:
+    """Enqueues scraped items to be stored as listings, in background (see blog/listings.py)."""
+    from ..listings import get_listing_store
+
+    store = get_listing_store()
+    if store is not None:
+        store.save(website, user_input, items)
+
+
+def scrape_ebay(user_input: str) -> ResultSet:
     """Runs scraping scripts for eBay scraping."""
-    scraper = ebay_scraping.EBayScraper(url=EBAY_BASE_URL, user_input=user_input)
-    scraped_data = scraper.scrape(user_input)
-    scraped_data = compute_item_data.main(scraped_data, user_input)
-    scraped_data.index = scraped_data.index.values + 1
-    scraped_data = scraped_data.reset_index()
-    return scraped_data.head(10)
+    scraper = create_ebay_scraper(user_input)
+    items = list(scraper.iter_items())
+    store_listings('ebay', user_input, items)
+    return rank_ebay_items(items, user_input)
 
 
-def scrape_amazon(user_input: str) -> pd.DataFrame:
+def scrape_amazon(user_input: str) -> ResultSet:
     """Runs scraping scripts for Amazon scraping."""
-    scraper = amazon_scraping.AmazonScraper(url=AMAZON_BASE_URL, user_input=user_input)
-    scraped_data = scraper.scrape(user_input)
-    return scraped_data.head(10)
+    scraper = create_amazon_scraper(user_input)
+    items = list(scraper.iter_items())
+    store_listings('amazon', user_input, items)
+    return rank_amazon_items(items, user_input)
+
+
+async def ascrape_ebay(user_input: str) -> ResultSet:
+    """Asynchronous version of scrape_ebay."""
+    items = [item async for item in create_async_ebay_scraper(user_input).aiter_items()]
+    store_listings('ebay', user_input, items)
+    return rank_ebay_items(items, user_input)
+
+
+async def ascrape_amazon(user_input: str) -> ResultSet:
+    """Asynchronous version of scrape_amazon."""
+    items = [item async for item in create_async_amazon_scraper(user_input).aiter_items()]
+    store_listings('amazon', user_input, items)
+    return rank_amazon_items(items, user_input)
+
+
+SCRAPING_FUNCTIONS: dict[str, Callable[[str], ResultSet]] = {
+    'ebay': scrape_ebay,
+    'amazon': scrape_amazon,
+}
+
+ASYNC_SCRAPING_FUNCTIONS: dict[str, Callable[[str], Awaitable[ResultSet]]] = {
+    'ebay': ascrape_ebay,
+    'amazon': ascrape_amazon,
+}
+
+# For each website, function creating its scraper and class ranking its items as they are scraped
+STREAMING_FUNCTIONS: dict[str, tuple[Callable[[str], Scraper], type]] = {
+    'ebay': (create_ebay_scraper, ranking.ItemRanker),
+    'amazon': (create_amazon_scraper, ranking.FirstItems),
+}
+
+
+def scrape_all(user_input: str) -> ResultSet:
+    """
+    Scrapes all websites at the same time (each one through main, so with its cached results), and
+    merges their results into a single ranking (see merging.py). Websites which fail or do not answer
+    within FAN_OUT_TIMEOUT seconds are left out, and listed in the failed_websites attribute of the
+    result. Websites whose stale cached results were used are listed in its stale_websites attribute.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(SCRAPING_FUNCTIONS), thread_name_prefix='fan-out')
+    futures = {website: executor.submit(main, user_input, website) for website in SCRAPING_FUNCTIONS}
+    try:
+        wait(futures.values(), timeout=FAN_OUT_TIMEOUT)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    results = {}
+    errors = {}
+    for website, future in futures.items():
+        if not future.done():
+            errors[website] = TimeoutError(f"{website} did not answer in {FAN_OUT_TIMEOUT} seconds")
+        elif future.exception() is not None:
+            errors[website] = future.exception()
+        else:
+            results[website] = future.result()
+    return merge_website_results(user_input, results, errors)
+
+
+async def ascrape_all(user_input: str) -> ResultSet:
+    """Asynchronous version of scrape_all, scraping the websites in tasks of the running event loop."""
+    tasks = {website: asyncio.create_task(amain(user_input, website)) for website in ASYNC_SCRAPING_FUNCTIONS}
+    await asyncio.wait(tasks.values(), timeout=FAN_OUT_TIMEOUT)
+    results = {}
+    errors = {}
+    for website, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            errors[website] = TimeoutError(f"{website} did not answer in {FAN_OUT_TIMEOUT} seconds")
+        elif task.exception() is not None:
+            errors[website] = task.exception()
+        else:
+            results[website] = task.result()
+    return merge_website_results(user_input, results, errors)
+
+
+def merge_website_results(user_input: str, results: dict[str, ResultSet | None],
+                          errors: dict[str, BaseException]) -> ResultSet:
+    """
+    Merges the results of the websites scraped by scrape_all, leaving out the failed ones.
+    :param user_input: user input given from website's form
+    :param results: result of each website which answered
+    :param errors: error of each website which failed or did not answer in time
+    :return: merged results
+    """
+    for website, error in errors.items():
+        metrics.increment('scraping_fan_out_failures_total', website=website)
+        logger.warning("Results of %s left out: %s", website, error)
+    if not results:
+        raise next(iter(errors.values()))
+    with metrics.timer('rank', website=ALL_WEBSITES):
+        merged = merging.merge_results(results, user_input, k=NB_RESULTS)
+    merged.attrs['failed_websites'] = list(errors)
+    merged.attrs['stale_websites'] = [website for website, result in results.items()
+                                      if result is not None and result.attrs.get('stale')]
+    return merged
+
+
+def main(user_input: str, website: str) -> ResultSet | None:
+    """
+    Runs processing scripts given the user input string, and the choice of website to scrape (or
+    ALL_WEBSITES). Results of a same query are cached (see SCRAPER_RESULT_CACHE setting), merged
+    results of all websites being computed again from the cached results of each one.
+    """
+    if website.lower() == ALL_WEBSITES:
+        with metrics.timer('total', website=ALL_WEBSITES):
+            return scrape_all(user_input)
+    scraping_function = SCRAPING_FUNCTIONS.get(website.lower())
+    if scraping_function is None:
+        return None
+    with metrics.timer('total', website=website.lower()):
+        return result_cache.get_result_cache().get_or_compute(
+            website, user_input, lambda: scraping_function(user_input)
+        )
+
+
+async def amain(user_input: str, website: str) -> ResultSet | None:
+    """
+    Asynchronous version of main, run by the async view: requests of the scraping are sent without
+    blocking the event loop, so that one worker serves many queries at the same time.
+    """
+    if website.lower() == ALL_WEBSITES:
+        with metrics.timer('total', website=ALL_WEBSITES):
+            return await ascrape_all(user_input)
+    scraping_function = ASYNC_SCRAPING_FUNCTIONS.get(website.lower())
+    if scraping_function is None:
+        return None
+    with metrics.timer('total', website=website.lower()):
+        return await result_cache.get_result_cache().aget_or_compute(
+            website, user_input, lambda: scraping_function(user_input)
+        )
+
+
+def peek(user_input: str, website: str) -> ResultSet | None:
+    """
+    Returns the fresh cached result of a query without scraping any website, nor counting cache hits
+    or misses (used to answer conditional requests, see views.results). With ALL_WEBSITES, the
+    results of all websites must be fresh in cache, and are merged.
+    :return: result of the query, or None if it is not fresh in cache
+    """
+    cache = result_cache.get_result_cache()
+    if website.lower() != ALL_WEBSITES:
+        return cache.peek(website, user_input) if website.lower() in SCRAPING_FUNCTIONS else None
+    results = {name: cache.peek(name, user_input) for name in SCRAPING_FUNCTIONS}
+    if any(result is None for result in results.values()):
+        return None
+    return merge_website_results(user_input, results, {})
+
+
+def refresh(user_input: str, website: str) -> ResultSet:
+    """
+    Scrapes a website again for given user input and caches the result, even if a fresh one is
+    cached (used by the cache warmer, see blog/warming.py). If the query is already being scraped,
+    its result is awaited instead. Request errors are raised, stale results are not returned.
+    """
+    return result_cache.get_result_cache().compute_once(
+        website, user_input, lambda: SCRAPING_FUNCTIONS[website.lower()](user_input), serve_stale=False
+    )
+
+
+def stream(user_input: str, website: str) -> Iterator[tuple[str, Any]]:
+    """
+    Streaming version of main: yields ('item', dict) for each item as soon as it is scraped, then
+    ('result', ResultSet) with the ranked results, which are cached. A cached result, or the result of
+    the same query being computed by another request, is yielded without items. Only the NB_RESULTS
+    best items are kept while scraping, each item being enqueued to the listing store as it is
+    scraped, so that the memory used does not grow with the number of items. With ALL_WEBSITES, only
+    the merged result is yielded. If the scraping fails on a request error, a stale cached result is
+    yielded if there is one.
+    """
+    if website.lower() == ALL_WEBSITES:
+        yield 'result', main(user_input, website)
+        return
+    functions = STREAMING_FUNCTIONS.get(website.lower())
+    if functions is None:
+        return
+    create_scraper, ranker_class = functions
+    cache = result_cache.get_result_cache()
+    cached = cache.get(website, user_input)
+    if cached is not None:
+        yield 'result', cached
+        return
 
+    def scrape() -> result_cache.ResultStream:
+        ranker = ranker_class(user_input, k=NB_RESULTS)
+        for item in create_scraper(user_input).iter_items():
+            with metrics.timer('rank', website=website.lower()):
+                ranker.add(item)
+            store_listings(website, user_input, [item])
+            yield 'item', item
+        with metrics.timer('rank', website=website.lower()):
+            return ranker.result()
 
-def main(user_input: str, website: str) -> pd.DataFrame | None:
-    """Runs processing scripts given the user input string, and the choice of website to scrape."""
-    if website.lower() == 'ebay':
-        return scrape_ebay(user_input)
-    elif website.lower() == 'amazon':
-        return scrape_amazon(user_input)
+    result = yield from cache.stream_once(website, user_input, scrape)
+    yield 'result', result
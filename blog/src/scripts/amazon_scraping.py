@@ -1,34 +1,75 @@
-import os
-from typing import Any
-import pandas as pd
-import requests
-from fake_useragent import UserAgent
-from bs4 import BeautifulSoup, Tag
+import logging
+from typing import Any, Iterator
+from urllib.parse import urlsplit
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from requests import Response
+
+from . import metrics
+from .extraction import ExtractionSpec, Extractor, Field, compile_spec
+from .fetcher import Fetcher, get_default_fetcher
+from .pagination import DEFAULT_ENOUGH_ITEMS, DEFAULT_MAX_ITEMS, DEFAULT_MAX_PAGES, CrawlBudget, iter_pages
+from .parsing import make_response_soup
+from .records import ResultSet
 from .scraper import Scraper, RequestsConnectionError
 
-OUTPUT_DIR: str = f"{os.path.dirname(__file__)}/../../output/"
+logger = logging.getLogger(__name__)
+
+# Only the search results are parsed on the search page
+SEARCH_PAGE_STRAINER: SoupStrainer = SoupStrainer('div', {'data-component-type': 's-search-result'})
+
+# Items of a search page, the price being written in two parts (whole part and fraction)
+SEARCH_ITEM_SPEC: ExtractionSpec = ExtractionSpec(
+    items='div[data-component-type=s-search-result]',
+    fields=(
+        Field('title', 'span.a-size-base-plus.a-color-base.a-text-normal'),
+        Field('price_dollars', ('span.a-price-whole', 'span.a-price-fraction'), strip=',', join='.',
+              pattern=r'^\d+\.\d+$', converter=float),
+        Field('asin', '', attribute='data-asin'),
+    ),
+)
+
+SEARCH_ITEM_EXTRACTOR: Extractor = compile_spec(SEARCH_ITEM_SPEC)
 
 
 class AmazonScraper(Scraper):
     """Processing class for Amazon website scraping."""
 
-    def __init__(self, url: str, user_input: str):
-        complete_url = self.get_complete_url(base_url=url, user_input=user_input)
-        self.base_soup: BeautifulSoup = self.get_html_soup(url=complete_url)
+    def __init__(self, url: str, user_input: str, fetcher: Fetcher | None = None,
+                 max_pages: int = DEFAULT_MAX_PAGES, max_items: int = DEFAULT_MAX_ITEMS,
+                 enough_items: int = DEFAULT_ENOUGH_ITEMS):
+        self.fetcher = fetcher if fetcher is not None else get_default_fetcher()
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self.enough_items = enough_items
+        self.user_input = user_input
+        self.complete_url = self.get_complete_url(base_url=url, user_input=user_input)
+        # Soup of the first results page, fetched by iter_items
+        self.base_soup: BeautifulSoup | None = None
 
-    @staticmethod
-    def get_html_soup(url: str) -> BeautifulSoup:
+    def get_html_soup(self, url: str, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
         """
         From given url, creates a soup object with HTML source code.
         :param url: url from site to scrap as a string
+        :param parse_only: if given, only the tags matching this strainer are parsed
+        :return: global soup object with all html source code
+        """
+        with metrics.timer('fetch', website='amazon'):
+            response = self.fetcher.get(url, random_user_agent=True)
+        return self.get_response_soup(response, parse_only=parse_only)
+
+    @staticmethod
+    def get_response_soup(response: Response, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+        """
+        From a response of Amazon website, creates a soup object with HTML source code.
+        :param response: response to a request on Amazon
+        :param parse_only: if given, only the tags matching this strainer are parsed
         :return: global soup object with all html source code
         """
-        user_agent = UserAgent()
-        response = requests.get(url, headers={'User-Agent': user_agent.random})
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            if soup.title is not None:
-                print(f"Title of page: {soup.title.text}")
+            with metrics.timer('parse', website='amazon'):
+                soup = make_response_soup(response, parse_only=parse_only)
+            if soup.title is not None and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Title of page: %s", soup.title.text)
             return soup
         raise RequestsConnectionError(website_name="Amazon", status_code=response.status_code,
                                       error_message=response.text)
@@ -37,60 +78,105 @@ class AmazonScraper(Scraper):
     def get_complete_url(base_url: str, user_input: str) -> str:
         """
         Given the base URL of the website, returns the complete url with user input.
-        :param base_url: base url of eBay website for user research
+        :param base_url: base url of Amazon website for user research
         :param user_input: user input given from website's form.
         :return: complete url
         """
         return f"{base_url}{user_input.replace(' ', '+')}"
 
+    def get_page_url(self, page: int) -> str:
+        """
+        Returns the url of given results page of the search.
+        :param page: number of the page, starting at 1
+        :return: url of the page
+        """
+        return f"{self.complete_url}&page={page}"
+
     @staticmethod
-    def get_price(tag: Tag) -> float | None:
-        """
-        From element tag, gets the price of sold object.
-        :param tag: Tag object where price is found
-        :return: price as float or None if no price is found
-        """
-        whole_part = tag.find('span', {'class': 'a-price-whole'}).text.strip(',')
-        decimal_part = tag.find('span', {'class': 'a-price-fraction'}).text
-        try:
-            return float(f"{whole_part}.{decimal_part}")
-        except ValueError:
-            print(f"no price: {whole_part}.{decimal_part}")
+    def get_item_tags(soup: BeautifulSoup) -> list[Tag]:
+        """
+        From soup object of a results page, gets the div tags of the items.
+        :param soup: soup object of a results page
+        :return: list of div tags
+        """
+        return SEARCH_ITEM_EXTRACTOR.find_item_tags(soup)
+
+    def fetch_page_item_tags(self, page: int) -> list[Tag]:
+        """
+        Requests given results page of the search, and gets the div tags of its items.
+        :param page: number of the page, starting at 2 (the first one is the base soup)
+        :return: list of div tags
+        """
+        return self.get_item_tags(self.get_html_soup(self.get_page_url(page), parse_only=SEARCH_PAGE_STRAINER))
+
+    def get_item_link(self, asin: str | None) -> str | None:
+        """
+        Gets the url of the product page of an article, built from its ASIN.
+        :param asin: ASIN of given article on Amazon
+        :return: url of the product page, or None if the article has no ASIN
+        """
+        if not asin:
             return None
+        url = urlsplit(self.complete_url)
+        return f"{url.scheme}://{url.netloc}/dp/{asin}"
 
     def extract_item_data(self, tag: Tag) -> dict[str, Any]:
         """
-        Fora given li tag, scrapes its data (i.e. scrapes a single item data).
-        :param tag: li tag of given article on eBay
-        :return: dictionary with a key value pair for each scraped chunk of data
+        For a given search result tag, scrapes its data (item pages of Amazon are not scraped).
+        :param tag: div tag of given article on Amazon
+        :return: dictionary with the title, price and item page url of the article
         """
-        title = tag.find('span', {'class': 'a-size-base-plus a-color-base a-text-normal'}).text
-        print(f"Scraped item '{title}'")
-        price = self.get_price(tag)
-        # item_link = tag.find('a', class_='s-item__link').get('href')
-        # item_soup = self.get_html_soup(url=item_link)
-        # rating_avg, positive_feedback_percentage, nb_items_sold = self.scrape_item_data(item_soup)
+        with metrics.timer('extract', website='amazon'):
+            data = SEARCH_ITEM_EXTRACTOR.extract(tag)
+        logger.debug("Scraped item '%s'", data['title'])
         return {
-            'title': title,
-            'price_dollars': price,
-            # 'rating_avg': rating_avg,
-            # 'positive_feedback_percentage': positive_feedback_percentage,
-            # 'nb_items_sold': nb_items_sold,
-            # 'item_url': item_link
+            'title': data['title'],
+            'price_dollars': data['price_dollars'],
+            'item_url': self.get_item_link(data['asin'])
         }
 
-    def scrape_pages(self) -> pd.DataFrame:
+    def create_crawl_budget(self) -> CrawlBudget:
+        """Creates the crawl budget of the search."""
+        return CrawlBudget(self.user_input, max_items=self.max_items, enough_items=self.enough_items)
+
+    def extract_page_items(self, target_tags: list[Tag], budget: CrawlBudget) -> list[dict[str, Any]]:
+        """
+        Scrapes the items of a results page, within the crawl budget (shared with AsyncAmazonScraper).
+        :param target_tags: tags of the items of the page
+        :param budget: crawl budget of the search, counting the scraped items
+        :return: list of items data
+        """
+        items = []
+        for tag in target_tags[:budget.remaining]:
+            item = self.extract_item_data(tag)
+            budget.add(item)
+            items.append(item)
+        return items
+
+    def iter_items(self) -> Iterator[dict[str, Any]]:
+        """
+        Yields the data of each item of the search, page after page (next pages being downloaded
+        concurrently), until the crawl budget is exhausted.
+        :return: iterator over items data
+        """
+        if self.base_soup is None:
+            self.base_soup = self.get_html_soup(url=self.complete_url, parse_only=SEARCH_PAGE_STRAINER)
+        budget = self.create_crawl_budget()
+        pages = iter_pages(self.get_item_tags(self.base_soup), self.fetch_page_item_tags,
+                           max_pages=self.max_pages)
+        for target_tags in pages:
+            yield from self.extract_page_items(target_tags, budget)
+            if budget.is_exhausted:
+                pages.close()
+                return
+
+    def scrape_pages(self) -> ResultSet:
         """
-        Scrape data given tags object.
-        :return: DataFrame with all scraped data
+        Scrape data given tags object, on all crawled results pages.
+        :return: ResultSet with all scraped data
         """
-        # Get all items from search (on first page)
-        target_tags = self.base_soup.find_all('div', {'data-component-type': 's-search-result'})
-        data = [self.extract_item_data(tag) for tag in target_tags]
-        return pd.DataFrame(data)
+        return ResultSet.from_items(self.iter_items())
 
-    def scrape(self, user_input: str) -> pd.DataFrame:
-        """Main function. Saves scraped data to a pickle file."""
-        data = self.scrape_pages()
-        data.to_pickle(f"{OUTPUT_DIR}scraped_data.pkl")
-        return data
+    def scrape(self, user_input: str) -> ResultSet:
+        """Main function."""
+        return self.scrape_pages()
@@ -0,0 +1,193 @@
+"""
+Asynchronous HTTP layer of the async scrapers (see async_scraping.py): requests wait for the network
+without holding a thread, with an httpx AsyncClient kept for each event loop. It follows the settings
+of a Fetcher (timeouts, retries, user agents) and shares its rate limits and circuit breakers, so that
+sync and async scrapings of a host are throttled together. Without httpx, requests are sent by the
+Fetcher in a thread of the event loop's executor.
+"""
+import asyncio
+import threading
+import weakref
+from typing import Any
+from urllib.parse import urlsplit
+
+import requests
+
+from . import metrics
+from .fetcher import CHUNK_SIZE, RETRY_STATUS_CODES, Fetcher, MarkerScanner, get_default_fetcher, set_content
+from .throttling import TokenBucket
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Maximum number of connections opened by the client of each event loop, in total and kept alive
+DEFAULT_MAX_CONNECTIONS: int = 100
+
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+
+
+class AsyncFetcher:
+    """Asynchronous counterpart of Fetcher, with the same rate limits and circuit breakers."""
+
+    def __init__(self, fetcher: Fetcher | None = None, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS) -> None:
+        """
+        Constructor of AsyncFetcher class.
+        :param fetcher: Fetcher whose settings, rate limits and circuit breakers are used, the one
+            shared by the process by default
+        :param max_connections: maximum number of connections opened by the client of an event loop
+        :param max_keepalive_connections: maximum number of idle connections kept alive
+        """
+        self._fetcher = fetcher
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self._clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any] = weakref.WeakKeyDictionary()
+        self._semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def fetcher(self) -> Fetcher:
+        return self._fetcher if self._fetcher is not None else get_default_fetcher()
+
+    def get_client(self) -> 'httpx.AsyncClient':
+        """Returns the client of the running event loop, creating it on first call."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                connect_timeout, read_timeout = self.fetcher.timeout
+                client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_keepalive_connections),
+                    follow_redirects=True,
+                )
+                self._clients[loop] = client
+        return client
+
+    def get_semaphore(self) -> asyncio.Semaphore:
+        """
+        Returns the semaphore limiting the requests sent at the same time in the running event loop:
+        requests wait for a connection here rather than in the pool of the client, which is slow to
+        scan when many requests are queued.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_connections)
+        return semaphore
+
+    async def get(self, url: str, headers: dict[str, str] | None = None, random_user_agent: bool = False,
+                  stop_markers: tuple[bytes, ...] = (), tail_bytes: int = CHUNK_SIZE) -> Any:
+        """
+        Sends a GET request on given url, like Fetcher.get.
+        :param url: url to request
+        :param headers: additional headers of the request
+        :param random_user_agent: if True, sends a random User-Agent header
+        :param stop_markers: if given, the body of a 200 response is only read until these markers
+            and tail_bytes more bytes (see MarkerScanner)
+        :param tail_bytes: number of bytes read after the last stop marker
+        :return: response of the website (after retries), with the status_code, headers, content and
+            text of a requests Response
+        :raise HostUnavailableError: if the host kept failing recently, or if its rate limit would
+            make the request wait too long
+        :raise requests.ConnectionError: if the request failed after all retries
+        """
+        fetcher = self.fetcher
+        if httpx is None:
+            return await asyncio.to_thread(fetcher.get, url, headers=headers, random_user_agent=random_user_agent,
+                                           stop_markers=stop_markers, tail_bytes=tail_bytes)
+        headers = fetcher.get_headers(headers, random_user_agent)
+        host = urlsplit(url).netloc
+        breaker = fetcher.throttler.get_breaker(host)
+        bucket = fetcher.throttler.get_bucket(host)
+        for attempt in range(fetcher.max_retries + 1):
+            fetcher.check_breaker(host, breaker)
+            if bucket is not None and not await self.acquire(bucket, fetcher.max_wait):
+                raise fetcher.get_rate_limited_error(host)
+            backoff = fetcher.backoff_factor * 2 ** attempt
+            try:
+                response = await self.send(url, headers, host, stop_markers, tail_bytes)
+            except httpx.HTTPError as error:
+                breaker.record_failure()
+                if attempt == fetcher.max_retries:
+                    raise requests.ConnectionError(f"GET {url} failed: {error!r}") from error
+                metrics.increment('scraping_retries_total', host=host)
+                await asyncio.sleep(backoff)
+                continue
+            delay = fetcher.get_retry_delay(host, response, breaker, bucket, attempt)
+            # Server errors are retried here, as urllib3 does for Fetcher
+            if delay is None and response.status_code in RETRY_STATUS_CODES and attempt < fetcher.max_retries:
+                metrics.increment('scraping_retries_total', host=host)
+                delay = backoff
+            if delay is None:
+                return response
+            if delay:
+                await asyncio.sleep(delay)
+        return response
+
+    @staticmethod
+    async def acquire(bucket: TokenBucket, timeout: float) -> bool:
+        """Takes a token of a bucket, sleeping without blocking the event loop (see TokenBucket.acquire)."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            wait = bucket.try_acquire()
+            if not wait:
+                return True
+            if loop.time() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    async def send(self, url: str, headers: dict[str, str], host: str, stop_markers: tuple[bytes, ...],
+                   tail_bytes: int) -> 'httpx.Response':
+        """Sends a request and reads its body (until stop markers if given), counting the response."""
+        client = self.get_client()
+        async with self.get_semaphore():
+            response = await client.send(client.build_request('GET', url, headers=headers), stream=True)
+            try:
+                if stop_markers and response.status_code == 200:
+                    scanner = MarkerScanner(stop_markers, tail_bytes)
+                    chunks = []
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        chunks.append(chunk)
+                        if scanner.feed(chunk):
+                            metrics.increment('scraping_truncated_responses_total', host=host)
+                            break
+                    set_content(response, b''.join(chunks))
+                else:
+                    await response.aread()
+            finally:
+                await response.aclose()
+        metrics.increment('scraping_responses_total', host=host, status=str(response.status_code))
+        metrics.increment('scraping_downloaded_bytes_total', response.num_bytes_downloaded, host=host)
+        return response
+
+    async def aclose(self) -> None:
+        """Closes the client of the running event loop."""
+        with self._lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+            self._semaphores.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+_default_async_fetcher: AsyncFetcher | None = None
+_default_async_fetcher_lock = threading.Lock()
+
+
+def get_default_async_fetcher() -> AsyncFetcher:
+    """
+    Returns the AsyncFetcher shared by all async scrapers of the process, following the default
+    Fetcher, creating it on first call.
+    """
+    global _default_async_fetcher
+    if _default_async_fetcher is None:
+        with _default_async_fetcher_lock:
+            if _default_async_fetcher is None:
+                _default_async_fetcher = AsyncFetcher()
+    return _default_async_fetcher
@@ -0,0 +1,183 @@
+"""
+Asynchronous versions of the scrapers (see AsyncScraper), used by the async view: all requests of a
+scraping are sent by an AsyncFetcher, so that one event loop runs many scrapings at the same time
+without a thread per request. Pages are parsed and extracted by the methods of the sync scrapers.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+from . import metrics
+from .amazon_scraping import SEARCH_PAGE_STRAINER as AMAZON_SEARCH_PAGE_STRAINER, AmazonScraper
+from .async_fetcher import AsyncFetcher, get_default_async_fetcher
+from .concurrency import amap_ordered
+from .ebay_scraping import ITEM_PAGE_TAIL_BYTES, SEARCH_PAGE_STRAINER as EBAY_SEARCH_PAGE_STRAINER, EBayScraper, \
+    parse_item_page
+from .item_cache import canonical_item_url
+from .pagination import aiter_pages
+from .parsing import get_declared_encoding
+from .records import ResultSet
+from .scraper import SCRAPING_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEBayScraper(EBayScraper):
+    """Asynchronous version of EBayScraper."""
+
+    def __init__(self, url: str, user_input: str, async_fetcher: AsyncFetcher | None = None,
+                 **kwargs: Any) -> None:
+        """
+        Constructor of AsyncEBayScraper class.
+        :param url: base url of eBay website for user research
+        :param user_input: user input given from website's form
+        :param async_fetcher: asynchronous HTTP fetcher to use, the one shared by the process by default
+        :param kwargs: other arguments of EBayScraper (the fetcher being the one of the sync methods)
+        """
+        super().__init__(url, user_input, **kwargs)
+        self.async_fetcher = async_fetcher if async_fetcher is not None else get_default_async_fetcher()
+
+    async def aget_html_soup(self, url: str, parse_only: SoupStrainer | None = None,
+                             stop_markers: tuple[bytes, ...] = ()) -> BeautifulSoup:
+        """Asynchronous version of EBayScraper.get_html_soup."""
+        with metrics.timer('fetch', website='ebay'):
+            response = await self.async_fetcher.get(url, stop_markers=stop_markers,
+                                                    tail_bytes=ITEM_PAGE_TAIL_BYTES)
+        return self.get_response_soup(response, parse_only=parse_only)
+
+    async def afetch_page_item_tags(self, page: int) -> list[Tag]:
+        """Asynchronous version of EBayScraper.fetch_page_item_tags."""
+        return self.get_item_tags(await self.aget_html_soup(self.get_page_url(page),
+                                                            parse_only=EBAY_SEARCH_PAGE_STRAINER))
+
+    async def ascrape_item_response(self, response: Any) -> tuple[float | int | None, ...]:
+        """
+        Asynchronous version of EBayScraper.scrape_item_response: with a parser pool, the event loop
+        serves other requests while the page is parsed.
+        """
+        if self.parser_pool is None or response.status_code != 200:
+            return self.scrape_item_response(response)
+        with metrics.timer('parse', website='ebay'):
+            data = await self.parser_pool.arun(parse_item_page, response.content, get_declared_encoding(response))
+        return self.item_data_from_dict(data)
+
+    async def aget_item_page_data(self, item_link: str) -> tuple[float | int | None, ...]:
+        """
+        Asynchronous version of EBayScraper.get_item_page_data, with the same use of the item cache
+        (whose sqlite queries are run in threads).
+        """
+        url = canonical_item_url(item_link)
+        cached = await asyncio.to_thread(self.get_cached_item_page, url) if self.item_cache is not None else None
+        if cached is not None and cached.is_fresh:
+            return self.reuse_cached_item_page(cached, 'fresh')
+        try:
+            with metrics.timer('fetch', website='ebay'):
+                response = await self.async_fetcher.get(item_link, **self.get_item_page_request(cached))
+            if response.status_code == 304 and cached is not None:
+                return await asyncio.to_thread(self.revalidate_cached_item_page, url, cached)
+            item_data = await self.ascrape_item_response(response)
+        except SCRAPING_ERRORS:
+            if cached is None:
+                raise
+            return self.reuse_cached_item_page(cached, 'stale')
+        if self.item_cache is not None:
+            await asyncio.to_thread(self.cache_item_page, url, item_data, response)
+        return item_data
+
+    async def aextract_item_data(self, li_tag: Tag) -> dict[str, Any]:
+        """Asynchronous version of EBayScraper.extract_item_data."""
+        return await self.aenrich_item(self.extract_search_item_data(li_tag))
+
+    async def aenrich_item(self, data: dict[str, Any]) -> dict[str, Any]:
+        """Asynchronous version of EBayScraper.enrich_item."""
+        try:
+            item_data = await self.aget_item_page_data(data['item_url'])
+        except SCRAPING_ERRORS as error:
+            item_data = self.degrade_item(data, error)
+        return self.make_item(data, item_data)
+
+    async def aiter_candidate_pages(self) -> AsyncIterator[list[dict[str, Any]]]:
+        """Asynchronous version of EBayScraper.iter_candidate_pages, fetching the first results page."""
+        if self.base_soup is None:
+            self.base_soup = await self.aget_html_soup(self.complete_url, parse_only=EBAY_SEARCH_PAGE_STRAINER)
+        budget = self.create_crawl_budget()
+        pages = aiter_pages(self.get_item_tags(self.base_soup), self.afetch_page_item_tags,
+                            max_pages=self.max_pages)
+        try:
+            async for target_li_tags in pages:
+                yield self.extract_page_candidates(target_li_tags, budget)
+                if budget.is_exhausted:
+                    return
+        finally:
+            await pages.aclose()
+
+    def amap_enrich_items(self, items: list[dict[str, Any]]) -> AsyncIterator[dict[str, Any]]:
+        """Asynchronous version of EBayScraper.imap_enrich_items."""
+        return amap_ordered(self.aenrich_item, items, host_of=self.get_item_host,
+                            max_workers=self.max_workers, max_per_host=self.max_per_host)
+
+    async def aiter_items(self) -> AsyncIterator[dict[str, Any]]:
+        """Asynchronous version of EBayScraper.iter_items."""
+        planner = self.create_planner()
+        async for candidates in self.aiter_candidate_pages():
+            async for item in self.amap_enrich_items(planner.plan_page(candidates)):
+                planner.add_enriched(item)
+                yield item
+        async for item in self.amap_enrich_items(planner.get_fallback()):
+            yield item
+        planner.count()
+        for item in planner.get_skipped():
+            yield item
+
+    async def ascrape(self) -> ResultSet:
+        """Asynchronous version of EBayScraper.scrape."""
+        return ResultSet.from_items([item async for item in self.aiter_items()])
+
+
+class AsyncAmazonScraper(AmazonScraper):
+    """Asynchronous version of AmazonScraper."""
+
+    def __init__(self, url: str, user_input: str, async_fetcher: AsyncFetcher | None = None,
+                 **kwargs: Any) -> None:
+        """
+        Constructor of AsyncAmazonScraper class.
+        :param url: base url of Amazon website for user research
+        :param user_input: user input given from website's form
+        :param async_fetcher: asynchronous HTTP fetcher to use, the one shared by the process by default
+        :param kwargs: other arguments of AmazonScraper (the fetcher being the one of the sync methods)
+        """
+        super().__init__(url, user_input, **kwargs)
+        self.async_fetcher = async_fetcher if async_fetcher is not None else get_default_async_fetcher()
+
+    async def aget_html_soup(self, url: str, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+        """Asynchronous version of AmazonScraper.get_html_soup."""
+        with metrics.timer('fetch', website='amazon'):
+            response = await self.async_fetcher.get(url, random_user_agent=True)
+        return self.get_response_soup(response, parse_only=parse_only)
+
+    async def afetch_page_item_tags(self, page: int) -> list[Tag]:
+        """Asynchronous version of AmazonScraper.fetch_page_item_tags."""
+        return self.get_item_tags(await self.aget_html_soup(self.get_page_url(page),
+                                                            parse_only=AMAZON_SEARCH_PAGE_STRAINER))
+
+    async def aiter_items(self) -> AsyncIterator[dict[str, Any]]:
+        """Asynchronous version of AmazonScraper.iter_items, fetching the first results page."""
+        if self.base_soup is None:
+            self.base_soup = await self.aget_html_soup(self.complete_url, parse_only=AMAZON_SEARCH_PAGE_STRAINER)
+        budget = self.create_crawl_budget()
+        pages = aiter_pages(self.get_item_tags(self.base_soup), self.afetch_page_item_tags,
+                            max_pages=self.max_pages)
+        try:
+            async for target_tags in pages:
+                for item in self.extract_page_items(target_tags, budget):
+                    yield item
+                if budget.is_exhausted:
+                    return
+        finally:
+            await pages.aclose()
+
+    async def ascrape(self) -> ResultSet:
+        """Asynchronous version of AmazonScraper.scrape."""
+        return ResultSet.from_items([item async for item in self.aiter_items()])
@@ -1,6 +1,23 @@
+"""
+Ranking of scraped eBay items in DataFrames (see records.ResultSet.to_dataframe), for analytics on
+results: same ranking as ranking.ItemRanker, which ranks the items of the queries without pandas.
+"""
+import numpy as np
 import pandas as pd
 
-SORTING_ORDER = ["nb_items_int", "positive_feedback_percentage", "rating_avg", "price_dollars"]
+from .items_arrays import NbItemsDtype, parse_nb_items
+from .ranking import ASCENDING, MIN_MATCHING_ITEMS, SORTING_ORDER
+
+
+def get_nb_items_int(nb_items_sold: pd.Series) -> pd.Series:
+    """
+    Converts the nb_items_sold column to integers, without going through each NbItems object.
+    :param nb_items_sold: column of nb_items dtype, or of NbItems objects / strings
+    :return: Series of nullable int64 values, with the index of nb_items_sold
+    """
+    if isinstance(nb_items_sold.dtype, NbItemsDtype):
+        return pd.Series(nb_items_sold.array.as_int, index=nb_items_sold.index)
+    return parse_nb_items(nb_items_sold.astype('string'))
 
 
 def sort_scraped_df(df: pd.DataFrame) -> pd.DataFrame:
@@ -10,9 +27,19 @@ def sort_scraped_df(df: pd.DataFrame) -> pd.DataFrame:
     :return: sorted DataFrame
     """
     df = df.dropna().copy()
-    df['nb_items_int'] = df['nb_items_sold'].map(lambda nb: nb.as_int)
+    df['nb_items_int'] = get_nb_items_int(df['nb_items_sold'])
     assert all(col in df.columns for col in SORTING_ORDER)
-    return df.sort_values(by=SORTING_ORDER, ascending=(False, False, False, True), ignore_index=True)
+    return df.sort_values(by=SORTING_ORDER, ascending=ASCENDING, ignore_index=True)
+
+
+def get_full_input_mask(df: pd.DataFrame, user_input: str) -> pd.Series:
+    """
+    Returns a boolean Series, True for items having the full user input in their title.
+    :param df: DataFrame with a title column
+    :param user_input: given user input fetched from website form
+    :return: boolean Series with the index of df
+    """
+    return df.title.str.contains(user_input, case=False, regex=False)
 
 
 def remove_items_not_full_input(df: pd.DataFrame, user_input: str) -> pd.DataFrame:
@@ -22,19 +49,61 @@ def remove_items_not_full_input(df: pd.DataFrame, user_input: str) -> pd.DataFra
     :param user_input: given user input fetched from website form
     :return: filtered DataFrame
     """
-    resulting_df = df.loc[df.title.str.contains(user_input, case=False)].reset_index(drop=True)
-    if resulting_df.shape[0] > 10:
+    resulting_df = df.loc[get_full_input_mask(df, user_input)].reset_index(drop=True)
+    if resulting_df.shape[0] > MIN_MATCHING_ITEMS:
         return resulting_df
     return df
 
 
-def main(scraped_data: pd.DataFrame, user_input: str) -> pd.DataFrame:
+def top_k_index(keys: pd.DataFrame, k: int) -> pd.Index:
+    """
+    Returns the index of the k best rows of a DataFrame of sorting keys, from the best to the worst
+    one. The keys are partially sorted with nlargest, after being converted to floats (ascending keys
+    being negated). Like a stable sort, a row ranks before the next rows with the same keys.
+    :param keys: DataFrame with SORTING_ORDER columns and no missing value
+    :param k: number of rows to select
+    :return: index labels of the k best rows (or of all rows if there are less than k)
+    """
+    keys = pd.DataFrame({
+        column: -keys[column].astype('float64') if ascending else keys[column].astype('float64')
+        for column, ascending in zip(SORTING_ORDER, ASCENDING)
+    }, index=keys.index).assign(_position=-np.arange(len(keys)))
+    return keys.nlargest(k, columns=[*SORTING_ORDER, '_position']).index
+
+
+def select_top_k(df: pd.DataFrame, user_input: str, k: int) -> pd.DataFrame:
+    """
+    Same result as sort_scraped_df followed by remove_items_not_full_input and head(k), without
+    copying nor sorting the whole DataFrame: only sorting keys of the kept rows are copied, and
+    partially sorted.
+    :param df: DataFrame with scraped data
+    :param user_input: given user input fetched from website form
+    :param k: number of items to keep
+    :return: DataFrame with the k best items, sorted
+    """
+    kept_rows = df.notna().all(axis=1)
+    matching_rows = kept_rows & get_full_input_mask(df, user_input)
+    if matching_rows.sum() > MIN_MATCHING_ITEMS:
+        kept_rows = matching_rows
+    nb_items_int = get_nb_items_int(df.loc[kept_rows, 'nb_items_sold'])
+    keys = pd.DataFrame({'nb_items_int': nb_items_int}).join(
+        df.loc[kept_rows, SORTING_ORDER[1:]]
+    )
+    best_index = top_k_index(keys, k)
+    resulting_df = df.loc[best_index].assign(nb_items_int=nb_items_int.loc[best_index])
+    return resulting_df.reset_index(drop=True)
+
+
+def main(scraped_data: pd.DataFrame, user_input: str, k: int | None = None) -> pd.DataFrame:
     """
     Processes scraped data from eBay and returns a copy of it after processing.
     :param scraped_data: data that was scraped on eBay website
     :param user_input: input of user on web scraping website
+    :param k: if given, only the k best items are selected (without sorting all of them)
     :return: sorted DataFrame to display on website
     """
+    if k is not None:
+        return select_top_k(scraped_data, user_input, k)
     resulting_df = sort_scraped_df(scraped_data)
     resulting_df = remove_items_not_full_input(resulting_df, user_input)
     return resulting_df
@@ -0,0 +1,137 @@
+"""
+Helpers to run blocking calls (e.g. item page requests) concurrently, with a bounded pool of workers
+and a limit on the number of simultaneous calls made to a same host, and their asyncio counterparts
+for coroutines. The limits per host are shared by all calls of the process, so that concurrent
+searches do not multiply the requests sent to a host.
+"""
+import asyncio
+import threading
+import weakref
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+DEFAULT_MAX_WORKERS: int = 8
+DEFAULT_MAX_PER_HOST: int = 4
+
+
+class HostLimiter:
+    """Limits the number of calls running at the same time for each host."""
+
+    def __init__(self, max_per_host: int = DEFAULT_MAX_PER_HOST) -> None:
+        self.max_per_host = max_per_host
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = defaultdict(
+            lambda: threading.BoundedSemaphore(self.max_per_host)
+        )
+
+    @contextmanager
+    def limit(self, host: str) -> Iterator[None]:
+        """
+        Context manager blocking until a slot is available for given host.
+        :param host: network location of the called url (e.g. 'www.ebay.com')
+        """
+        with self._lock:
+            semaphore = self._semaphores[host]
+        with semaphore:
+            yield
+
+
+# Limiters shared by all calls of imap_ordered in the process, by maximum number of calls per host
+_host_limiters: dict[int, HostLimiter] = {}
+_host_limiters_lock = threading.Lock()
+
+# Semaphores shared by all calls of amap_ordered in each event loop, by host and maximum number of calls
+_host_semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, int], asyncio.Semaphore]] = \
+    weakref.WeakKeyDictionary()
+
+
+def get_host_limiter(max_per_host: int = DEFAULT_MAX_PER_HOST) -> HostLimiter:
+    """
+    Returns the HostLimiter shared by the process for given limit, creating it on first call.
+    :param max_per_host: maximum number of calls running at the same time on a same host
+    :return: HostLimiter object
+    """
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(max_per_host)
+        if limiter is None:
+            limiter = _host_limiters[max_per_host] = HostLimiter(max_per_host)
+    return limiter
+
+
+def get_host_semaphore(host: str, max_per_host: int = DEFAULT_MAX_PER_HOST) -> asyncio.Semaphore:
+    """
+    Asynchronous version of get_host_limiter: returns the semaphore of given host shared by the
+    running event loop for given limit, creating it on first call.
+    :param host: network location of the called url (e.g. 'www.ebay.com')
+    :param max_per_host: maximum number of calls running at the same time on this host
+    :return: asyncio.Semaphore object
+    """
+    loop = asyncio.get_running_loop()
+    with _host_limiters_lock:
+        semaphores = _host_semaphores.setdefault(loop, {})
+        semaphore = semaphores.get((host, max_per_host))
+        if semaphore is None:
+            semaphore = semaphores[host, max_per_host] = asyncio.Semaphore(max_per_host)
+    return semaphore
+
+
+def imap_ordered(func: Callable[[T], R], items: Iterable[T], host_of: Callable[[T], str],
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_per_host: int = DEFAULT_MAX_PER_HOST) -> Iterator[R]:
+    """
+    Applies func to every item with a bounded pool of threads, and yields the results in the
+    order of given items (not in the order the calls complete), each one as soon as it is available.
+    :param func: blocking function to call on each item
+    :param items: items to process
+    :param host_of: function giving the host called when processing an item
+    :param max_workers: maximum number of calls running at the same time, 1 runs them sequentially
+    :param max_per_host: maximum number of calls running at the same time on a same host, by all
+        calls of imap_ordered with this limit in the process
+    :return: iterator over results, one per item
+    """
+    limiter = get_host_limiter(max_per_host)
+
+    def run(item: T) -> R:
+        with limiter.limit(host_of(item)):
+            return func(item)
+
+    if max_workers <= 1:
+        yield from map(run, items)
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(run, items)
+
+
+async def amap_ordered(func: Callable[[T], Awaitable[R]], items: Iterable[T], host_of: Callable[[T], str],
+                       max_workers: int = DEFAULT_MAX_WORKERS,
+                       max_per_host: int = DEFAULT_MAX_PER_HOST) -> AsyncIterator[R]:
+    """
+    Asynchronous version of imap_ordered: runs func on every item in tasks of the running event loop
+    (at most max_workers at the same time, and max_per_host on a same host), and yields the results
+    in the order of given items. Pending tasks are cancelled when the caller stops iterating.
+    :param func: coroutine function to call on each item
+    :param items: items to process
+    :param host_of: function giving the host called when processing an item
+    :param max_workers: maximum number of calls running at the same time
+    :param max_per_host: maximum number of calls running at the same time on a same host, by all
+        calls of amap_ordered with this limit in the event loop
+    :return: asynchronous iterator over results, one per item
+    """
+    workers = asyncio.Semaphore(max(max_workers, 1))
+
+    async def run(item: T) -> R:
+        async with workers, get_host_semaphore(host_of(item), max_per_host):
+            return await func(item)
+
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,24 @@
+"""
+Access to the settings of the Django project from the scraping scripts, which can also run without
+Django (default values are then used).
+"""
+from typing import Any
+
+
+def get_setting(name: str, default: Any = None) -> Any:
+    """
+    Returns a setting of the Django project, or default if Django is not installed or configured
+    (e.g. when running the scraping scripts alone).
+    :param name: name of the setting
+    :param default: value returned if the setting is missing
+    :return: value of the setting
+    """
+    try:
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+    except ImportError:
+        return default
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        return default
@@ -1,39 +1,157 @@
 """
 Given the page associated to user input, scrapes data on main page.
 """
-import os
-import re
-from typing import Any
+import logging
+from typing import Any, Iterator
+from urllib.parse import urlsplit
 
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup, Tag
-from .items_classes import NbItems
-from .scraper import RequestsConnectionError, Scraper
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from requests import Response
 
-OUTPUT_DIR: str = f"{os.path.dirname(__file__)}/../../output/"
+from . import metrics
+from .concurrency import DEFAULT_MAX_PER_HOST, DEFAULT_MAX_WORKERS, imap_ordered
+from .extraction import ExtractionSpec, Extractor, Field, compile_spec, last_value, parse_number
+from .fetcher import Fetcher, get_default_fetcher
+from .item_cache import CachedItemPage, ItemPageCache, canonical_item_url, get_item_cache
+from .items_classes import NB_ITEMS_PATTERN, NbItems
+from .pagination import DEFAULT_ENOUGH_ITEMS, DEFAULT_MAX_ITEMS, DEFAULT_MAX_PAGES, CrawlBudget, iter_pages
+from .parser_pool import ParserPool, get_parser_pool
+from .parsing import get_declared_encoding, make_response_soup, make_soup
+from .planning import EnrichmentPlanner
+from .records import ResultSet
+from .scraper import SCRAPING_ERRORS, RequestsConnectionError, Scraper
+
+logger = logging.getLogger(__name__)
+
+# Only the parts of the pages read by the scraper are parsed
+SEARCH_PAGE_STRAINER: SoupStrainer = SoupStrainer('li', class_='s-item s-item__pl-on-bottom')
+
+ITEM_PAGE_STRAINER: SoupStrainer = SoupStrainer('div', class_=[
+    'fdbk-detail-seller-rating',
+    'd-stores-info-categories__container__info__section__item',
+])
+
+# Item pages are only downloaded until the first tag of each needed block (seller ratings and store
+# info) was received, and ITEM_PAGE_TAIL_BYTES more bytes holding the rest of the blocks
+ITEM_PAGE_MARKERS: tuple[bytes, ...] = (
+    b'fdbk-detail-seller-rating',
+    b'd-stores-info-categories__container__info__section__item',
+)
+
+ITEM_PAGE_TAIL_BYTES: int = 8 * 1024
+
+# Ratings are floats between 0 and 5
+RATING_PATTERN: str = r'^(0|[1-4](\.\d+)?|5(\.0*)?)$'
+
+# Bold values of the store info section: positive feedback percentage and number of items sold
+STORE_INFO_SELECTOR: str = (
+    'div.d-stores-info-categories__container__info__section__item span.ux-textspans.ux-textspans--BOLD'
+)
+
+
+def average_rating(ratings: list[float]) -> float:
+    """Returns the average of the ratings of a seller."""
+    return round(sum(ratings) / len(ratings), 3)
+
+
+# Items of a search page. The price of items with a price range is the highest one.
+SEARCH_ITEM_SPEC: ExtractionSpec = ExtractionSpec(
+    items='li.s-item.s-item__pl-on-bottom',
+    fields=(
+        Field('title', 'span[role=heading]'),
+        Field('price_dollars', 'span.s-item__price', pattern=r'^(?:.*\s)?\$?(?P<value>[\d,]+(?:\.\d+)?)$',
+              converter=parse_number),
+        Field('item_url', 'a.s-item__link', attribute='href'),
+    ),
+)
+
+# Seller data of an item page
+ITEM_PAGE_SPEC: ExtractionSpec = ExtractionSpec(fields=(
+    Field('rating_avg', 'div.fdbk-detail-seller-rating span.fdbk-detail-seller-rating__value',
+          pattern=RATING_PATTERN, converter=float, many=True, reduce=average_rating, default=float('nan')),
+    # If the store info section has several values of a same kind, the last one is kept
+    Field('positive_feedback_percentage', STORE_INFO_SELECTOR, pattern=r'^(?P<value>\d+(?:\.\d+)?)%$',
+          converter=float, many=True, reduce=last_value),
+    Field('nb_items_sold', STORE_INFO_SELECTOR, pattern=NB_ITEMS_PATTERN, converter=NbItems.from_str, many=True,
+          reduce=last_value),
+))
+
+SEARCH_ITEM_EXTRACTOR: Extractor = compile_spec(SEARCH_ITEM_SPEC)
+
+ITEM_PAGE_EXTRACTOR: Extractor = compile_spec(ITEM_PAGE_SPEC)
 
 
 class EBayScraper(Scraper):
     """Class containing scraping methods for BeautifulSoup."""
 
-    def __init__(self, url: str, user_input: str) -> None:
-        """Constructor of Scraper class."""
-        complete_url = self.get_complete_url(base_url=url, user_input=user_input)
-        self.base_soup: BeautifulSoup = self.get_html_soup(complete_url)
+    def __init__(self, url: str, user_input: str, max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_per_host: int = DEFAULT_MAX_PER_HOST, fetcher: Fetcher | None = None,
+                 item_cache: ItemPageCache | None = None, max_pages: int = DEFAULT_MAX_PAGES,
+                 max_items: int = DEFAULT_MAX_ITEMS, enough_items: int = DEFAULT_ENOUGH_ITEMS,
+                 parser_pool: ParserPool | None = None, enrich_budget: int | None = None,
+                 min_price: float | None = None, max_price: float | None = None) -> None:
+        """
+        Constructor of Scraper class. Nothing is requested before the items are iterated.
+        :param url: base url of eBay website for user research
+        :param user_input: user input given from website's form
+        :param max_workers: number of item pages fetched at the same time, 1 fetches them one by one
+        :param max_per_host: number of item pages fetched at the same time on a same host
+        :param fetcher: HTTP fetcher to use, the one shared by the process by default
+        :param item_cache: cache of item pages data, the one of the process by default
+        :param max_pages: maximum number of results pages to crawl
+        :param max_items: maximum number of items to scrape
+        :param enough_items: the crawl stops once this number of items have the full user input in
+            their title
+        :param parser_pool: pool of processes parsing item pages, the one of the process by default
+            (item pages are parsed in the scraping threads if there is none)
+        :param enrich_budget: maximum number of item pages requested (see planning.EnrichmentPlanner),
+            no limit if None
+        :param min_price: items cheaper than this price are not enriched
+        :param max_price: items more expensive than this price are not enriched
+        """
+        self.fetcher = fetcher if fetcher is not None else get_default_fetcher()
+        self.item_cache = item_cache if item_cache is not None else get_item_cache()
+        self.parser_pool = parser_pool if parser_pool is not None else get_parser_pool()
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self.enough_items = enough_items
+        self.enrich_budget = enrich_budget
+        self.min_price = min_price
+        self.max_price = max_price
+        self.user_input = user_input
+        self.complete_url = self.get_complete_url(base_url=url, user_input=user_input)
+        # Soup of the first results page, fetched by iter_candidate_pages
+        self.base_soup: BeautifulSoup | None = None
 
-    @staticmethod
-    def get_html_soup(url: str) -> BeautifulSoup:
+    def get_html_soup(self, url: str, parse_only: SoupStrainer | None = None,
+                      stop_markers: tuple[bytes, ...] = ()) -> BeautifulSoup:
         """
         From given url, creates a soup object with HTML source code.
         :param url: url from site to scrap as a string
+        :param parse_only: if given, only the tags matching this strainer are parsed
+        :param stop_markers: if given, the page is only downloaded until these markers (see
+            Fetcher.get), and the part received is parsed
+        :return: global soup object with all html source code
+        """
+        with metrics.timer('fetch', website='ebay'):
+            response = self.fetcher.get(url, stop_markers=stop_markers, tail_bytes=ITEM_PAGE_TAIL_BYTES)
+        return self.get_response_soup(response, parse_only=parse_only)
+
+    @staticmethod
+    def get_response_soup(response: Response, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+        """
+        From a response of eBay website, creates a soup object with HTML source code.
+        :param response: response to a request on eBay
+        :param parse_only: if given, only the tags matching this strainer are parsed
         :return: global soup object with all html source code
         """
-        response = requests.get(url)
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            if soup.title is not None:
-                print(f"Title of page: {soup.title.text.strip(' | eBay')}")
+            with metrics.timer('parse', website='ebay'):
+                soup = make_response_soup(response, parse_only=parse_only)
+            if soup.title is not None and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Title of page: %s", soup.title.text.strip(' | eBay'))
             return soup
         raise RequestsConnectionError(website_name="eBay",
                                       status_code=response.status_code,
@@ -49,121 +167,324 @@ class EBayScraper(Scraper):
         """
         return f"{base_url}{user_input.replace(' ', '+')}&_sacat=0"
 
+    def get_page_url(self, page: int) -> str:
+        """
+        Returns the url of given results page of the search.
+        :param page: number of the page, starting at 1
+        :return: url of the page
+        """
+        return f"{self.complete_url}&_pgn={page}"
+
     @staticmethod
-    def get_price(tag: Tag) -> float | list[float]:
+    def get_item_tags(soup: BeautifulSoup) -> list[Tag]:
         """
-        From element tag, gets the price of sold object.
-        :param tag: Tag object where price is found
-        :return: price as float or list of floats
+        From soup object of a results page, gets the li tags of the items.
+        :param soup: soup object of a results page
+        :return: list of li tags
         """
-        list_price = tag.find('span', class_='s-item__price').text.split()
-        return float(list_price[-1].replace(',', '').replace('$', ''))
+        # The first li tag is a hidden placeholder, not an item
+        return SEARCH_ITEM_EXTRACTOR.find_item_tags(soup)[1:]
 
-    def get_seller_info(self, soup: BeautifulSoup) -> tuple[float | None, float | None]:
+    def fetch_page_item_tags(self, page: int) -> list[Tag]:
         """
-        Given soup object of a certain item from eBay, gets the seller info,
-        i.e. its positive feedback percentage and its number of items sold.
+        Requests given results page of the search, and gets the li tags of its items.
+        :param page: number of the page, starting at 2 (the first one is the base soup)
+        :return: list of li tags
+        """
+        return self.get_item_tags(self.get_html_soup(self.get_page_url(page), parse_only=SEARCH_PAGE_STRAINER))
+
+    def scrape_item_data(self, soup: BeautifulSoup) -> tuple[float | int | None, ...]:
+        """
+        Scrapes single item ratings data (from other users of eBay).
         :param soup: soup object containing a single item data
-        :return: tuple of two floats with percentage a number of items sold
-            (first, positive_feedback_percentage, then nb_items_sold)
-        """
-        items_list = soup.find_all(
-            'div',
-            class_='d-stores-info-categories__container__info__section__item'
-        )
-        positive_feedback_percentage = None
-        nb_items_sold = None
-        for info in items_list:
-            info_str = info.find('span', class_='ux-textspans ux-textspans--BOLD').text
-            if '%' in info_str:
-                positive_feedback_percentage = self.get_percentage_as_float(info_str)
-            else:
-                nb_items_sold = self.get_nb_items_sold(info_str)
-        return positive_feedback_percentage, nb_items_sold
+        :return: tuple with rating average, positive feedback percentage and number of items sold
+        """
+        with metrics.timer('extract', website='ebay'):
+            data = ITEM_PAGE_EXTRACTOR.extract(soup)
+        return data['rating_avg'], data['positive_feedback_percentage'], data['nb_items_sold']
+
+    def scrape_item_response(self, response: Response) -> tuple[float | int | None, ...]:
+        """
+        Scrapes single item ratings data from the response of its item page, in a worker of the
+        parser pool if there is one.
+        :param response: response to a request on an item page
+        :return: tuple with rating average, positive feedback percentage and number of items sold
+        """
+        if self.parser_pool is None or response.status_code != 200:
+            return self.scrape_item_data(self.get_response_soup(response, parse_only=ITEM_PAGE_STRAINER))
+        with metrics.timer('parse', website='ebay'):
+            data = self.parser_pool.run(parse_item_page, response.content, get_declared_encoding(response))
+        return self.item_data_from_dict(data)
+
+    def get_item_page_data(self, item_link: str) -> tuple[float | int | None, ...]:
+        """
+        Gets ratings data of an item page, from the item cache if the page was scraped recently.
+        Expired entries are revalidated with a conditional request, and a 304 response reuses them
+        without parsing the page again. They are also used if the page cannot be fetched.
+        :param item_link: url of the item page
+        :return: tuple with rating average, positive feedback percentage and number of items sold
+        """
+        url = canonical_item_url(item_link)
+        cached = self.get_cached_item_page(url)
+        if cached is not None and cached.is_fresh:
+            return self.reuse_cached_item_page(cached, 'fresh')
+        try:
+            with metrics.timer('fetch', website='ebay'):
+                response = self.fetcher.get(item_link, **self.get_item_page_request(cached))
+            if response.status_code == 304 and cached is not None:
+                return self.revalidate_cached_item_page(url, cached)
+            item_data = self.scrape_item_response(response)
+        except SCRAPING_ERRORS:
+            if cached is None:
+                raise
+            return self.reuse_cached_item_page(cached, 'stale')
+        self.cache_item_page(url, item_data, response)
+        return item_data
+
+    def get_cached_item_page(self, url: str) -> CachedItemPage | None:
+        """
+        Reads the item cache (the methods using the item cache are shared with AsyncEBayScraper, which
+        runs them in threads).
+        :param url: canonical url of the item page
+        :return: cached data of the item page, None if it is missing or if there is no item cache
+        """
+        return self.item_cache.get(url) if self.item_cache is not None else None
 
     @staticmethod
-    def get_percentage_as_float(value: str) -> float:
+    def get_item_page_request(cached: CachedItemPage | None) -> dict[str, Any]:
+        """
+        Returns the arguments of the request of an item page (for Fetcher.get and AsyncFetcher.get):
+        the page is read until ITEM_PAGE_MARKERS, and revalidated if it is cached.
+        :param cached: cached data of the item page, or None
+        :return: keyword arguments of the request
+        """
+        return {'headers': cached.validators if cached is not None else None,
+                'stop_markers': ITEM_PAGE_MARKERS, 'tail_bytes': ITEM_PAGE_TAIL_BYTES}
+
+    def reuse_cached_item_page(self, cached: CachedItemPage, result: str) -> tuple[float | int | None, ...]:
+        """
+        Returns the cached ratings data of an item page, counting the use of the item cache.
+        :param cached: cached data of the item page
+        :param result: 'fresh', 'revalidated' or 'stale'
+        :return: tuple with rating average, positive feedback percentage and number of items sold
+        """
+        metrics.increment('scraping_item_cache_requests_total', result=result)
+        return self.item_data_from_dict(cached.data)
+
+    def revalidate_cached_item_page(self, url: str, cached: CachedItemPage) -> tuple[float | int | None, ...]:
+        """
+        Renews a cached item page after a 304 response, and returns its ratings data.
+        :param url: canonical url of the item page
+        :param cached: cached data of the item page
+        :return: tuple with rating average, positive feedback percentage and number of items sold
+        """
+        self.item_cache.renew(url)
+        return self.reuse_cached_item_page(cached, 'revalidated')
+
+    def cache_item_page(self, url: str, item_data: tuple[float | int | None, ...], response: Any) -> None:
         """
-        Given a percentage value as a string, returns it as a float.
-        :param value: percentage value, as a string
-        :return: floating repr of percentage value, stripped of non digit characters
+        Caches the ratings data scraped on an item page, with the validators of its response.
+        :param url: canonical url of the item page
+        :param item_data: tuple with rating average, positive feedback percentage and number of items sold
+        :param response: response of the item page
         """
-        return float(value.strip('%'))
+        if self.item_cache is None:
+            return
+        metrics.increment('scraping_item_cache_requests_total', result='miss')
+        self.item_cache.set(url, self.item_data_to_dict(item_data),
+                            etag=response.headers.get('ETag'),
+                            last_modified=response.headers.get('Last-Modified'))
 
     @staticmethod
-    def get_nb_items_sold(value: str) -> NbItems:
+    def item_data_to_dict(item_data: tuple[float | int | None, ...]) -> dict[str, Any]:
         """
-        Given a number of format '[0-9][K|M]?', returns its value as an integer.
-        :param value: value as a string
-        :return: same value converted to a NbItems object
+        Converts ratings data of an item page to a JSON serializable dict, to be cached.
+        :param item_data: tuple with rating average, positive feedback percentage and number of items sold
+        :return: dict with a key for each value
         """
-        return NbItems.from_str(value)
+        rating_avg, positive_feedback_percentage, nb_items_sold = item_data
+        return {
+            'rating_avg': rating_avg,
+            'positive_feedback_percentage': positive_feedback_percentage,
+            'nb_items_sold': repr(nb_items_sold) if nb_items_sold is not None else None,
+        }
 
     @staticmethod
-    def get_rating_average(soup: BeautifulSoup) -> float:
-        """
-        Given soup object of given item, returns the average score of the seller.
-        :param soup: soup object of an item on eBay
-        :return: average rating score of the seller
-        """
-        ratings_list = soup.find_all('div', class_='fdbk-detail-seller-rating')
-        if not ratings_list:
-            return float('nan')
-        # Checks if the string containing the number is actually a float
-        # between 0 and 5
-        floating_pattern = re.compile(r'^(0|[1-4](\.\d+)?|5(\.0*)?)$')
-        ratings = []
-        for rating in ratings_list:
-            rate_str = rating \
-                .find('span', class_='fdbk-detail-seller-rating__value').text
-            if re.match(floating_pattern, rate_str):
-                ratings.append(float(rate_str))
-        if ratings:
-            return round(sum(ratings) / len(ratings), 3)
+    def item_data_from_dict(data: dict[str, Any]) -> tuple[float | int | None, ...]:
+        """
+        Converts cached ratings data of an item page back to the tuple returned by scrape_item_data.
+        :param data: dict created by item_data_to_dict
+        :return: tuple with rating average, positive feedback percentage and number of items sold
+        """
+        nb_items_sold = data['nb_items_sold']
+        return (data['rating_avg'], data['positive_feedback_percentage'],
+                NbItems.from_str(nb_items_sold) if nb_items_sold is not None else None)
 
-    def scrape_item_data(self, soup: BeautifulSoup) -> tuple[float | int | None, ...]:
+    @staticmethod
+    def get_item_link(li_tag: Tag) -> str:
         """
-        Scrapes single item ratings data (from other users of eBay).
-        :param soup: soup object containing a single item data
+        From li tag of an article, gets the link to its item page.
+        :param li_tag: li tag of given article on eBay
+        :return: url of the item page
+        """
+        return SEARCH_ITEM_EXTRACTOR['item_url'].extract(li_tag)
+
+    @staticmethod
+    def get_item_host(data: dict[str, Any]) -> str:
+        """
+        Gets the host of the item page of an article (used to limit concurrent requests).
+        :param data: search page data of the article
+        :return: network location of the item page url
+        """
+        return urlsplit(data['item_url']).netloc
+
+    @staticmethod
+    def extract_search_item_data(li_tag: Tag) -> dict[str, Any]:
         """
-        rating_avg = self.get_rating_average(soup)
-        positive_feedback_percentage, nb_items_sold = self.get_seller_info(soup)
-        return rating_avg, positive_feedback_percentage, nb_items_sold
+        For a given li tag, scrapes the data of the search page (title, price and item page url).
+        :param li_tag: li tag of given article on eBay
+        :return: dictionary with a key value pair for each scraped chunk of data
+        """
+        with metrics.timer('extract', website='ebay'):
+            return SEARCH_ITEM_EXTRACTOR.extract(li_tag)
 
     def extract_item_data(self, li_tag: Tag) -> dict[str, Any]:
         """
-        Fora given li tag, scrapes its data (i.e. scrapes a single item data).
+        Fora given li tag, scrapes its data (i.e. scrapes a single item data). If its item page cannot
+        be scraped, the item is kept without the data of its seller.
         :param li_tag: li tag of given article on eBay
         :return: dictionary with a key value pair for each scraped chunk of data
         """
-        title = li_tag.find('span', role='heading').text
-        price = self.get_price(li_tag)
-        item_link = li_tag.find('a', class_='s-item__link').get('href')
-        item_soup = self.get_html_soup(url=item_link)
-        rating_avg, positive_feedback_percentage, nb_items_sold = self.scrape_item_data(item_soup)
+        return self.enrich_item(self.extract_search_item_data(li_tag))
+
+    def enrich_item(self, data: dict[str, Any]) -> dict[str, Any]:
+        """
+        Adds the data of its item page to the search page data of an article. If the item page cannot
+        be scraped, the item is kept without the data of its seller.
+        :param data: search page data of the article
+        :return: dictionary with a key value pair for each scraped chunk of data
+        """
+        try:
+            item_data = self.get_item_page_data(data['item_url'])
+        except SCRAPING_ERRORS as error:
+            item_data = self.degrade_item(data, error)
+        return self.make_item(data, item_data)
+
+    @staticmethod
+    def degrade_item(data: dict[str, Any], error: Exception) -> tuple[float | int | None, ...]:
+        """
+        Returns the ratings data of an article whose item page could not be scraped (missing values).
+        :param data: search page data of the article
+        :param error: error raised by the scraping of the item page
+        :return: tuple with rating average, positive feedback percentage and number of items sold
+        """
+        metrics.increment('scraping_degraded_items_total', website='ebay')
+        logger.info("Seller data of %s left out: %s", data['item_url'], error)
+        return float('nan'), None, None
+
+    @staticmethod
+    def make_item(data: dict[str, Any], item_data: tuple[float | int | None, ...]) -> dict[str, Any]:
+        """
+        Merges the search page data and the item page data of an article.
+        :param data: search page data of the article
+        :param item_data: tuple with rating average, positive feedback percentage and number of items sold
+        :return: dictionary with a key value pair for each scraped chunk of data
+        """
+        rating_avg, positive_feedback_percentage, nb_items_sold = item_data
         return {
-            'title': title,
-            'price_dollars': price,
+            'title': data['title'],
+            'price_dollars': data['price_dollars'],
             'rating_avg': rating_avg,
             'positive_feedback_percentage': positive_feedback_percentage,
             'nb_items_sold': nb_items_sold,
-            'item_url': item_link
+            'item_url': data['item_url']
         }
 
-    def scrape_pages(self) -> pd.DataFrame:
+    def extract_page_candidates(self, li_tags: list[Tag], budget: CrawlBudget) -> list[dict[str, Any]]:
+        """
+        Extracts the search page data of the items of a results page, within the crawl budget.
+        :param li_tags: li tags of the items of the page
+        :param budget: crawl budget of the search, counting the extracted items
+        :return: search page data of the items
+        """
+        candidates = []
+        for li_tag in li_tags[:budget.remaining]:
+            data = self.extract_search_item_data(li_tag)
+            budget.add(data)
+            candidates.append(data)
+        return candidates
+
+    def create_crawl_budget(self) -> CrawlBudget:
+        """Creates the crawl budget of the search."""
+        return CrawlBudget(self.user_input, max_items=self.max_items, enough_items=self.enough_items)
+
+    def iter_candidate_pages(self) -> Iterator[list[dict[str, Any]]]:
+        """
+        Yields the search page data of the items of each results page of the search (next pages being
+        downloaded concurrently), until the crawl budget is exhausted.
+        :return: iterator over lists of search page data of the items
+        """
+        if self.base_soup is None:
+            self.base_soup = self.get_html_soup(self.complete_url, parse_only=SEARCH_PAGE_STRAINER)
+        budget = self.create_crawl_budget()
+        pages = iter_pages(self.get_item_tags(self.base_soup), self.fetch_page_item_tags,
+                           max_pages=self.max_pages, max_workers=self.max_per_host)
+        for target_li_tags in pages:
+            yield self.extract_page_candidates(target_li_tags, budget)
+            if budget.is_exhausted:
+                pages.close()
+                return
+
+    def create_planner(self) -> EnrichmentPlanner:
+        """Creates the planner of the items of the search enriched with the data of their item page."""
+        return EnrichmentPlanner(self.user_input, budget=self.enrich_budget, min_price=self.min_price,
+                                 max_price=self.max_price)
+
+    def imap_enrich_items(self, items: list[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """Enriches items concurrently (see enrich_item), yielding them in the given order."""
+        return imap_ordered(self.enrich_item, items, host_of=self.get_item_host,
+                            max_workers=self.max_workers, max_per_host=self.max_per_host)
+
+    def iter_items(self) -> Iterator[dict[str, Any]]:
+        """
+        Yields the data of each item of the search. The items of each results page planned by the
+        EnrichmentPlanner are enriched with the data of their item page (fetched concurrently) as
+        soon as the page is received, and yielded in search order. Deferred items are enriched at the
+        end of the crawl if the ranking needs them. The other items are yielded last, without the
+        data of their seller (and duplicates are left out).
+        :return: iterator over items data
+        """
+        planner = self.create_planner()
+        for candidates in self.iter_candidate_pages():
+            for item in self.imap_enrich_items(planner.plan_page(candidates)):
+                planner.add_enriched(item)
+                yield item
+        yield from self.imap_enrich_items(planner.get_fallback())
+        planner.count()
+        yield from planner.get_skipped()
+
+    def scrape_pages(self) -> ResultSet:
         """
-        Scrape data given tags object.
-        :return: DataFrame with all scraped data
+        Scrape data given tags object, on all crawled results pages.
+        :return: ResultSet with all scraped data
         """
-        # Get all items from search
-        target_li_tags = self.base_soup.find_all('li', class_='s-item s-item__pl-on-bottom')[1:]
-        data = [self.extract_item_data(li_tag) for li_tag in target_li_tags]
-        return pd.DataFrame(data)
+        return ResultSet.from_items(self.iter_items())
 
-    def scrape(self, user_input: str) -> pd.DataFrame:
+    def scrape(self, user_input: str) -> ResultSet:
         """
-        Main function. This function is run by this script. Saves scraped data to a pickle file.
+        Main function. This function is run by this script.
         """
-        data = self.scrape_pages()
-        data.to_pickle(f"{OUTPUT_DIR}scraped_data.pkl")
-        return data
+        return self.scrape_pages()
+
+
+def parse_item_page(content: bytes, encoding: str | None = None) -> dict[str, Any]:
+    """
+    Parses an item page and extracts the ratings data of its seller, as plain values (run by the
+    workers of the parser pool).
+    :param content: HTML source code of the item page, as bytes
+    :param encoding: encoding of content, detected from the page if None
+    :return: dict created by EBayScraper.item_data_to_dict
+    """
+    data = ITEM_PAGE_EXTRACTOR.extract(make_soup(content, parse_only=ITEM_PAGE_STRAINER, encoding=encoding))
+    return EBayScraper.item_data_to_dict((data['rating_avg'], data['positive_feedback_percentage'],
+                                          data['nb_items_sold']))
@@ -0,0 +1,227 @@
+"""
+Declarative extraction of item data. Each website describes the fields to extract from a tag with an
+ExtractionSpec (selectors, regular expressions and converters), compiled once into an Extractor,
+which finds the tags with BeautifulSoup's find/find_all (faster than CSS selection in soupsieve).
+
+Selectors are a subset of CSS selectors: steps separated by spaces, each one searching the first
+descendant of the previous tag matching 'name.class[attribute=value]' (all parts are optional, but a
+step needs one of them). Several classes ('.a.b') match a class attribute equal to 'a b', like
+find(class_='a b'). An empty selector selects the extracted tag itself.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from bs4 import SoupStrainer, Tag
+
+STEP_PATTERN: re.Pattern = re.compile(
+    r'^(?P<name>[\w-]+)?(?P<classes>(?:\.[\w-]+)*)(?P<attributes>(?:\[[\w-]+(?:=[^\]]*)?\])*)$'
+)
+
+ATTRIBUTE_PATTERN: re.Pattern = re.compile(r'\[(?P<name>[\w-]+)(?:=(?P<value>[^\]]*))?\]')
+
+
+class Step:
+    """Step of a compiled selector, searching tags with a SoupStrainer built once."""
+
+    def __init__(self, name: str | None, attrs: dict[str, str | bool]) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.strainer = SoupStrainer(name, attrs=attrs)
+
+    def find(self, tag: Tag) -> Tag | None:
+        return tag.find(self.strainer)
+
+    def find_all(self, tag: Tag) -> list[Tag]:
+        return tag.find_all(self.strainer)
+
+
+def compile_selector(selector: str) -> tuple[Step, ...]:
+    """
+    Compiles a selector to the steps searching its tags.
+    :param selector: selector, e.g. "div.seller span[role=heading]"
+    :return: tuple of steps, from the outermost tag to the searched one
+    """
+    steps = []
+    for step in selector.split():
+        match = STEP_PATTERN.match(step)
+        if match is None:
+            raise ValueError(f"Invalid selector step '{step}' in '{selector}'")
+        attrs: dict[str, str | bool] = {}
+        if match['classes']:
+            attrs['class'] = ' '.join(match['classes'][1:].split('.'))
+        for attribute in ATTRIBUTE_PATTERN.finditer(match['attributes']):
+            value = attribute['value']
+            attrs[attribute['name']] = value.strip('\'"') if value is not None else True
+        steps.append(Step(match['name'], attrs))
+    return tuple(steps)
+
+
+@dataclass(frozen=True)
+class Field:
+    """
+    Rule extracting a value from a tag: the text (or an attribute) of the tag found by selector is
+    matched against pattern, then converted.
+    :param name: key of the value in extracted data
+    :param selector: selector of the tag holding the value, relative to the extracted tag. With a
+        tuple of selectors, the values of all their tags are joined with join (all tags must be found)
+    :param attribute: if given, the value is this attribute of the found tag instead of its text
+    :param strip: characters stripped from both ends of the value (of each tag)
+    :param join: separator of the values of a tuple of selectors
+    :param pattern: regular expression which must match the value, its group 'value' (or the whole
+        match if it has none) is kept
+    :param converter: function converting the kept string (e.g. float)
+    :param many: if True, the first step of selector finds all matching tags, next steps finding a
+        tag in each of them, and all values are given to reduce
+    :param reduce: function combining the values of a many field, which default to the first one
+    :param default: value of the field when no tag is found or no value matches pattern
+    """
+    name: str
+    selector: str | tuple[str, ...]
+    attribute: str | None = None
+    strip: str | None = None
+    join: str = ''
+    pattern: str | None = None
+    converter: Callable[[str], Any] | None = None
+    many: bool = False
+    reduce: Callable[[list[Any]], Any] | None = None
+    default: Any = None
+
+
+@dataclass(frozen=True)
+class ExtractionSpec:
+    """
+    Fields of the items of a website.
+    :param fields: rules extracting the values of each item
+    :param items: if given, selector of the item tags of a page (e.g. on search pages)
+    """
+    fields: tuple[Field, ...]
+    items: str | None = None
+
+
+class CompiledField:
+    """Field whose selector and pattern are compiled."""
+
+    def __init__(self, spec: Field) -> None:
+        selectors = (spec.selector,) if isinstance(spec.selector, str) else spec.selector
+        if spec.many and len(selectors) > 1:
+            raise ValueError(f"Field '{spec.name}' cannot have several selectors and many values")
+        self.name = spec.name
+        self.selectors = selectors
+        self.paths = tuple(compile_selector(selector) for selector in selectors)
+        self.attribute = spec.attribute
+        self.strip = spec.strip
+        self.join = spec.join
+        self.pattern = re.compile(spec.pattern) if spec.pattern is not None else None
+        self.group = 'value' if self.pattern is not None and 'value' in self.pattern.groupindex else 0
+        self.converter = spec.converter
+        self.many = spec.many
+        self.reduce = spec.reduce
+        self.default = spec.default
+
+    @staticmethod
+    def find_tag(steps: tuple[Step, ...], tag: Tag) -> Tag | None:
+        """Returns the tag found by the steps of a selector, or None."""
+        for step in steps:
+            tag = step.find(tag)
+            if tag is None:
+                return None
+        return tag
+
+    def find_all_tags(self, tag: Tag) -> list[Tag]:
+        """Returns the tags holding the values of a many field."""
+        first, next_steps = self.paths[0][0], self.paths[0][1:]
+        tags = first.find_all(tag)
+        if next_steps:
+            tags = [self.find_tag(next_steps, found) for found in tags]
+        return [found for found in tags if found is not None]
+
+    def read(self, tag: Tag) -> str | None:
+        """Returns the stripped text (or attribute) of a found tag."""
+        value = tag.get(self.attribute) if self.attribute is not None else tag.text
+        if value is not None and self.strip is not None:
+            value = value.strip(self.strip)
+        return value
+
+    def parse(self, value: str) -> Any:
+        """Returns the converted value, or None if it does not match the pattern."""
+        if self.pattern is not None:
+            match = self.pattern.match(value)
+            if match is None:
+                return None
+            value = match[self.group]
+        return self.converter(value) if self.converter is not None else value
+
+    def extract(self, tag: Tag, found_tags: dict[str, list[Tag]] | None = None) -> Any:
+        """
+        Extracts the value of the field from a tag.
+        :param tag: tag of an item (or soup of an item page)
+        :param found_tags: tags already found in tag by many fields, by selector (updated with the
+            tags found by this field), so that fields sharing a selector search their tags once
+        :return: value of the field, or its default value
+        """
+        if self.many:
+            if found_tags is None:
+                tags = self.find_all_tags(tag)
+            else:
+                tags = found_tags.get(self.selectors[0])
+                if tags is None:
+                    tags = found_tags[self.selectors[0]] = self.find_all_tags(tag)
+            values = [self.parse(value) for value in map(self.read, tags) if value is not None]
+            values = [value for value in values if value is not None]
+            if not values:
+                return self.default
+            return self.reduce(values) if self.reduce is not None else values[0]
+        parts = []
+        for steps in self.paths:
+            found = self.find_tag(steps, tag)
+            value = self.read(found) if found is not None else None
+            if value is None:
+                return self.default
+            parts.append(value)
+        value = self.parse(self.join.join(parts))
+        return value if value is not None else self.default
+
+
+class Extractor:
+    """Compiled ExtractionSpec, extracting the data of items."""
+
+    def __init__(self, spec: ExtractionSpec) -> None:
+        self.fields = {field_spec.name: CompiledField(field_spec) for field_spec in spec.fields}
+        self.item_steps = compile_selector(spec.items) if spec.items is not None else None
+
+    def __getitem__(self, name: str) -> CompiledField:
+        return self.fields[name]
+
+    def find_item_tags(self, tag: Tag) -> list[Tag]:
+        """Returns the item tags of a page, selected by the items selector of the spec."""
+        if self.item_steps is None:
+            raise ValueError("The extraction spec has no items selector")
+        tags = self.item_steps[0].find_all(tag)
+        if len(self.item_steps) > 1:
+            tags = [CompiledField.find_tag(self.item_steps[1:], found) for found in tags]
+        return [found for found in tags if found is not None]
+
+    def extract(self, tag: Tag) -> dict[str, Any]:
+        """
+        Extracts all fields from a tag.
+        :param tag: tag of an item (or soup of an item page)
+        :return: dict with a key for each field
+        """
+        found_tags = {}
+        return {name: compiled_field.extract(tag, found_tags) for name, compiled_field in self.fields.items()}
+
+
+def last_value(values: list[Any]) -> Any:
+    """Reduce function of a many field keeping the value of its last tag."""
+    return values[-1]
+
+
+def parse_number(value: str) -> float:
+    """Converts a number written with thousands separators (e.g. '1,299.99') to a float."""
+    return float(value.replace(',', ''))
+
+
+def compile_spec(spec: ExtractionSpec) -> Extractor:
+    """Compiles an ExtractionSpec, once for all extractions."""
+    return Extractor(spec)
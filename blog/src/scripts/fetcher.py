@@ -0,0 +1,341 @@
+"""
+HTTP layer shared by all Scraper classes: keeps connections alive between requests, retries
+throttled or failing requests with a backoff, limits the rate of requests to each host (see
+throttling.py), and rotates user agents. Responses are compressed (gzip, and brotli when the brotli
+package is installed), and can be read only up to the part of the page needed by a scraper.
+"""
+import threading
+import time
+from typing import Any, Callable, Iterable
+from urllib.parse import urlsplit
+
+import requests
+from fake_useragent import UserAgent
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .concurrency import DEFAULT_MAX_WORKERS
+from .throttling import DEFAULT_FAILURE_THRESHOLD, DEFAULT_RATE, DEFAULT_RESET_TIMEOUT, CircuitBreaker, \
+    HostThrottler, HostUnavailableError, TokenBucket, parse_retry_after
+
+# Used when the fake_useragent database could not be loaded
+DEFAULT_USER_AGENT: str = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/122.0.0.0 Safari/537.36'
+)
+
+# Status codes for which a request is retried by urllib3, with a backoff
+RETRY_STATUS_CODES: tuple[int, ...] = (500, 502, 504)
+
+# Status codes of throttling responses: they slow down the requests to the host, and the request is
+# retried once the host accepts requests again (after its Retry-After delay)
+THROTTLE_STATUS_CODES: tuple[int, ...] = (429, 503)
+
+# Maximum number of seconds a request waits for the rate limit of its host
+DEFAULT_MAX_WAIT: float = 10.0
+
+# Connect and read timeouts, in seconds
+DEFAULT_TIMEOUT: tuple[float, float] = (5.0, 20.0)
+
+# Size of the (decompressed) chunks in which bodies read up to stop markers are received
+CHUNK_SIZE: int = 16 * 1024
+
+
+class MarkerScanner:
+    """
+    Scans a body chunk by chunk for stop markers: reading can stop once every marker was found and
+    tail_bytes more bytes were read after the last one found. Each chunk is only scanned with the end
+    of the previous one, so that markers split between chunks are found.
+    """
+
+    def __init__(self, stop_markers: tuple[bytes, ...], tail_bytes: int) -> None:
+        """
+        Constructor of MarkerScanner class.
+        :param stop_markers: byte strings to find in the body (e.g. classes of the needed tags)
+        :param tail_bytes: number of bytes read after the markers, which must hold the needed tags
+        """
+        self.pending = set(stop_markers)
+        self.overlap = max(map(len, stop_markers)) - 1
+        self.tail_bytes = tail_bytes
+        self.nb_bytes = 0
+        self.stop_at: int | None = None
+        self.previous_end = b''
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        Scans the next chunk of the body.
+        :return: True if reading can stop
+        """
+        if self.pending:
+            window = self.previous_end + chunk
+            found = {marker for marker in self.pending if marker in window}
+            if found:
+                self.pending -= found
+                if not self.pending:
+                    window_start = self.nb_bytes - len(self.previous_end)
+                    self.stop_at = (window_start + max(window.find(marker) + len(marker) for marker in found)
+                                    + self.tail_bytes)
+            self.previous_end = window[-self.overlap:] if self.overlap else b''
+        self.nb_bytes += len(chunk)
+        return self.stop_at is not None and self.nb_bytes >= self.stop_at
+
+
+def read_until_markers(chunks: Iterable[bytes], stop_markers: tuple[bytes, ...],
+                       tail_bytes: int) -> tuple[bytes, bool]:
+    """
+    Reads the chunks of a streamed body until a MarkerScanner finds that the needed part was
+    received: the rest of the body is not downloaded.
+    :param chunks: chunks of the body (e.g. response.iter_content(CHUNK_SIZE))
+    :param stop_markers: byte strings to find in the body (e.g. classes of the needed tags)
+    :param tail_bytes: number of bytes read after the markers, which must hold the needed tags
+    :return: body read, and True if reading stopped before the end of the body
+    """
+    scanner = MarkerScanner(stop_markers, tail_bytes)
+    read_chunks = []
+    for chunk in chunks:
+        read_chunks.append(chunk)
+        if scanner.feed(chunk):
+            return b''.join(read_chunks), True
+    return b''.join(read_chunks), False
+
+
+def set_content(response: Any, content: bytes) -> None:
+    """
+    Sets the body of a streamed response which was read by chunks, so that response.content and
+    response.text return it. requests and httpx responses both keep their body in their private
+    _content attribute, which is only assigned here.
+    :param response: requests or httpx response, whose body is not read yet
+    :param content: body read
+    """
+    response._content = content
+
+
+class UserAgentRotator:
+    """Gives random user agents. The user agents database is only loaded once, on first use."""
+
+    def __init__(self, fallback: str = DEFAULT_USER_AGENT) -> None:
+        self.fallback = fallback
+        self._user_agent: UserAgent | None = None
+        self._lock = threading.Lock()
+
+    def random(self) -> str:
+        """
+        Returns a random user agent, or the fallback one if the database could not be loaded.
+        :return: user agent as a string
+        """
+        if self._user_agent is None:
+            with self._lock:
+                if self._user_agent is None:
+                    try:
+                        self._user_agent = UserAgent()
+                    except Exception:
+                        return self.fallback
+        return self._user_agent.random
+
+
+class Fetcher:
+    """
+    Wrapper around a requests Session, with connection pooling, retries, and a rate limit and a
+    circuit breaker for each host.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = DEFAULT_MAX_WORKERS,
+                 timeout: tuple[float, float] = DEFAULT_TIMEOUT, max_retries: int = 3,
+                 backoff_factor: float = 0.5, rate_per_host: float | None = DEFAULT_RATE,
+                 max_wait: float = DEFAULT_MAX_WAIT, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT) -> None:
+        """
+        Constructor of Fetcher class.
+        :param pool_connections: number of hosts for which a connection pool is kept
+        :param pool_maxsize: number of connections kept alive for each host
+        :param timeout: connect and read timeouts, in seconds
+        :param max_retries: number of retries on connection errors, RETRY_STATUS_CODES and
+            THROTTLE_STATUS_CODES
+        :param backoff_factor: waits backoff_factor * 2 ** (retry number - 1) seconds between retries
+            (throttling responses are retried after their Retry-After delay instead)
+        :param rate_per_host: initial number of requests per second to each host (adapted to
+            throttling responses), None for no rate limit
+        :param max_wait: maximum number of seconds a request waits for the rate limit of its host
+            (or for the Retry-After delay of a throttling response)
+        :param failure_threshold: number of failed requests in a row after which requests to a host
+            fail at once, during reset_timeout seconds
+        :param reset_timeout: number of seconds before a host which kept failing is requested again
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_wait = max_wait
+        self.throttler = HostThrottler(rate_per_host, failure_threshold=failure_threshold,
+                                       reset_timeout=reset_timeout)
+        self.user_agents = UserAgentRotator()
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              max_retries=retry)
+        self.session = requests.Session()
+        # With 'br' if the brotli package is installed
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url: str, headers: dict[str, str] | None = None, random_user_agent: bool = False,
+            stop_markers: tuple[bytes, ...] = (), tail_bytes: int = CHUNK_SIZE) -> requests.Response:
+        """
+        Sends a GET request on given url, reusing an open connection to the host if there is one.
+        The request waits for the rate limit of the host, and is retried after throttling responses.
+        :param url: url to request
+        :param headers: additional headers of the request
+        :param random_user_agent: if True, sends a random User-Agent header
+        :param stop_markers: if given, the body of a 200 response is only read until these markers
+            and tail_bytes more bytes (see read_until_markers), its connection being closed
+        :param tail_bytes: number of bytes read after the last stop marker
+        :return: response of the website (after retries)
+        :raise HostUnavailableError: if the host kept failing recently, or if its rate limit (or
+            Retry-After delay) would make the request wait more than max_wait seconds
+        """
+        headers = self.get_headers(headers, random_user_agent)
+        host = urlsplit(url).netloc
+        breaker = self.throttler.get_breaker(host)
+        bucket = self.throttler.get_bucket(host)
+        for attempt in range(self.max_retries + 1):
+            self.check_breaker(host, breaker)
+            if bucket is not None and not bucket.acquire(timeout=self.max_wait):
+                raise self.get_rate_limited_error(host)
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout, stream=bool(stop_markers))
+                if stop_markers and response.status_code == 200:
+                    content, truncated = read_until_markers(response.iter_content(CHUNK_SIZE), stop_markers,
+                                                            tail_bytes)
+                    set_content(response, content)
+                    if truncated:
+                        response.close()
+                        metrics.increment('scraping_truncated_responses_total', host=host)
+                elif stop_markers:
+                    # Reads the whole body of streamed error responses
+                    response.content
+            except requests.RequestException:
+                breaker.record_failure()
+                raise
+            self.count_response(host, response)
+            delay = self.get_retry_delay(host, response, breaker, bucket, attempt)
+            if delay is None:
+                return response
+            if delay:
+                time.sleep(delay)
+        return response
+
+    def get_headers(self, headers: dict[str, str] | None, random_user_agent: bool) -> dict[str, str]:
+        """Returns the headers of a request (see get), shared with AsyncFetcher."""
+        headers = dict(headers or {})
+        if random_user_agent:
+            headers.setdefault('User-Agent', self.user_agents.random())
+        return headers
+
+    @staticmethod
+    def check_breaker(host: str, breaker: CircuitBreaker) -> None:
+        """
+        Checks that a host can be requested, before each attempt of a request.
+        :raise HostUnavailableError: if the circuit breaker of the host is open
+        """
+        if not breaker.allow():
+            metrics.increment('scraping_unavailable_host_total', host=host, reason='circuit_open')
+            raise HostUnavailableError(f"{host} is not requested after {breaker.failures} failures in a row")
+
+    def get_rate_limited_error(self, host: str) -> HostUnavailableError:
+        """Counts and returns the error raised when the rate limit of a host would make a request wait too long."""
+        metrics.increment('scraping_unavailable_host_total', host=host, reason='rate_limited')
+        return HostUnavailableError(f"{host} cannot be requested within {self.max_wait} seconds")
+
+    def get_retry_delay(self, host: str, response: Any, breaker: CircuitBreaker, bucket: TokenBucket | None,
+                        attempt: int) -> float | None:
+        """
+        Records the response of an attempt in the circuit breaker and the bucket of its host, and
+        decides whether a throttling response is retried (shared with AsyncFetcher).
+        :param host: host of the request
+        :param response: response of the attempt
+        :param breaker: circuit breaker of the host
+        :param bucket: bucket of the host, None if there is no rate limit
+        :param attempt: number of the attempt, starting at 0
+        :return: number of seconds to sleep before the next attempt (0 if the bucket of the host
+            delays it), None if the response is returned
+        """
+        # A host throttling requests is slowed down by its bucket, but only server errors (503
+        # included) make it unhealthy
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if response.status_code not in THROTTLE_STATUS_CODES:
+            if bucket is not None and response.status_code < 500:
+                bucket.reward()
+            return None
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if bucket is not None:
+            bucket.penalize(retry_after)
+        if attempt == self.max_retries or (retry_after or 0) > self.max_wait:
+            return None
+        metrics.increment('scraping_retries_total', host=host)
+        if bucket is not None:
+            return 0
+        return retry_after if retry_after is not None else self.backoff_factor * 2 ** attempt
+
+    @staticmethod
+    def count_response(host: str, response: requests.Response) -> None:
+        """
+        Counts a response, its downloaded bytes (compressed, as received) and the retries made by
+        urllib3 to get it.
+        """
+        metrics.increment('scraping_responses_total', host=host, status=str(response.status_code))
+        tell = getattr(response.raw, 'tell', None)
+        nb_bytes = tell() if callable(tell) else len(response.content)
+        metrics.increment('scraping_downloaded_bytes_total', nb_bytes, host=host)
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            metrics.increment('scraping_retries_total', len(retries.history), host=host)
+
+    def close(self) -> None:
+        """Closes all pooled connections."""
+        self.session.close()
+
+
+_default_fetcher: Fetcher | None = None
+_default_fetcher_factory: Callable[[], Fetcher] = Fetcher
+_default_fetcher_lock = threading.Lock()
+
+
+def get_default_fetcher() -> Fetcher:
+    """Returns the Fetcher shared by all scrapers of the process, creating it on first call."""
+    global _default_fetcher
+    if _default_fetcher is None:
+        with _default_fetcher_lock:
+            if _default_fetcher is None:
+                _default_fetcher = _default_fetcher_factory()
+    return _default_fetcher
+
+
+def set_default_fetcher(fetcher: Fetcher) -> None:
+    """Replaces the Fetcher shared by all scrapers of the process (e.g. to change its settings)."""
+    global _default_fetcher
+    with _default_fetcher_lock:
+        _default_fetcher = fetcher
+
+
+def set_default_fetcher_factory(factory: Callable[[], Fetcher]) -> None:
+    """
+    Sets the function creating the Fetcher shared by all scrapers of the process on first call of
+    get_default_fetcher, so that its session is not opened when the settings are declared (e.g. at
+    import time, before the web server forks its workers).
+    :param factory: function returning a new Fetcher
+    """
+    global _default_fetcher, _default_fetcher_factory
+    with _default_fetcher_lock:
+        _default_fetcher_factory = factory
+        _default_fetcher = None
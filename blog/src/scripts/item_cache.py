@@ -0,0 +1,157 @@
+"""
+Persistent cache of data scraped on item pages (seller ratings, feedback percentage, items sold),
+keyed by canonical item url. Expired entries keep the ETag/Last-Modified validators of the page, so
+that they can be revalidated with a conditional request instead of being scraped again.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .config import get_setting
+
+# Database in the user's cache directory, outside of the source tree
+DEFAULT_PATH: str = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                                 'app_web_scraping', 'item_cache.sqlite3')
+
+DEFAULT_TTL: int = 24 * 3600
+
+# Query parameters only used for tracking, which do not change the content of an item page
+TRACKING_PARAMETERS: frozenset[str] = frozenset({
+    'hash', 'amdata', 'epid', 'itmmeta', 'itmprp', 'mkcid', 'mkevt', 'mkrid', 'campid', 'toolid',
+    'customid', 'siteid', 'ref', 'ref_', 'qid', 'sr', 'keywords', 'crid', 'sprefix',
+})
+
+TRACKING_PREFIXES: tuple[str, ...] = ('_trk', 'utm_', 'pf_rd_', 'pd_rd_')
+
+
+def canonical_item_url(url: str) -> str:
+    """
+    Removes tracking query parameters and fragment from an item url, so that a same item found in
+    different searches has a same url.
+    :param url: url of an item page
+    :return: canonical url of the item page
+    """
+    parts = urlsplit(url)
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMETERS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+
+@dataclass(frozen=True)
+class CachedItemPage:
+    """Data scraped on an item page, with the validators sent by the website with the page."""
+    data: dict[str, Any]
+    etag: str | None
+    last_modified: str | None
+    expires_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        """True if the entry can be used without asking the website."""
+        return self.expires_at > time.time()
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """Headers making a conditional request for this entry (empty if the website sent no validator)."""
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ItemPageCache:
+    """SQLite storage of CachedItemPage objects, usable from several threads and processes."""
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = DEFAULT_TTL) -> None:
+        """
+        Constructor of ItemPageCache class.
+        :param path: path of the SQLite database file, created if it does not exist
+        :param ttl: number of seconds during which an entry is used without asking the website
+        """
+        self.path = str(path)
+        self.ttl = ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS item_page ('
+                'url TEXT PRIMARY KEY, data TEXT NOT NULL, etag TEXT, last_modified TEXT, '
+                'expires_at REAL NOT NULL)'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns the connection to the database of the current thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            self._local.connection = connection
+        return connection
+
+    def get(self, url: str) -> CachedItemPage | None:
+        """
+        Returns the entry of an item page, even if it is expired.
+        :param url: canonical url of the item page
+        :return: CachedItemPage object, or None if the page was never scraped
+        """
+        row = self._connection().execute(
+            'SELECT data, etag, last_modified, expires_at FROM item_page WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, etag, last_modified, expires_at = row
+        return CachedItemPage(json.loads(data), etag, last_modified, expires_at)
+
+    def set(self, url: str, data: dict[str, Any], etag: str | None = None,
+            last_modified: str | None = None) -> None:
+        """
+        Stores the data scraped on an item page, which expires after ttl seconds.
+        :param url: canonical url of the item page
+        :param data: JSON serializable data scraped on the page
+        :param etag: ETag header of the response, if any
+        :param last_modified: Last-Modified header of the response, if any
+        """
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO item_page (url, data, etag, last_modified, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (url, json.dumps(data), etag, last_modified, time.time() + self.ttl)
+            )
+
+    def renew(self, url: str) -> None:
+        """
+        Makes an entry fresh again for ttl seconds (e.g. after a 304 Not Modified response).
+        :param url: canonical url of the item page
+        """
+        with self._connection() as connection:
+            connection.execute('UPDATE item_page SET expires_at = ? WHERE url = ?',
+                               (time.time() + self.ttl, url))
+
+
+_item_cache: ItemPageCache | None = None
+_item_cache_lock = threading.Lock()
+
+
+def get_item_cache() -> ItemPageCache | None:
+    """
+    Returns the ItemPageCache of the process, created from the SCRAPER_ITEM_CACHE setting on first
+    call, or None if the cache is disabled.
+    """
+    global _item_cache
+    config = get_setting('SCRAPER_ITEM_CACHE', {})
+    if not config.get('ENABLED', True):
+        return None
+    if _item_cache is None:
+        with _item_cache_lock:
+            if _item_cache is None:
+                _item_cache = ItemPageCache(path=config.get('PATH', DEFAULT_PATH),
+                                            ttl=config.get('TTL', DEFAULT_TTL))
+    return _item_cache
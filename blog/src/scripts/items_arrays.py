@@ -0,0 +1,187 @@
+"""
+Storage of columns of NbItems values in DataFrames (nb_items dtype), used by the analytics on
+DataFrames of results (see records.ResultSet.to_dataframe and compute_item_data.py).
+"""
+from __future__ import annotations
+
+import operator
+from typing import Any, Callable, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray, ExtensionDtype, register_extension_dtype, take
+
+from .items_classes import MULTIPLIER_CODES, MULTIPLIERS, NB_ITEMS_PATTERN, Multiplier, NbItems
+
+# Value of each multiplier, indexed by its code
+MULTIPLIER_VALUES: np.ndarray = np.array([multiplier.value for multiplier in MULTIPLIERS])
+
+
+def parse_nb_items(values: pd.Series) -> pd.Series:
+    """
+    Converts a whole column of strings with NbItems format ('340', '2.6K', '1M'...) to the
+    corresponding integers (see NbItems.as_int), without creating NbItems objects.
+    :param values: Series of strings (missing values or strings of wrong format give <NA>)
+    :return: Series of nullable int64 values, with the index of values
+    """
+    return pd.Series(NbItemsArray._from_sequence_of_strings(values).as_int, index=values.index)
+
+
+@register_extension_dtype
+class NbItemsDtype(ExtensionDtype):
+    """pandas dtype of columns of NbItems values, stored by NbItemsArray."""
+    name = 'nb_items'
+    type = NbItems
+    kind = 'O'
+    na_value = np.nan
+
+    @classmethod
+    def construct_array_type(cls) -> type[NbItemsArray]:
+        return NbItemsArray
+
+
+class NbItemsArray(ExtensionArray):
+    """
+    Compact storage of a column of NbItems values: a float64 array of values and an int8 array of
+    multiplier codes (-1 for missing values), instead of one Python object per row. Elements are
+    returned as NbItems objects, so they keep their repr, and comparisons are vectorized with the
+    semantics of NbItems (see _cmp_method).
+    """
+
+    def __init__(self, values: np.ndarray, codes: np.ndarray) -> None:
+        self._values = np.asarray(values, dtype='float64')
+        self._codes = np.asarray(codes, dtype='int8')
+
+    @classmethod
+    def _from_sequence(cls, scalars: Iterable[Any], *, dtype=None, copy: bool = False) -> NbItemsArray:
+        """Creates an array from NbItems objects, strings with NbItems format or missing values."""
+        scalars = list(scalars)
+        values = np.full(len(scalars), np.nan)
+        codes = np.full(len(scalars), -1, dtype='int8')
+        for i, scalar in enumerate(scalars):
+            if isinstance(scalar, str):
+                scalar = NbItems.from_str(scalar)
+            if isinstance(scalar, NbItems):
+                values[i] = scalar.value
+                codes[i] = MULTIPLIER_CODES[scalar.multiplier]
+        return cls(values, codes)
+
+    @classmethod
+    def _from_sequence_of_strings(cls, strings: Sequence[str], *, dtype=None,
+                                  copy: bool = False) -> NbItemsArray:
+        """
+        Creates an array from strings with NbItems format (strings of wrong format are missing values).
+        Each distinct string is only parsed once, with a single vectorized regex extraction.
+        """
+        positions, uniques = pd.factorize(pd.Series(strings, dtype=object))
+        parts = pd.Series(uniques, dtype=object).str.extract(NB_ITEMS_PATTERN)
+        unique_values = parts['floating'].astype('float64').fillna(parts['int'].astype('float64'))
+        unique_codes = parts['multiplier'].map({'K': 1, 'M': 2}).fillna(0).astype('int8')
+        unique_codes[unique_values.isna()] = -1
+        values = take(unique_values.to_numpy(), positions, allow_fill=True, fill_value=np.nan)
+        codes = take(unique_codes.to_numpy(), positions, allow_fill=True, fill_value=-1)
+        return cls(values, codes)
+
+    @classmethod
+    def _from_factorized(cls, values: np.ndarray, original: NbItemsArray) -> NbItemsArray:
+        return cls._from_sequence(values)
+
+    @property
+    def dtype(self) -> NbItemsDtype:
+        return NbItemsDtype()
+
+    @property
+    def nbytes(self) -> int:
+        return self._values.nbytes + self._codes.nbytes
+
+    @property
+    def as_int(self) -> pd.arrays.IntegerArray:
+        """Values multiplied by their multiplier, as nullable int64 (see NbItems.as_int)."""
+        missing = self._codes < 0
+        result = np.trunc(self._values * MULTIPLIER_VALUES[np.where(missing, 0, self._codes)])
+        return pd.arrays.IntegerArray(np.where(missing, 0, result).astype('int64'), missing)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            if self._codes[item] < 0:
+                return self.dtype.na_value
+            multiplier = MULTIPLIERS[self._codes[item]]
+            value = self._values[item]
+            return NbItems(int(value) if multiplier == Multiplier.no_multiplier else float(value), multiplier)
+        item = pd.api.indexers.check_array_indexer(self, item)
+        return type(self)(self._values[item], self._codes[item])
+
+    def __setitem__(self, key, value) -> None:
+        key = pd.api.indexers.check_array_indexer(self, key)
+        other = type(self)._from_sequence(value if pd.api.types.is_list_like(value) else [value])
+        self._values[key] = other._values
+        self._codes[key] = other._codes
+
+    def _cmp_method(self, other, op: Callable[[Any, Any], Any]) -> np.ndarray:
+        """
+        Compares elements like NbItems objects: equality on value and multiplier, order on as_int.
+        Comparisons with missing values are False (True for !=), like in object columns.
+        """
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        if not isinstance(other, NbItemsArray):
+            other = type(self)._from_sequence(other if pd.api.types.is_list_like(other) else [other] * len(self))
+        valid = (self._codes >= 0) & (other._codes >= 0)
+        if op in (operator.eq, operator.ne):
+            equal = (self._values == other._values) & (self._codes == other._codes) & valid
+            return equal if op is operator.eq else ~equal
+        left = self.as_int.to_numpy(dtype='int64', na_value=0)
+        right = other.as_int.to_numpy(dtype='int64', na_value=0)
+        return op(left, right) & valid
+
+    def __eq__(self, other) -> np.ndarray:
+        return self._cmp_method(other, operator.eq)
+
+    def __ne__(self, other) -> np.ndarray:
+        return self._cmp_method(other, operator.ne)
+
+    def __lt__(self, other) -> np.ndarray:
+        return self._cmp_method(other, operator.lt)
+
+    def __le__(self, other) -> np.ndarray:
+        return self._cmp_method(other, operator.le)
+
+    def __gt__(self, other) -> np.ndarray:
+        return self._cmp_method(other, operator.gt)
+
+    def __ge__(self, other) -> np.ndarray:
+        return self._cmp_method(other, operator.ge)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.array([self[i] for i in range(len(self))], dtype=object)
+
+    def isna(self) -> np.ndarray:
+        return self._codes < 0
+
+    def take(self, indices, allow_fill: bool = False, fill_value=None) -> NbItemsArray:
+        values = take(self._values, indices, allow_fill=allow_fill, fill_value=np.nan)
+        codes = take(self._codes.astype('int16'), indices, allow_fill=allow_fill, fill_value=-1)
+        return type(self)(values, codes)
+
+    def copy(self) -> NbItemsArray:
+        return type(self)(self._values.copy(), self._codes.copy())
+
+    @classmethod
+    def _concat_same_type(cls, to_concat: Sequence[NbItemsArray]) -> NbItemsArray:
+        return cls(np.concatenate([array._values for array in to_concat]),
+                   np.concatenate([array._codes for array in to_concat]))
+
+    def _values_for_argsort(self) -> np.ndarray:
+        return self.as_int.to_numpy(dtype='float64', na_value=np.nan)
+
+    def _values_for_factorize(self) -> tuple[np.ndarray, Any]:
+        return self.__array__(), None
+
+    def value_counts(self, dropna: bool = True) -> pd.Series:
+        """Number of occurrences of each distinct element (used by Series.value_counts)."""
+        codes, uniques = pd.factorize(self, use_na_sentinel=dropna)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        return pd.Series(counts, index=pd.Index(uniques), name='count')
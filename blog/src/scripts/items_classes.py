@@ -1,10 +1,17 @@
 from __future__ import annotations
 
 import re
-import pandas as pd
 from dataclasses import dataclass, field
 from enum import Enum
 
+# Formats accepted by NbItems.from_str
+FLOATING_PATTERN: re.Pattern = re.compile(r'^\d+(\.\d+)?[K|M]$')
+
+INT_PATTERN: re.Pattern = re.compile(r'^\d+$')
+
+# Same formats, in a single pattern used to parse whole columns
+NB_ITEMS_PATTERN: str = r'^(?:(?P<floating>\d+(?:\.\d+)?)(?P<multiplier>[KM])|(?P<int>\d+))$'
+
 
 class Multiplier(Enum):
     no_multiplier = 1
@@ -54,17 +61,21 @@ class NbItems:
             - a floating part (with optional decimal part), followed by a letter between K and M
             - an integer part, with no decimal part and no letter at the end
         """
-        floating_pattern = re.compile(r'^\d+(\.\d+)?[K|M]$')
-        int_pattern = re.compile(r'^\d+$')
-        if floating_pattern.match(cls_string):
+        if FLOATING_PATTERN.match(cls_string):
             floating_part = cls_string[:-1]  # Remove last letter, which is multiplier
             return NbItems(float(floating_part), Multiplier[cls_string[-1]])
-        elif int_pattern.match(cls_string):
+        elif INT_PATTERN.match(cls_string):
             return NbItems(int(cls_string), Multiplier.no_multiplier)
         else:
             raise ValueError(f'Provided string must be of format {cls.__name__}, {cls_string} was provided')
 
 
+# Multipliers stored by NbItemsArray, indexed by their code
+MULTIPLIERS: list[Multiplier] = [Multiplier.no_multiplier, Multiplier.K, Multiplier.M]
+
+MULTIPLIER_CODES: dict[Multiplier, int] = {multiplier: code for code, multiplier in enumerate(MULTIPLIERS)}
+
+
 def generate_nbitems(num_items):
     return [NbItems(value=i, multiplier=Multiplier.K) for i in range(1, num_items + 1)]
 
@@ -82,6 +93,8 @@ if __name__ == "__main__":
     nb_items_list = generate_nbitems(5)
 
     # Creating a DataFrame
+    import pandas as pd
+
     print(nb_items_list)
     df = pd.DataFrame(nb_items_list)
 
@@ -0,0 +1,161 @@
+"""
+Merging of the results of several websites into a single ranking: results are normalized to the same
+columns (prices in dollars, missing seller data for websites which do not scrape it), scored by a
+pluggable function, and the k best items are kept.
+"""
+import heapq
+import importlib
+import math
+from bisect import bisect_left
+from typing import Any, Callable
+
+from .config import get_setting
+from .items_classes import NbItems
+from .ranking import is_missing
+from .records import ItemRecord, ResultSet
+
+# Columns of merged results
+NORMALIZED_COLUMNS: list[str] = ['website', 'title', 'price_dollars', 'rating_avg', 'positive_feedback_percentage',
+                                 'nb_items_sold', 'item_url']
+
+# Currency of the prices scraped on each website
+WEBSITE_CURRENCIES: dict[str, str] = {'ebay': 'USD', 'amazon': 'EUR'}
+
+# Value of a unit of each currency in dollars, unless overridden by the CURRENCY_RATES of the
+# SCRAPER_FAN_OUT setting
+DEFAULT_CURRENCY_RATES: dict[str, float] = {'USD': 1.0, 'EUR': 1.08}
+
+# Weights of the criteria of default_score. Missing seller data counts as an average value (0.5).
+SCORE_WEIGHTS: dict[str, float] = {
+    'full_input': 2.0,
+    'rating': 1.0,
+    'feedback': 1.0,
+    'popularity': 1.0,
+    'cheapness': 1.0,
+}
+
+# Number of items sold giving the maximum popularity score
+MAX_POPULARITY: int = 1_000_000
+
+ScoreFunction = Callable[[list[ItemRecord], str], list[float]]
+
+
+def get_currency_rates() -> dict[str, float]:
+    """Returns the value of each currency in dollars."""
+    return {**DEFAULT_CURRENCY_RATES, **get_setting('SCRAPER_FAN_OUT', {}).get('CURRENCY_RATES', {})}
+
+
+def to_number(value: Any) -> float:
+    """Converts a scraped value to a float, NaN if it is missing or not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def get_nb_items_int(nb_items_sold: Any) -> int | None:
+    """Converts a number of items sold (NbItems object or string with NbItems format) to an integer, or None."""
+    if is_missing(nb_items_sold):
+        return None
+    if isinstance(nb_items_sold, NbItems):
+        return nb_items_sold.as_int
+    try:
+        return NbItems.from_str(str(nb_items_sold)).as_int
+    except ValueError:
+        return None
+
+
+def normalize_results(results: ResultSet, website: str, rates: dict[str, float] | None = None) -> list[ItemRecord]:
+    """
+    Converts the results of a website to records of NORMALIZED_COLUMNS, with prices in dollars.
+    :param results: results returned by main.main for the website
+    :param website: name of the website
+    :param rates: value of each currency in dollars, get_currency_rates() by default
+    :return: list of new records (missing values being NaN)
+    """
+    rates = rates if rates is not None else get_currency_rates()
+    rate = rates[WEBSITE_CURRENCIES.get(website.lower(), 'USD')]
+    columns = set(results.columns)
+    normalized = []
+    for record in results:
+        values = {column: getattr(record, column) if column in columns else math.nan
+                  for column in NORMALIZED_COLUMNS[1:]}
+        values['price_dollars'] = round(to_number(values['price_dollars']) * rate, 2)
+        for column in ('rating_avg', 'positive_feedback_percentage'):
+            values[column] = to_number(values[column])
+        normalized.append(ItemRecord(website=website.lower(), **values))
+    return normalized
+
+
+def get_cheapness(prices: list[float]) -> list[float]:
+    """
+    Returns the price criterion of default_score: 1 for the cheapest items, the percentile rank of
+    their price for the others (NaN for missing prices).
+    """
+    sorted_prices = sorted(price for price in prices if not math.isnan(price))
+    return [math.nan if math.isnan(price)
+            else 1 - (bisect_left(sorted_prices, price) + 1) / len(sorted_prices) + 1 / len(sorted_prices)
+            for price in prices]
+
+
+def default_score(items: list[ItemRecord], user_input: str) -> list[float]:
+    """
+    Scores items of any website (the higher, the better), as a weighted sum of criteria between 0
+    and 1: full user input in the title, seller rating, positive feedback percentage, number of
+    items sold (on a log scale) and price (the cheapest item of the results getting 1).
+    :param items: normalized results
+    :param user_input: user input given from website's form
+    :return: score of each item
+    """
+    user_input = user_input.upper()
+    cheapness = get_cheapness([item.price_dollars for item in items])
+    scores = []
+    for item, item_cheapness in zip(items, cheapness):
+        nb_items = get_nb_items_int(item.nb_items_sold)
+        criteria = {
+            'full_input': float(isinstance(item.title, str) and user_input in item.title.upper()),
+            'rating': item.rating_avg / 5,
+            'feedback': item.positive_feedback_percentage / 100,
+            'popularity': (math.nan if nb_items is None
+                           else min(math.log10(1 + nb_items) / math.log10(1 + MAX_POPULARITY), 1)),
+            'cheapness': item_cheapness,
+        }
+        scores.append(sum(SCORE_WEIGHTS[name] * (0.5 if math.isnan(value) else value)
+                          for name, value in criteria.items()))
+    return scores
+
+
+def get_score_function() -> ScoreFunction:
+    """
+    Returns the function scoring merged items: the one whose dotted path is the SCORE_FUNCTION of
+    the SCRAPER_FAN_OUT setting, or default_score.
+    """
+    path = get_setting('SCRAPER_FAN_OUT', {}).get('SCORE_FUNCTION')
+    if not path:
+        return default_score
+    module_name, function_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def merge_results(results: dict[str, ResultSet], user_input: str, k: int,
+                  score: ScoreFunction | None = None) -> ResultSet:
+    """
+    Merges the results of several websites and keeps the k best items.
+    :param results: results of each website
+    :param user_input: user input given from website's form
+    :param k: number of items to keep
+    :param score: function scoring normalized items, get_score_function() by default
+    :return: results with NORMALIZED_COLUMNS, a score column and the rank (from 1) of items in the
+        index column, sorted by decreasing score
+    """
+    score = score if score is not None else get_score_function()
+    rates = get_currency_rates()
+    items = [record for website, website_results in results.items() if website_results is not None
+             for record in normalize_results(website_results, website, rates)]
+    for item, item_score in zip(items, score(items, user_input)):
+        item.score = float(item_score)
+    # Like a stable sort, an item ranks before the next items with the same score
+    merged = heapq.nlargest(k, items, key=lambda item: item.score)
+    for rank, item in enumerate(merged, start=1):
+        item.index = rank
+    return ResultSet(merged, columns=['index', *NORMALIZED_COLUMNS, 'score'])
@@ -0,0 +1,150 @@
+"""
+Counters and timers of the scraping pipeline, kept in memory by each process and exposed in the
+Prometheus text format. Stages (fetch, parse, extract, rank, render) are timed with the timer
+context manager, labelled with the scraped website.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator
+
+# Upper bounds of the histogram buckets of durations, in seconds
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS: str = 'scraping_stage_seconds'
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def format_labels(labels: Labels, **extra: str) -> str:
+    """Formats labels as '{name="value",...}' (or '' without labels)."""
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """Distribution of observed values: count, sum and number of values in each bucket."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """Thread-safe store of the counters and histograms of the process."""
+
+    def __init__(self) -> None:
+        self._counters: dict[str, dict[Labels, float]] = defaultdict(dict)
+        self._histograms: dict[str, dict[Labels, Histogram]] = defaultdict(dict)
+        self._help: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Sets the description of a metric, written in the HELP line of the exposition."""
+        self._help[name] = help_text
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Increments a counter.
+        :param name: name of the counter, ending with '_total'
+        :param value: value added to the counter
+        :param labels: labels of the counter (e.g. host='www.ebay.com')
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counter = self._counters[name]
+            counter[key] = counter.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Adds a value to a histogram.
+        :param name: name of the histogram
+        :param value: observed value (e.g. a duration in seconds)
+        :param labels: labels of the histogram (e.g. stage='parse')
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage: str, **labels: str) -> Iterator[None]:
+        """
+        Context manager adding the duration of its block to the STAGE_SECONDS histogram.
+        :param stage: name of the timed stage ('fetch', 'parse', 'extract', 'rank', 'render'...)
+        :param labels: other labels (e.g. website='ebay')
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage, **labels)
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        """Returns the value of a counter, 0 if it was never incremented."""
+        with self._lock:
+            return self._counters[name].get(tuple(sorted(labels.items())), 0)
+
+    def clear(self) -> None:
+        """Resets all metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, values in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(values.items()):
+                    lines.append(f"{name}{format_labels(labels)} {value:g}")
+            for name, histograms in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels, le=f'{bound:g}')} {cumulative}")
+                    lines.append(f"{name}_bucket{format_labels(labels, le='+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+registry.describe(STAGE_SECONDS, "Duration of each stage of the scraping pipeline, in seconds.")
+registry.describe('scraping_responses_total', "Responses received from scraped websites, by host and status.")
+registry.describe('scraping_downloaded_bytes_total', "Bytes downloaded from scraped websites (compressed), by host.")
+registry.describe('scraping_truncated_responses_total', "Responses whose end was not downloaded, by host.")
+registry.describe('scraping_retries_total', "Requests retried after a connection error or a 429/5xx status.")
+registry.describe('scraping_result_cache_requests_total', "Lookups in the result cache, by result.")
+registry.describe('scraping_item_cache_requests_total', "Lookups in the item page cache, by result.")
+registry.describe('scraping_fan_out_failures_total', "Websites left out of merged results, by website.")
+registry.describe('scraping_unavailable_host_total', "Requests not sent to an unhealthy or rate limited host.")
+registry.describe('scraping_degraded_items_total', "Items scraped with missing data because their page failed.")
+registry.describe('scraping_stale_results_total', "Cached results served after a failed scraping, by website.")
+
+# Shortcuts to the registry of the process
+increment = registry.increment
+observe = registry.observe
+timer = registry.timer
@@ -0,0 +1,106 @@
+"""
+Crawling of several results pages of a search: next pages are fetched concurrently while the items
+of the first ones are processed, until a page or item budget is exhausted.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator
+
+from bs4 import Tag
+
+from .scraper import SCRAPING_ERRORS
+
+DEFAULT_MAX_PAGES: int = 1
+
+DEFAULT_MAX_ITEMS: int = 200
+
+DEFAULT_ENOUGH_ITEMS: int = 50
+
+
+class CrawlBudget:
+    """
+    Counts scraped items, to stop the crawl once max_items items were scraped, or once enough_items
+    items have the full user input in their title (the ones kept by remove_items_not_full_input).
+    """
+
+    def __init__(self, user_input: str, max_items: int = DEFAULT_MAX_ITEMS,
+                 enough_items: int = DEFAULT_ENOUGH_ITEMS) -> None:
+        self.user_input = user_input.lower()
+        self.max_items = max_items
+        self.enough_items = enough_items
+        self.nb_items = 0
+        self.nb_matching_items = 0
+
+    @property
+    def remaining(self) -> int:
+        """Number of items which can still be scraped."""
+        return max(self.max_items - self.nb_items, 0)
+
+    @property
+    def is_exhausted(self) -> bool:
+        return self.remaining == 0 or self.nb_matching_items >= self.enough_items
+
+    def add(self, item: dict[str, Any]) -> None:
+        """Counts a scraped item."""
+        self.nb_items += 1
+        if self.user_input in str(item.get('title', '')).lower():
+            self.nb_matching_items += 1
+
+
+def iter_pages(first_page: list[Tag], fetch_page: Callable[[int], list[Tag]],
+               max_pages: int = DEFAULT_MAX_PAGES, max_workers: int = 4) -> Iterator[list[Tag]]:
+    """
+    Yields the item tags of each results page, in page order. Pages 2 to max_pages are all requested
+    at once, so they are usually downloaded by the time the items of previous pages are processed.
+    The crawl stops at the first empty or failing page, and pending requests are cancelled when the
+    caller stops iterating.
+    :param first_page: item tags of the first page, already fetched
+    :param fetch_page: function returning the item tags of the page with given number (from 2)
+    :param max_pages: maximum number of pages to crawl
+    :param max_workers: number of pages fetched at the same time
+    :return: iterator over lists of item tags
+    """
+    yield first_page
+    if max_pages <= 1 or not first_page:
+        return
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pagination')
+    futures = [executor.submit(fetch_page, page) for page in range(2, max_pages + 1)]
+    try:
+        for future in futures:
+            try:
+                page_tags = future.result()
+            except SCRAPING_ERRORS:
+                return
+            if not page_tags:
+                return
+            yield page_tags
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_pages(first_page: list[Tag], fetch_page: Callable[[int], Awaitable[list[Tag]]],
+                      max_pages: int = DEFAULT_MAX_PAGES) -> AsyncIterator[list[Tag]]:
+    """
+    Asynchronous version of iter_pages: pages 2 to max_pages are requested at once in tasks of the
+    running event loop, and their item tags are yielded in page order.
+    :param first_page: item tags of the first page, already fetched
+    :param fetch_page: coroutine function returning the item tags of the page with given number
+    :param max_pages: maximum number of pages to crawl
+    :return: asynchronous iterator over lists of item tags
+    """
+    yield first_page
+    if max_pages <= 1 or not first_page:
+        return
+    tasks = [asyncio.create_task(fetch_page(page)) for page in range(2, max_pages + 1)]
+    try:
+        for task in tasks:
+            try:
+                page_tags = await task
+            except SCRAPING_ERRORS:
+                return
+            if not page_tags:
+                return
+            yield page_tags
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,142 @@
+"""
+Pool of parser processes: parsing and extraction of pages, pure-Python CPU work serialized by the GIL
+in the web process, run in worker processes instead, one per core. Workers get the raw bytes of a page
+and return plain data (dicts of numbers and strings, cheap to pickle) rather than soup objects. The
+pool is started once and reused by all scrapings of the process.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from . import metrics
+from .config import get_setting
+
+logger = logging.getLogger(__name__)
+
+metrics.registry.describe('scraping_parser_pool_restarts_total', "Parser pools restarted after a worker died.")
+
+
+def warm_up_worker() -> None:
+    """Initializer of the workers: imports the parsers and extraction specs before the first page."""
+    from . import amazon_scraping, ebay_scraping  # noqa: F401
+
+
+def get_worker_pid() -> int:
+    return os.getpid()
+
+
+class ParserPool:
+    """Runs parsing functions in a pool of worker processes, restarted if a worker dies."""
+
+    def __init__(self, max_workers: int | None = None) -> None:
+        """
+        Constructor of ParserPool class.
+        :param max_workers: number of worker processes, the number of cores by default
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """Returns the executor of the pool, creating it on first call."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # Workers are spawned rather than forked, the web process running threads
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=multiprocessing.get_context('spawn'),
+                                                         initializer=warm_up_worker)
+        return self._executor
+
+    def start(self, wait: bool = True) -> None:
+        """
+        Starts all workers, so that the first pages do not wait for them.
+        :param wait: if True, returns once all workers are ready
+        """
+        executor = self.get_executor()
+        futures = [executor.submit(get_worker_pid) for _ in range(self.max_workers)]
+        if wait:
+            for future in futures:
+                future.result()
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        """Runs func(*args) in a worker, and returns the future of its result."""
+        return self._submit(func, *args)[1]
+
+    def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Runs func(*args) in a worker and returns its result. If a worker died meanwhile, the pool is
+        restarted and func runs in the calling process.
+        """
+        executor, future = self._submit(func, *args)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self.restart(executor)
+            return func(*args)
+
+    async def arun(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Asynchronous version of run, waiting for the worker without blocking the event loop."""
+        executor, future = self._submit(func, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self.restart(executor)
+            return func(*args)
+
+    def restart(self, broken: ProcessPoolExecutor) -> None:
+        """
+        Replaces a broken executor by a new one, started on next submit. Several threads can find the
+        same executor broken: only the first one replaces it, so that the new executor is kept.
+        :param broken: executor which raised BrokenProcessPool
+        """
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        metrics.increment('scraping_parser_pool_restarts_total')
+        logger.warning("Parser pool restarted after a worker died")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, func: Callable[..., Any], *args: Any) -> tuple[ProcessPoolExecutor, Future]:
+        """Submits func(*args), restarting the pool if it is broken, and returns the executor and the future."""
+        executor = self.get_executor()
+        try:
+            return executor, executor.submit(func, *args)
+        except BrokenProcessPool:
+            self.restart(executor)
+            executor = self.get_executor()
+            return executor, executor.submit(func, *args)
+
+    def shutdown(self) -> None:
+        """Stops the workers after their current pages."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_parser_pool: ParserPool | None = None
+_parser_pool_lock = threading.Lock()
+
+
+def get_parser_pool() -> ParserPool | None:
+    """
+    Returns the ParserPool of the process, created from the SCRAPER_PARSER_POOL setting and started in
+    background on first call, or None if pages are parsed in the scraping threads.
+    """
+    global _parser_pool
+    config = get_setting('SCRAPER_PARSER_POOL', {})
+    if not config.get('ENABLED', False):
+        return None
+    if _parser_pool is None:
+        with _parser_pool_lock:
+            if _parser_pool is None:
+                _parser_pool = ParserPool(max_workers=config.get('MAX_WORKERS'))
+                _parser_pool.start(wait=False)
+    return _parser_pool
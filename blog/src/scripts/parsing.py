@@ -0,0 +1,46 @@
+"""
+Creation of BeautifulSoup objects from raw responses. The lxml parser is used when it is installed,
+and only the parts of a page needed by a scraper can be parsed, with a SoupStrainer.
+"""
+from bs4 import BeautifulSoup, SoupStrainer
+from requests import Response
+
+try:
+    import lxml  # noqa: F401
+    PARSER: str = 'lxml'
+except ImportError:
+    PARSER: str = 'html.parser'
+
+
+def get_declared_encoding(response: Response) -> str | None:
+    """
+    Returns the encoding declared in the Content-Type header of a response, if any. When there is
+    none, BeautifulSoup detects it from the page (requests would assume ISO-8859-1 instead).
+    :param response: response of a website
+    :return: name of the encoding, or None
+    """
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        return response.encoding
+    return None
+
+
+def make_soup(content: bytes, parse_only: SoupStrainer | None = None,
+              encoding: str | None = None) -> BeautifulSoup:
+    """
+    Parses HTML source code, without decoding it to a string first.
+    :param content: HTML source code, as bytes
+    :param parse_only: if given, only the tags matching this strainer (and their children) are parsed
+    :param encoding: encoding of content, detected from the page if None
+    :return: soup object with parsed html source code
+    """
+    return BeautifulSoup(content, PARSER, parse_only=parse_only, from_encoding=encoding)
+
+
+def make_response_soup(response: Response, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+    """
+    Parses HTML source code of a response.
+    :param response: response of a website
+    :param parse_only: if given, only the tags matching this strainer (and their children) are parsed
+    :return: soup object with parsed html source code
+    """
+    return make_soup(response.content, parse_only=parse_only, encoding=get_declared_encoding(response))
@@ -0,0 +1,129 @@
+"""
+Planning of the enrichment of eBay items with the data of their item page (seller ratings), which
+costs a request and a parse per item. The data of the search pages (title, price and link) already
+tells which items cannot be ranked: duplicates, items without price or link, items out of the price
+bounds, and items without the user input in their title when enough items have it (see
+compute_item_data.remove_items_not_full_input). Only the other ones are enriched, up to a budget,
+as the results pages are received (see EnrichmentPlanner).
+"""
+from typing import Any
+
+from . import metrics
+from .item_cache import canonical_item_url
+from .ranking import MIN_MATCHING_ITEMS, is_missing
+
+metrics.registry.describe('scraping_planned_items_total',
+                          "Items of eBay searches by enrichment plan: enriched, skipped or duplicate.")
+
+# Seller data of the items which are not enriched (dropped by the ranking, like degraded items)
+MISSING_ITEM_PAGE_DATA: dict[str, Any] = {
+    'rating_avg': float('nan'),
+    'positive_feedback_percentage': None,
+    'nb_items_sold': None,
+}
+
+
+def is_in_price_bounds(price: float, min_price: float | None, max_price: float | None) -> bool:
+    return (min_price is None or price >= min_price) and (max_price is None or price <= max_price)
+
+
+class EnrichmentPlanner:
+    """
+    Plans which items of a search are enriched, page after page: the item pages of a results page are
+    requested as soon as it is received, without waiting for the next results pages. Items with the
+    full user input in their title are enriched at once, up to the budget. The other rankable items
+    are deferred: if too few enriched items have the full user input in their title, the ranking
+    falls back to all items, and they are enriched at the end of the crawl with the rest of the
+    budget. The search pages only give the price of the items, the last of the ranking keys (see
+    ranking.SORTING_ORDER): within the budget, items are enriched in search order, and an item left
+    out by the budget may have ranked better than an enriched one.
+    """
+
+    def __init__(self, user_input: str, budget: int | None = None, min_price: float | None = None,
+                 max_price: float | None = None) -> None:
+        """
+        Constructor of EnrichmentPlanner class.
+        :param user_input: user input given from website's form
+        :param budget: maximum number of items to enrich, no limit if None
+        :param min_price: items cheaper than this price are not enriched
+        :param max_price: items more expensive than this price are not enriched
+        """
+        self.user_input = user_input.lower()
+        self.budget = budget
+        self.min_price = min_price
+        self.max_price = max_price
+        # Search page data of all planned items, in search order
+        self.candidates: list[dict[str, Any]] = []
+        # Positions of the candidates by result of the plan
+        self.enriched: set[int] = set()
+        self.duplicates: set[int] = set()
+        self.deferred: list[int] = []
+        self.nb_ranked_matching_items = 0
+        self._seen_urls: set[str] = set()
+
+    @property
+    def remaining(self) -> int | None:
+        """Number of items which can still be enriched, None if there is no budget."""
+        return None if self.budget is None else max(self.budget - len(self.enriched), 0)
+
+    def is_rankable(self, item: dict[str, Any]) -> bool:
+        """True if an item has a title and a price within the price bounds."""
+        return not is_missing(item['title']) and not is_missing(item['price_dollars']) \
+            and is_in_price_bounds(item['price_dollars'], self.min_price, self.max_price)
+
+    def plan_page(self, candidates: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Plans the items of a results page.
+        :param candidates: search page data of the items of the page (title, price_dollars and item_url)
+        :return: items to enrich now, in search order
+        """
+        selected = []
+        for item in candidates:
+            position = len(self.candidates)
+            self.candidates.append(item)
+            if is_missing(item['item_url']):
+                continue
+            url = canonical_item_url(item['item_url'])
+            if url in self._seen_urls:
+                self.duplicates.add(position)
+                continue
+            self._seen_urls.add(url)
+            if not self.is_rankable(item):
+                continue
+            if self.user_input not in item['title'].lower():
+                self.deferred.append(position)
+            elif self.remaining is None or self.remaining > 0:
+                self.enriched.add(position)
+                selected.append(item)
+        return selected
+
+    def add_enriched(self, item: dict[str, Any]) -> None:
+        """
+        Counts an enriched item, to know whether the ranking needs the deferred items.
+        :param item: item once enriched
+        """
+        if not any(is_missing(value) for value in item.values()) and self.user_input in item['title'].lower():
+            self.nb_ranked_matching_items += 1
+
+    def get_fallback(self) -> list[dict[str, Any]]:
+        """
+        Returns the deferred items to enrich once all pages were planned and their items enriched.
+        :return: items in search order, empty if the ranking does not need them
+        """
+        if self.nb_ranked_matching_items > MIN_MATCHING_ITEMS:
+            return []
+        fallback = self.deferred if self.remaining is None else self.deferred[:self.remaining]
+        self.enriched.update(fallback)
+        return [self.candidates[i] for i in fallback]
+
+    def get_skipped(self) -> list[dict[str, Any]]:
+        """Returns the items kept without enrichment (except duplicates), in search order, without seller data."""
+        return [{**item, **MISSING_ITEM_PAGE_DATA} for i, item in enumerate(self.candidates)
+                if i not in self.enriched and i not in self.duplicates]
+
+    def count(self) -> None:
+        """Counts the items of the search by result of the plan."""
+        nb_skipped = len(self.candidates) - len(self.enriched) - len(self.duplicates)
+        metrics.increment('scraping_planned_items_total', len(self.enriched), result='enriched')
+        metrics.increment('scraping_planned_items_total', nb_skipped, result='skipped')
+        metrics.increment('scraping_planned_items_total', len(self.duplicates), result='duplicate')
@@ -0,0 +1,118 @@
+"""
+Selection of the k best scraped items, along SORTING_ORDER, without sorting all of them: items are
+added one by one as they are scraped (TopK, ItemRanker). A DataFrame of items can be partially sorted
+the same way by compute_item_data.top_k_index.
+"""
+import heapq
+import itertools
+import math
+from typing import Any
+
+from .records import ResultSet
+
+# Sorting keys and whether each one is sorted in ascending order (the lowest price ranks first)
+SORTING_ORDER: list[str] = ["nb_items_int", "positive_feedback_percentage", "rating_avg", "price_dollars"]
+
+ASCENDING: tuple[bool, ...] = (False, False, False, True)
+
+# Items with the full user input in their title are only kept if there are more than this number
+MIN_MATCHING_ITEMS: int = 10
+
+
+def sort_key(item: dict[str, Any]) -> tuple[float, ...]:
+    """
+    Returns the ranking key of an item: the greater the key, the better the item.
+    :param item: dict with SORTING_ORDER keys
+    :return: tuple of floats, compared in lexicographic order
+    """
+    return tuple(-item[column] if ascending else item[column]
+                 for column, ascending in zip(SORTING_ORDER, ASCENDING))
+
+
+def is_missing(value: Any) -> bool:
+    """True if value would be dropped by DataFrame.dropna (None or NaN)."""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class TopK:
+    """
+    Keeps the k best items added to it in a heap, in O(log k) per item. Like a stable sort, an item
+    ranks before the items added after it with the same key.
+    """
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+        # Min-heap of (key, -insertion number, item): the root is the worst kept item
+        self._heap: list[tuple[tuple[float, ...], int, dict[str, Any]]] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, item: dict[str, Any]) -> None:
+        """
+        Adds an item, which is kept only if it is among the k best ones.
+        :param item: dict with SORTING_ORDER keys
+        """
+        entry = (sort_key(item), -next(self._counter), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def result(self) -> list[dict[str, Any]]:
+        """Returns the kept items, from the best to the worst one."""
+        return [item for _, _, item in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+class ItemRanker:
+    """
+    Ranks eBay items as they are scraped, with the same result as compute_item_data.main followed by
+    head(k): items with missing data are dropped, and if more than MIN_MATCHING_ITEMS items have the
+    full user input in their title, only these are ranked.
+    """
+
+    def __init__(self, user_input: str, k: int = 10) -> None:
+        self.user_input = user_input.lower()
+        self.all_items = TopK(k)
+        self.matching_items = TopK(k)
+        self.nb_matching_items = 0
+
+    def add(self, item: dict[str, Any]) -> None:
+        """
+        Adds a scraped item to the ranking.
+        :param item: dict yielded by EBayScraper.iter_items
+        """
+        if any(is_missing(value) for value in item.values()):
+            return
+        item = {**item, 'nb_items_int': item['nb_items_sold'].as_int}
+        self.all_items.add(item)
+        if self.user_input in item['title'].lower():
+            self.nb_matching_items += 1
+            self.matching_items.add(item)
+
+    def result(self) -> ResultSet:
+        """Returns the k best items, with their rank (from 1) in the index column."""
+        if self.nb_matching_items > MIN_MATCHING_ITEMS:
+            items = self.matching_items.result()
+        else:
+            items = self.all_items.result()
+        result = ResultSet.from_items(items, columns=['index', *items[0]] if items else ())
+        for rank, record in enumerate(result, start=1):
+            record.index = rank
+        return result
+
+
+class FirstItems:
+    """Keeps the k first items added to it (for websites whose items are not ranked)."""
+
+    def __init__(self, user_input: str, k: int = 10) -> None:
+        self.k = k
+        self.items: list[dict[str, Any]] = []
+
+    def add(self, item: dict[str, Any]) -> None:
+        if len(self.items) < self.k:
+            self.items.append(item)
+
+    def result(self) -> ResultSet:
+        return ResultSet.from_items(self.items)
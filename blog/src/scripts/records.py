@@ -0,0 +1,137 @@
+"""
+Results of the scrapings without pandas: each item is an ItemRecord (with __slots__ rather than a
+dict of its fields), and the results of a query a ResultSet of records with the names of their
+columns. Results go from the scrapers to the page (and the result cache) as they are, a DataFrame is
+only built when asked for (to_dataframe, for analytics).
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Mapping
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Fields of item records, in the usual order of the columns of results
+ITEM_FIELDS: tuple[str, ...] = ('index', 'website', 'title', 'price_dollars', 'rating_avg',
+                                'positive_feedback_percentage', 'nb_items_sold', 'item_url', 'nb_items_int',
+                                'score')
+
+
+class ItemRecord:
+    """
+    Data of a scraped item. Fields which were not scraped for the item are None. Records are pickled
+    as a tuple of their values.
+    """
+    __slots__ = ITEM_FIELDS
+
+    def __init__(self, **values: Any) -> None:
+        for name in ITEM_FIELDS:
+            setattr(self, name, values.get(name))
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[str, Any]) -> ItemRecord:
+        """Creates a record from a dict of item data (as yielded by the iter_items method of a scraper)."""
+        record = cls.__new__(cls)
+        for name in ITEM_FIELDS:
+            setattr(record, name, data.get(name))
+        return record
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return getattr(self, name)
+        except (AttributeError, TypeError):
+            raise KeyError(name) from None
+
+    def __getstate__(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in ITEM_FIELDS)
+
+    def __setstate__(self, state: tuple[Any, ...]) -> None:
+        for name, value in zip(ITEM_FIELDS, state):
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        values = ', '.join(f"{name}={getattr(self, name)!r}" for name in ITEM_FIELDS if getattr(self, name) is not None)
+        return f"ItemRecord({values})"
+
+
+class ResultSet:
+    """
+    Results of a query: item records, in ranking order, with the names of the columns of the results
+    (a subset of ITEM_FIELDS), and attributes like DataFrame.attrs (e.g. 'stale').
+    """
+    __slots__ = ('records', 'columns', 'attrs')
+
+    def __init__(self, records: list[ItemRecord] | None = None, columns: Iterable[str] = (),
+                 attrs: dict[str, Any] | None = None) -> None:
+        self.records = records if records is not None else []
+        self.columns = tuple(columns)
+        unknown_columns = set(self.columns).difference(ITEM_FIELDS)
+        if unknown_columns:
+            raise ValueError(f"Unknown columns of item records: {sorted(unknown_columns)}")
+        self.attrs = attrs if attrs is not None else {}
+
+    @classmethod
+    def from_items(cls, items: Iterable[Mapping[str, Any]], columns: Iterable[str] | None = None) -> ResultSet:
+        """
+        Creates results from dicts of item data.
+        :param items: dicts of item data
+        :param columns: columns of the results, the keys of the items (in order of appearance) by default
+        :return: ResultSet of the items
+        """
+        items = list(items)
+        if columns is None:
+            columns = dict.fromkeys(name for item in items for name in item)
+        return cls([ItemRecord.from_mapping(item) for item in items], columns)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[ItemRecord]:
+        return iter(self.records)
+
+    def __getitem__(self, position: int) -> ItemRecord:
+        return self.records[position]
+
+    def __repr__(self) -> str:
+        return f"<ResultSet: {len(self.records)} items, columns {list(self.columns)}>"
+
+    @property
+    def empty(self) -> bool:
+        return not self.records
+
+    def head(self, n: int) -> ResultSet:
+        """Returns the n first items."""
+        return ResultSet(self.records[:n], self.columns, dict(self.attrs))
+
+    def copy(self) -> ResultSet:
+        """Returns a copy of the results, whose list of records and attributes can be changed (records are shared)."""
+        return ResultSet(list(self.records), self.columns, dict(self.attrs))
+
+    def get_version(self) -> str:
+        """
+        Returns a hash of the columns and values of the items (not of the attributes), which changes
+        whenever the displayed results change (e.g. for ETags).
+        """
+        values = [tuple(getattr(record, name) for name in self.columns) for record in self.records]
+        return hashlib.blake2b(repr((self.columns, values)).encode(), digest_size=12).hexdigest()
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        """Returns a dict of the columns of each item."""
+        return [{name: getattr(record, name) for name in self.columns} for record in self.records]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Converts the results to a DataFrame (with the same attrs), the nb_items_sold column having the
+        nb_items dtype (see items_arrays.py).
+        """
+        import pandas as pd
+
+        from .items_arrays import NbItemsArray
+
+        data = pd.DataFrame([[getattr(record, name) for name in self.columns] for record in self.records],
+                            columns=list(self.columns))
+        if 'nb_items_sold' in data.columns:
+            data['nb_items_sold'] = NbItemsArray._from_sequence(data['nb_items_sold'])
+        data.attrs.update(self.attrs)
+        return data
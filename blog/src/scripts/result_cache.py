@@ -0,0 +1,508 @@
+"""
+Cache of scraping results, keyed by website and normalized user input, so that a query run again
+before its expiration is not scraped again. Expired results are kept a while longer, to be served
+when the website cannot be scraped. The scrapers are only imported once a result is computed, so
+that the web workers which only render pages do not import them.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Generator, NamedTuple, Protocol
+
+from . import metrics
+from .config import get_setting
+
+if TYPE_CHECKING:
+    from .records import ResultSet
+
+DEFAULT_TTL: int = 600
+
+# Number of seconds after their expiration during which results are served if scraping fails
+DEFAULT_STALE_TTL: int = 3600
+
+DEFAULT_MAX_BYTES: int = 32 * 1024 * 1024
+
+# Prefix of the keys on Django's caches, changed with the type of cached results (results of an older
+# type, cached by workers not restarted yet, are not read)
+DJANGO_KEY_PREFIX: str = 'scraping_result:v2'
+
+logger = logging.getLogger(__name__)
+
+# Generator yielding values while computing a result, which it returns (see ResultCache.stream_once)
+ResultStream = Generator[Any, None, 'ResultSet | None']
+
+
+def normalize_query(user_input: str) -> str:
+    """
+    Folds case and whitespaces of a user input, so that 'iPhone  13 ' and 'iphone 13' share a same
+    cache entry.
+    :param user_input: user input given from website's form
+    :return: normalized user input
+    """
+    return ' '.join(user_input.lower().split())
+
+
+def get_cache_key(website: str, user_input: str) -> str:
+    """
+    Returns the cache key of a query.
+    :param website: name of the scraped website
+    :param user_input: user input given from website's form
+    :return: cache key, as a string
+    """
+    return f"{website.lower()}:{normalize_query(user_input)}"
+
+
+class CachedResult(NamedTuple):
+    """Result stored by ResultCache, with its creation time (time.time() timestamp)."""
+    result: ResultSet
+    created_at: float
+
+
+def get_size(value: Any) -> int:
+    """
+    Estimates the memory used by a cached value, in bytes.
+    :param value: cached value (usually a CachedResult)
+    :return: estimated size in bytes
+    """
+    if isinstance(value, CachedResult):
+        value = value.result
+    try:
+        return len(pickle.dumps(value))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return sys.getsizeof(value)
+
+
+class CacheBackend(Protocol):
+    """Protocol class for storages of cached results."""
+
+    # If True, get and set do I/O, and are run in a thread by the async methods of ResultCache
+    is_blocking: bool = False
+
+    def get(self, key: str) -> Any | None:
+        """Returns the value stored for given key, or None if it is missing or expired."""
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Stores value for given key, for ttl seconds."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Storage of the current process, with a TTL on each entry. When the total size of entries exceeds
+    max_bytes, least recently used entries are evicted.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # key -> (expiration timestamp, size in bytes, value), ordered from least to most recently used
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        size = get_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """Removes all stored values."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        """Removes an entry, the lock must be held by the caller."""
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+
+class DjangoCacheBackend(CacheBackend):
+    """Storage on one of Django's caches (see CACHES setting), shared by all workers using it."""
+
+    is_blocking = True
+
+    def __init__(self, alias: str = 'default') -> None:
+        from django.core.cache import caches
+
+        self.cache = caches[alias]
+
+    def get(self, key: str) -> Any | None:
+        return self.cache.get(f"{DJANGO_KEY_PREFIX}:{key}")
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.cache.set(f"{DJANGO_KEY_PREFIX}:{key}", value, timeout=ttl)
+
+
+class ResultCache:
+    """
+    Cache of scraping results, counting its hits and misses. Results are fresh during ttl seconds,
+    then stale during stale_ttl seconds.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = DEFAULT_TTL, stale_ttl: float = DEFAULT_STALE_TTL) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Futures of the results being computed, by cache key
+        self._in_flight: dict[str, Future] = {}
+
+    def get(self, website: str, user_input: str) -> ResultSet | None:
+        """
+        Returns the fresh cached result of a query.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :return: copy of the cached result, or None on cache misses
+        """
+        cached = self.backend.get(get_cache_key(website, user_input))
+        if cached is not None and time.time() - cached.created_at >= self.ttl:
+            cached = None
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.increment('scraping_result_cache_requests_total', website=website.lower(),
+                          result='miss' if cached is None else 'hit')
+        return cached.result.copy() if cached is not None else None
+
+    def peek(self, website: str, user_input: str) -> ResultSet | None:
+        """
+        Returns the fresh cached result of a query, without counting a hit or a miss (e.g. to
+        validate the ETag of a conditional request).
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :return: copy of the cached result, or None if there is no fresh one
+        """
+        cached = self.backend.get(get_cache_key(website, user_input))
+        if cached is None or time.time() - cached.created_at >= self.ttl:
+            return None
+        return cached.result.copy()
+
+    def get_stale(self, website: str, user_input: str) -> ResultSet | None:
+        """
+        Returns the cached result of a query, even if it expired less than stale_ttl seconds ago.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :return: copy of the cached result, with a True 'stale' attribute if it expired, or None
+        """
+        cached = self.backend.get(get_cache_key(website, user_input))
+        if cached is None:
+            return None
+        result = cached.result.copy()
+        result.attrs['stale'] = time.time() - cached.created_at >= self.ttl
+        return result
+
+    def get_expiration(self, website: str, user_input: str) -> float | None:
+        """
+        Returns the number of seconds before the cached result of a query expires (negative if it is
+        stale), without counting a hit or a miss.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :return: number of seconds, or None if no result is cached
+        """
+        cached = self.backend.get(get_cache_key(website, user_input))
+        return cached.created_at + self.ttl - time.time() if cached is not None else None
+
+    def set(self, website: str, user_input: str, result: ResultSet) -> None:
+        """
+        Caches the result of a query for ttl seconds (plus stale_ttl seconds as a stale result).
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :param result: result of the query
+        """
+        self.backend.set(get_cache_key(website, user_input), CachedResult(result, time.time()),
+                         self.ttl + self.stale_ttl)
+
+    def get_or_compute(self, website: str, user_input: str,
+                       compute: Callable[[], ResultSet | None]) -> ResultSet | None:
+        """
+        Returns the cached result of a query, or computes and caches it if there is none. A query
+        already being computed by another thread is not computed again: its result (or error) is
+        awaited. If the computation fails on a request error, a stale result is returned instead when
+        there is one.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :param compute: function scraping the website, called on cache misses
+        :return: copy of the result of the query
+        """
+        cached = self.get(website, user_input)
+        if cached is not None:
+            return cached
+        return self.compute_once(website, user_input, compute)
+
+    def compute_once(self, website: str, user_input: str, compute: Callable[[], ResultSet | None],
+                     serve_stale: bool = True) -> ResultSet | None:
+        """
+        Computes and caches the result of a query, even if a fresh one is cached, unless the query is
+        already being computed: its result (or error) is then awaited.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :param compute: function scraping the website
+        :param serve_stale: if True, a stale result is returned instead of request errors when there is one
+        :return: copy of the result of the query
+        """
+        key = get_cache_key(website, user_input)
+        while True:
+            future, is_computing = self._join_in_flight(key)
+            if is_computing:
+                break
+            try:
+                return self.wait_in_flight(website, user_input, future, serve_stale)
+            except CancelledError:
+                # The coroutine or the stream computing the query was cancelled, the query is computed again
+                continue
+        try:
+            result = self.compute(website, user_input, compute, serve_stale)
+        except BaseException as error:
+            self._release_in_flight(key)
+            future.set_exception(error)
+            raise
+        self._release_in_flight(key)
+        future.set_result(result)
+        return result.copy() if result is not None else None
+
+    def stream_once(self, website: str, user_input: str,
+                    compute: Callable[[], ResultStream]) -> ResultStream:
+        """
+        Version of compute_once computing the result with a generator function, whose values are
+        yielded as they come and whose return value is the result. If the query is already being
+        computed, nothing is yielded and its result is awaited. If the generator is closed before its
+        end (client gone), the waiters compute the query again.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :param compute: generator function scraping the website
+        :return: copy of the result of the query (value of the yield from expression)
+        """
+        from .scraper import SCRAPING_ERRORS
+
+        key = get_cache_key(website, user_input)
+        while True:
+            future, is_computing = self._join_in_flight(key)
+            if is_computing:
+                break
+            try:
+                return self.wait_in_flight(website, user_input, future)
+            except CancelledError:
+                continue
+        try:
+            try:
+                result = yield from compute()
+            except SCRAPING_ERRORS as error:
+                result = self.get_stale_or_raise(website, user_input, error)
+            else:
+                if result is not None:
+                    self.set(website, user_input, result)
+        except GeneratorExit:
+            self._release_in_flight(key)
+            future.cancel()
+            raise
+        except BaseException as error:
+            self._release_in_flight(key)
+            future.set_exception(error)
+            raise
+        self._release_in_flight(key)
+        future.set_result(result)
+        return result.copy() if result is not None else None
+
+    def wait_in_flight(self, website: str, user_input: str, future: Future,
+                       serve_stale: bool = True) -> ResultSet | None:
+        """
+        Waits for the result of a query computed by another caller.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :param future: future of the query in flight
+        :param serve_stale: if True, a stale result is returned instead of request errors when there is one
+        :return: copy of the result of the query
+        :raise CancelledError: if the computation was cancelled, the query having to be computed again
+        """
+        from .scraper import SCRAPING_ERRORS
+
+        metrics.increment('scraping_result_cache_requests_total', website=website.lower(), result='in_flight')
+        try:
+            result = future.result()
+        except SCRAPING_ERRORS as error:
+            # The query may have been computed without serving stale results (see serve_stale)
+            if not serve_stale:
+                raise
+            return self.get_stale_or_raise(website, user_input, error)
+        return result.copy() if result is not None else None
+
+    def compute(self, website: str, user_input: str, compute: Callable[[], ResultSet | None],
+                serve_stale: bool = True) -> ResultSet | None:
+        """Computes and caches the result of a query, or returns a stale result if it fails."""
+        from .scraper import SCRAPING_ERRORS
+
+        try:
+            result = compute()
+        except SCRAPING_ERRORS as error:
+            if not serve_stale:
+                raise
+            return self.get_stale_or_raise(website, user_input, error)
+        if result is not None:
+            self.set(website, user_input, result)
+        return result
+
+    def get_stale_or_raise(self, website: str, user_input: str, error: Exception) -> ResultSet:
+        """Returns the stale result of a query whose computation failed, or raises the error."""
+        stale = self.get_stale(website, user_input)
+        if stale is None:
+            raise error
+        metrics.increment('scraping_stale_results_total', website=website.lower())
+        logger.warning("Stale results of %s served for '%s': %s", website, user_input, error)
+        return stale
+
+    async def aget_or_compute(self, website: str, user_input: str,
+                              compute: Callable[[], Awaitable[ResultSet | None]]) -> ResultSet | None:
+        """
+        Asynchronous version of get_or_compute, computing results with a coroutine function. Queries
+        in flight are shared with get_or_compute: a query computed by a thread or by another
+        coroutine is awaited without blocking the event loop. If the coroutine computing a query is
+        cancelled, its waiters do not fail: one of them computes the query again.
+        :param website: name of the scraped website
+        :param user_input: user input given from website's form
+        :param compute: coroutine function scraping the website, called on cache misses
+        :return: copy of the result of the query
+        """
+        from .scraper import SCRAPING_ERRORS
+
+        cached = await self.run_backend(self.get, website, user_input)
+        if cached is not None:
+            return cached
+        key = get_cache_key(website, user_input)
+        while True:
+            future, is_computing = self._join_in_flight(key)
+            if is_computing:
+                break
+            metrics.increment('scraping_result_cache_requests_total', website=website.lower(), result='in_flight')
+            try:
+                # Shielded, so that a cancelled waiter does not cancel the shared computation
+                result = await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                continue
+            except SCRAPING_ERRORS as error:
+                return await self.run_backend(self.get_stale_or_raise, website, user_input, error)
+            return result.copy() if result is not None else None
+        try:
+            try:
+                result = await compute()
+            except SCRAPING_ERRORS as error:
+                result = await self.run_backend(self.get_stale_or_raise, website, user_input, error)
+            else:
+                if result is not None:
+                    await self.run_backend(self.set, website, user_input, result)
+        except asyncio.CancelledError:
+            # The cancellation is not given to the waiters, which compute the query again
+            self._release_in_flight(key)
+            future.cancel()
+            raise
+        except BaseException as error:
+            self._release_in_flight(key)
+            future.set_exception(error)
+            raise
+        self._release_in_flight(key)
+        future.set_result(result)
+        return result.copy() if result is not None else None
+
+    async def run_backend(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Calls a method reading or writing the backend from a coroutine: in a thread if the backend
+        is blocking, so that the event loop is not blocked by its I/O.
+        """
+        if self.backend.is_blocking:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+    def _join_in_flight(self, key: str) -> tuple[Future, bool]:
+        """
+        Returns the future of a query being computed, or registers a new one.
+        :param key: cache key of the query
+        :return: future of the result, and True if the caller registered it and must compute the query
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _release_in_flight(self, key: str) -> None:
+        """
+        Removes the future of a query from the queries in flight, before it is resolved: waiters woken
+        up by a cancellation then register a new computation.
+        :param key: cache key of the query
+        """
+        with self._lock:
+            del self._in_flight[key]
+
+    def stats(self) -> dict[str, int]:
+        """Returns the number of hits and misses of the cache since the process started."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def create_result_cache(config: dict[str, Any]) -> ResultCache:
+    """
+    Creates a ResultCache from a SCRAPER_RESULT_CACHE-like dict.
+    :param config: dict with optional keys BACKEND ('memory' or 'django'), TTL, STALE_TTL, MAX_BYTES
+        and CACHE_ALIAS
+    :return: ResultCache object
+    """
+    if config.get('BACKEND', 'memory') == 'django':
+        backend = DjangoCacheBackend(config.get('CACHE_ALIAS', 'default'))
+    else:
+        backend = MemoryCacheBackend(config.get('MAX_BYTES', DEFAULT_MAX_BYTES))
+    return ResultCache(backend, ttl=config.get('TTL', DEFAULT_TTL),
+                       stale_ttl=config.get('STALE_TTL', DEFAULT_STALE_TTL))
+
+
+_result_cache: ResultCache | None = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Returns the ResultCache of the process, created from settings on first call."""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = create_result_cache(get_setting('SCRAPER_RESULT_CACHE', {}))
+    return _result_cache
+
+
+def set_result_cache(cache: ResultCache) -> None:
+    """Replaces the ResultCache of the process (e.g. to change its settings)."""
+    global _result_cache
+    with _result_cache_lock:
+        _result_cache = cache
@@ -1,9 +1,12 @@
 """
 Script defining classes and Protocol needed to scrape a website with BeautifulSoup.
 """
-from typing import Protocol
-from bs4 import BeautifulSoup
-import pandas as pd
+from typing import Any, AsyncIterator, Iterator, Protocol
+from bs4 import BeautifulSoup, SoupStrainer
+from requests import RequestException
+
+from .fetcher import Fetcher
+from .records import ResultSet
 
 
 class RequestsConnectionError(Exception):
@@ -15,8 +18,15 @@ class RequestsConnectionError(Exception):
         )
 
 
+# Errors of a request to a website (failed, throttled or refused by the circuit breaker of its host),
+# after which a scraping can go on with partial or cached data
+SCRAPING_ERRORS: tuple[type[Exception], ...] = (RequestsConnectionError, RequestException)
+
+
 class Scraper(Protocol):
-    """Protocol class for Scraper classes."""
+    """Protocol class for Scraper classes. Requests go through a (shared) Fetcher."""
+
+    fetcher: Fetcher
 
     @staticmethod
     def get_complete_url(base_url: str, user_input: str) -> str:
@@ -25,9 +35,30 @@ class Scraper(Protocol):
         results of user's research.
         """
 
-    @staticmethod
-    def get_html_soup(url: str) -> BeautifulSoup:
-        """Given the url to a website, requests html code and returns it as a BeautifulSoup object."""
+    def get_html_soup(self, url: str, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+        """
+        Given the url to a website, requests html code with the fetcher and returns it as a
+        BeautifulSoup object (only with the tags matching parse_only if it is given).
+        """
+
+    def iter_items(self) -> Iterator[dict[str, Any]]:
+        """Yields the data of each item of the search as soon as it is scraped."""
+
+    def scrape(self, user_input: str) -> ResultSet:
+        """Method used to scrape all data needed on wanted website, and returns the result as a ResultSet."""
+
+
+class AsyncScraper(Protocol):
+    """
+    Protocol class for asynchronous Scraper classes, run in an event loop: requests go through a
+    (shared) AsyncFetcher, and wait for the network without blocking a thread.
+    """
+
+    async def aget_html_soup(self, url: str, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+        """Asynchronous version of Scraper.get_html_soup."""
+
+    def aiter_items(self) -> AsyncIterator[dict[str, Any]]:
+        """Yields the data of each item of the search as soon as it is scraped."""
 
-    def scrape(self, user_input: str) -> pd.DataFrame:
-        """Method used to scrape all data needed on wanted website, and returns the result as a pandas DataFrame."""
+    async def ascrape(self) -> ResultSet:
+        """Scrapes all data needed on wanted website, and returns the result as a ResultSet."""
@@ -0,0 +1,210 @@
+"""
+Protection of scraped websites and of our latency: requests to each host are spread by a token bucket
+whose rate adapts to throttling responses (429/503 and their Retry-After header), and a circuit
+breaker stops requesting a host which keeps failing, so that requests fail fast instead of waiting
+for timeouts.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from requests import RequestException
+
+# Initial number of requests per second to each host, and bounds of its adapted value
+DEFAULT_RATE: float = 10.0
+
+DEFAULT_MIN_RATE: float = 0.5
+
+DEFAULT_MAX_RATE: float = 50.0
+
+# The rate is divided by RATE_DECREASE_FACTOR on each throttling response, and increased by
+# RATE_INCREASE_STEP requests per second on each successful one (additive increase, multiplicative
+# decrease)
+RATE_DECREASE_FACTOR: float = 2.0
+
+RATE_INCREASE_STEP: float = 0.2
+
+# Number of failures in a row after which a host is not requested anymore, during DEFAULT_RESET_TIMEOUT
+# seconds
+DEFAULT_FAILURE_THRESHOLD: int = 5
+
+DEFAULT_RESET_TIMEOUT: float = 30.0
+
+
+class HostUnavailableError(RequestException):
+    """Raised when a request is not sent because its host is considered unhealthy or too slow to accept it."""
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parses a Retry-After header.
+    :param value: number of seconds, or HTTP date
+    :return: number of seconds to wait, or None if value is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """
+    Gives at most rate tokens per second (with bursts of capacity tokens). The rate decreases when
+    the host throttles us, and slowly increases again while its responses are successful.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: float | None = None,
+                 min_rate: float = DEFAULT_MIN_RATE, max_rate: float = DEFAULT_MAX_RATE) -> None:
+        """
+        Constructor of TokenBucket class.
+        :param rate: initial number of tokens per second
+        :param capacity: maximum number of tokens saved (the initial rate by default)
+        :param min_rate: rate under which throttling responses do not decrease the rate anymore
+        :param max_rate: rate over which successful responses do not increase the rate anymore
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Adds the tokens given since last update, the lock must be held by the caller."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token if one is available, without waiting.
+        :return: 0 if a token was taken, otherwise the number of seconds before one is available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """
+        Takes a token, waiting until one is available.
+        :param timeout: maximum number of seconds to wait, None to wait as long as needed
+        :return: True if a token was taken, False if it could not be taken before timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def penalize(self, retry_after: float | None = None) -> None:
+        """
+        Slows down after a throttling response.
+        :param retry_after: number of seconds during which the host asked not to be requested
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / RATE_DECREASE_FACTOR)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def reward(self) -> None:
+        """Speeds up slowly after a successful response."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE_STEP)
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a host after failure_threshold failures in a row (the circuit is open). After
+    reset_timeout seconds, a single request is let through (the circuit is half-open): if it
+    succeeds the circuit is closed again, otherwise it stays open for reset_timeout more seconds.
+    """
+    CLOSED: str = 'closed'
+    OPEN: str = 'open'
+    HALF_OPEN: str = 'half_open'
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True if a request can be sent to the host."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class HostThrottler:
+    """Token bucket and circuit breaker of each host, created on first request to the host."""
+
+    def __init__(self, rate: float | None = DEFAULT_RATE, min_rate: float = DEFAULT_MIN_RATE,
+                 max_rate: float = DEFAULT_MAX_RATE, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT) -> None:
+        """
+        Constructor of HostThrottler class.
+        :param rate: initial number of requests per second to each host, None for no rate limit
+        :param min_rate: minimum rate to which throttling responses decrease the rate
+        :param max_rate: maximum rate to which successful responses increase the rate
+        :param failure_threshold: number of failures in a row opening the circuit of a host
+        :param reset_timeout: number of seconds before a request is tried again on an open circuit
+        """
+        self.rate = rate
+        self._lock = threading.Lock()
+        self.buckets: dict[str, TokenBucket] = defaultdict(
+            lambda: TokenBucket(rate, min_rate=min_rate, max_rate=max_rate)
+        )
+        self.breakers: dict[str, CircuitBreaker] = defaultdict(
+            lambda: CircuitBreaker(failure_threshold, reset_timeout)
+        )
+
+    def get_bucket(self, host: str) -> TokenBucket | None:
+        if self.rate is None:
+            return None
+        with self._lock:
+            return self.buckets[host]
+
+    def get_breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            return self.breakers[host]
@@ -1,3 +1,1144 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import os
+import random
+import signal
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from email.utils import format_datetime
+from pathlib import Path
+from urllib.parse import urlsplit
 
-# Create your tests here.
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from .benchmarks.corpus import generate_corpus, search_page_path
+from .benchmarks.replay_server import ReplayServer
+from .listings import make_listings
+from .models import ScrapedListing, UserInput
+from .warming import QueryRecorder, get_cache_warmer
+from .src.scripts import compute_item_data, metrics
+from .src.scripts.async_fetcher import AsyncFetcher
+from .src.scripts.async_scraping import AsyncEBayScraper
+from .src.scripts.concurrency import amap_ordered, imap_ordered
+from .src.scripts.ebay_scraping import EBayScraper, parse_item_page
+from .src.scripts.fetcher import Fetcher, MarkerScanner, read_until_markers
+from .src.scripts.item_cache import ItemPageCache, canonical_item_url
+from .src.scripts.items_arrays import NbItemsArray, parse_nb_items
+from .src.scripts.items_classes import NbItems
+from .src.scripts.merging import get_cheapness
+from .src.scripts.metrics import STAGE_SECONDS, MetricsRegistry
+from .src.scripts.parser_pool import ParserPool
+from .src.scripts.planning import MISSING_ITEM_PAGE_DATA, EnrichmentPlanner
+from .src.scripts.ranking import ItemRanker, TopK
+from .src.scripts.records import ResultSet
+from .src.scripts.result_cache import MemoryCacheBackend, ResultCache, get_result_cache, set_result_cache
+from .src.scripts.throttling import CircuitBreaker, HostUnavailableError, TokenBucket, parse_retry_after
+
+
+class ConcurrencyProbe:
+    """Counts the calls running at the same time on each host, and keeps the maximum."""
+
+    def __init__(self) -> None:
+        self.running: dict[str, int] = defaultdict(int)
+        self.max_running: dict[str, int] = defaultdict(int)
+        self.max_total = 0
+        self._lock = threading.Lock()
+
+    def enter(self, host: str) -> None:
+        with self._lock:
+            self.running[host] += 1
+            self.max_running[host] = max(self.max_running[host], self.running[host])
+            self.max_total = max(self.max_total, sum(self.running.values()))
+
+    def exit(self, host: str) -> None:
+        with self._lock:
+            self.running[host] -= 1
+
+
+class ProbedFetcher(Fetcher):
+    """Fetcher counting its concurrent requests with a ConcurrencyProbe."""
+
+    def __init__(self, probe: ConcurrencyProbe, **kwargs) -> None:
+        super().__init__(rate_per_host=None, **kwargs)
+        self.probe = probe
+
+    def get(self, url: str, *args, **kwargs) -> requests.Response:
+        host = urlsplit(url).netloc
+        self.probe.enter(host)
+        try:
+            return super().get(url, *args, **kwargs)
+        finally:
+            self.probe.exit(host)
+
+
+class ReplayServerTestCase(SimpleTestCase):
+    """Serves a small generated corpus (NB_PAGES search pages of ITEMS_PER_PAGE eBay items) during the tests."""
+    NB_PAGES = 1
+    ITEMS_PER_PAGE = 12
+    LATENCY = 0.02
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.corpus_dir = tempfile.TemporaryDirectory()
+        generate_corpus(cls.corpus_dir.name, nb_pages=cls.NB_PAGES, items_per_page=cls.ITEMS_PER_PAGE, query='iphone',
+                        search_filler_bytes=2000, item_filler_bytes=2000)
+        cls.server = ReplayServer(cls.corpus_dir.name, latency=cls.LATENCY).__enter__()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.__exit__()
+        cls.corpus_dir.cleanup()
+        super().tearDownClass()
+
+    def get_item_urls(self) -> list[str]:
+        """Urls of the item pages, on two hosts (127.0.0.1 and localhost) of the server."""
+        port = self.server.server_port
+        return [f"http://{'127.0.0.1' if i % 2 else 'localhost'}:{port}/itm/{i}"
+                for i in range(self.ITEMS_PER_PAGE)]
+
+
+class ImapOrderedTests(ReplayServerTestCase):
+
+    def fetch_all(self, urls: list[str], max_workers: int, max_per_host: int,
+                  probe: ConcurrencyProbe | None = None) -> tuple[list[str], ConcurrencyProbe]:
+        probe = probe if probe is not None else ConcurrencyProbe()
+        session = requests.Session()
+
+        def fetch(url: str) -> str:
+            host = urlsplit(url).netloc
+            probe.enter(host)
+            try:
+                response = session.get(url)
+                # The latency of the first pages is longer, so that calls do not complete in order
+                if url.endswith(('/0', '/1', '/2')):
+                    time.sleep(0.05)
+                return response.url
+            finally:
+                probe.exit(host)
+
+        results = list(imap_ordered(fetch, urls, host_of=lambda url: urlsplit(url).netloc,
+                                    max_workers=max_workers, max_per_host=max_per_host))
+        return results, probe
+
+    def test_results_keep_the_order_of_items(self) -> None:
+        urls = self.get_item_urls()
+        results, _ = self.fetch_all(urls, max_workers=8, max_per_host=4)
+        self.assertEqual(results, urls)
+
+    def test_calls_per_host_are_limited(self) -> None:
+        results, probe = self.fetch_all(self.get_item_urls(), max_workers=8, max_per_host=2)
+        self.assertEqual(len(results), self.ITEMS_PER_PAGE)
+        self.assertEqual(set(probe.max_running), {f'127.0.0.1:{self.server.server_port}',
+                                                  f'localhost:{self.server.server_port}'})
+        self.assertTrue(all(count <= 2 for count in probe.max_running.values()), probe.max_running)
+        self.assertGreater(probe.max_total, 2)
+
+    def test_calls_per_host_are_limited_across_concurrent_calls(self) -> None:
+        urls = self.get_item_urls()
+        probe = ConcurrencyProbe()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            searches = [executor.submit(self.fetch_all, urls, max_workers=8, max_per_host=2, probe=probe)
+                        for _ in range(3)]
+            self.assertEqual([search.result()[0] for search in searches], [urls] * 3)
+        self.assertTrue(all(count <= 2 for count in probe.max_running.values()), probe.max_running)
+
+    def test_one_worker_runs_calls_sequentially(self) -> None:
+        urls = self.get_item_urls()
+        results, probe = self.fetch_all(urls, max_workers=1, max_per_host=4)
+        self.assertEqual(results, urls)
+        self.assertEqual(probe.max_total, 1)
+
+    def test_async_calls_keep_the_order_of_items_and_are_limited_per_host(self) -> None:
+        urls = self.get_item_urls()
+        probe = ConcurrencyProbe()
+        session = requests.Session()
+
+        async def fetch(url: str) -> str:
+            host = urlsplit(url).netloc
+            probe.enter(host)
+            try:
+                response = await asyncio.to_thread(session.get, url)
+                if url.endswith(('/0', '/1', '/2')):
+                    await asyncio.sleep(0.05)
+                return response.url
+            finally:
+                probe.exit(host)
+
+        async def fetch_all() -> list[str]:
+            return [result async for result in amap_ordered(fetch, urls, host_of=lambda url: urlsplit(url).netloc,
+                                                            max_workers=8, max_per_host=2)]
+
+        self.assertEqual(asyncio.run(fetch_all()), urls)
+        self.assertTrue(all(count <= 2 for count in probe.max_running.values()), probe.max_running)
+        self.assertGreater(probe.max_total, 2)
+
+
+@override_settings(SCRAPER_ITEM_CACHE={'ENABLED': False}, SCRAPER_PARSER_POOL={'ENABLED': False})
+class EBayScraperTests(ReplayServerTestCase):
+
+    def scrape(self, max_workers: int, max_per_host: int) -> tuple[list[dict], ConcurrencyProbe]:
+        # All titles have an empty user input, so that every item is enriched
+        probe = ConcurrencyProbe()
+        scraper = EBayScraper(url=self.server.ebay_base_url, user_input='', max_workers=max_workers,
+                              max_per_host=max_per_host, fetcher=ProbedFetcher(probe), max_items=100)
+        return list(scraper.iter_items()), probe
+
+    def test_items_are_enriched_in_search_order(self) -> None:
+        items, _ = self.scrape(max_workers=8, max_per_host=4)
+        self.assertEqual(len(items), self.ITEMS_PER_PAGE)
+        self.assertEqual([item['item_url'].split('?')[0].rsplit('/', 1)[1] for item in items],
+                         [str(i) for i in range(self.ITEMS_PER_PAGE)])
+        for item in items:
+            self.assertFalse(math.isnan(item['rating_avg']))
+            self.assertIsNotNone(item['positive_feedback_percentage'])
+            self.assertIsNotNone(item['nb_items_sold'])
+
+    def test_item_pages_per_host_are_limited(self) -> None:
+        _, probe = self.scrape(max_workers=8, max_per_host=3)
+        self.assertLessEqual(probe.max_running[f'127.0.0.1:{self.server.server_port}'], 3)
+        self.assertGreater(probe.max_total, 1)
+
+    def test_one_worker_gives_the_same_items(self) -> None:
+        items, probe = self.scrape(max_workers=1, max_per_host=4)
+        concurrent_items, _ = self.scrape(max_workers=8, max_per_host=4)
+        self.assertEqual(probe.max_total, 1)
+        self.assertEqual([(item['title'], item['rating_avg'], repr(item['nb_items_sold'])) for item in items],
+                         [(item['title'], item['rating_avg'], repr(item['nb_items_sold']))
+                          for item in concurrent_items])
+
+
+
+class SlowSecondPageFetcher(Fetcher):
+    """Fetcher delaying the response of the second search page, and recording when it was received."""
+
+    def __init__(self, delay: float) -> None:
+        super().__init__(rate_per_host=None)
+        self.delay = delay
+        self.second_page_received_at: float | None = None
+
+    def get(self, url: str, *args, **kwargs) -> requests.Response:
+        response = super().get(url, *args, **kwargs)
+        if '_pgn=2' in url:
+            time.sleep(self.delay)
+            self.second_page_received_at = time.monotonic()
+        return response
+
+
+@override_settings(SCRAPER_ITEM_CACHE={'ENABLED': False}, SCRAPER_PARSER_POOL={'ENABLED': False})
+class EBayScraperPagesTests(ReplayServerTestCase):
+    NB_PAGES = 2
+
+    def test_items_of_the_first_page_are_enriched_before_the_next_page_is_received(self) -> None:
+        fetcher = SlowSecondPageFetcher(delay=0.5)
+        scraper = EBayScraper(url=self.server.ebay_base_url, user_input='', max_pages=2, max_items=100,
+                              fetcher=fetcher)
+        items = scraper.iter_items()
+        first_item = next(items)
+        first_item_at = time.monotonic()
+        items = [first_item, *items]
+        self.assertFalse(math.isnan(first_item['rating_avg']))
+        self.assertLess(first_item_at, fetcher.second_page_received_at)
+        self.assertEqual(len(items), 2 * self.ITEMS_PER_PAGE)
+
+
+@override_settings(SCRAPER_ITEM_CACHE={'ENABLED': False}, SCRAPER_PARSER_POOL={'ENABLED': False})
+class AsyncEBayScraperTests(ReplayServerTestCase):
+    NB_PAGES = 2
+
+    def test_same_items_in_the_same_order_as_the_sync_scraper(self) -> None:
+        async_fetcher = AsyncFetcher(fetcher=Fetcher(rate_per_host=None))
+        scraper = AsyncEBayScraper(url=self.server.ebay_base_url, user_input='', max_pages=2, max_items=100,
+                                   async_fetcher=async_fetcher)
+
+        async def scrape() -> list[dict]:
+            try:
+                return [item async for item in scraper.aiter_items()]
+            finally:
+                await async_fetcher.aclose()
+
+        items = asyncio.run(scrape())
+        sync_items = list(EBayScraper(url=self.server.ebay_base_url, user_input='', max_pages=2, max_items=100,
+                                      fetcher=Fetcher(rate_per_host=None)).iter_items())
+        self.assertEqual(len(items), 2 * self.ITEMS_PER_PAGE)
+        self.assertFalse(math.isnan(items[0]['rating_avg']))
+        self.assertEqual([(item['item_url'], item['rating_avg'], repr(item['nb_items_sold'])) for item in items],
+                         [(item['item_url'], item['rating_avg'], repr(item['nb_items_sold']))
+                          for item in sync_items])
+
+
+class RecordingFetcher(Fetcher):
+    """Fetcher recording the url, headers and status of each of its requests."""
+
+    def __init__(self) -> None:
+        super().__init__(rate_per_host=None)
+        self.requests: list[tuple[str, dict, int]] = []
+
+    def get(self, url: str, headers: dict | None = None, *args, **kwargs) -> requests.Response:
+        response = super().get(url, headers, *args, **kwargs)
+        self.requests.append((url, dict(headers or {}), response.status_code))
+        return response
+
+
+@override_settings(SCRAPER_PARSER_POOL={'ENABLED': False})
+class ItemPageCacheTests(ReplayServerTestCase):
+
+    def setUp(self) -> None:
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache = ItemPageCache(path=f'{cache_dir.name}/item_cache.sqlite3', ttl=60)
+        self.fetcher = RecordingFetcher()
+        self.scraper = EBayScraper(url=self.server.ebay_base_url, user_input='', fetcher=self.fetcher,
+                                   item_cache=self.cache)
+        self.url = self.get_item_urls()[1]
+
+    def test_fresh_entry_is_used_without_request(self) -> None:
+        item_data = self.scraper.get_item_page_data(self.url)
+        self.assertEqual([status for _, _, status in self.fetcher.requests], [200])
+        self.assertIsNotNone(self.cache.get(self.url).etag)
+        self.assertEqual(self.scraper.get_item_page_data(self.url), item_data)
+        self.assertEqual(len(self.fetcher.requests), 1)
+
+    def test_expired_entry_is_revalidated_without_parsing(self) -> None:
+        item_data = self.scraper.get_item_page_data(self.url)
+        etag = self.cache.get(self.url).etag
+        self.cache.ttl = -1
+        self.cache.set(self.url, self.cache.get(self.url).data, etag=etag,
+                       last_modified='Sun, 18 Oct 2026 07:00:00 GMT')
+        self.cache.ttl = 60
+        self.assertFalse(self.cache.get(self.url).is_fresh)
+        with mock.patch.object(self.scraper, 'scrape_item_response', side_effect=AssertionError('parsed')):
+            self.assertEqual(self.scraper.get_item_page_data(self.url), item_data)
+        _, headers, status = self.fetcher.requests[-1]
+        self.assertEqual(headers, {'If-None-Match': etag, 'If-Modified-Since': 'Sun, 18 Oct 2026 07:00:00 GMT'})
+        self.assertEqual(status, 304)
+        self.assertTrue(self.cache.get(self.url).is_fresh)
+
+    def test_tracking_parameters_are_stripped_from_the_key(self) -> None:
+        self.assertEqual(canonical_item_url('HTTP://Www.eBay.com/itm/1?var=2&hash=item1&_trkparms=x&mkevt=1#top'),
+                         'http://www.ebay.com/itm/1?var=2')
+        self.scraper.get_item_page_data(self.url)
+        self.scraper.get_item_page_data(f'{self.url}?hash=item1&_trksid=p2&itmmeta=abc')
+        self.assertEqual(len(self.fetcher.requests), 1)
+
+
+class EBayExtractionTests(SimpleTestCase):
+    """Compares the extraction specs of eBay pages to the find_all code they replaced."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.corpus_dir = tempfile.TemporaryDirectory()
+        generate_corpus(cls.corpus_dir.name, nb_pages=1, items_per_page=30, search_filler_bytes=2000,
+                        item_filler_bytes=2000)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.corpus_dir.cleanup()
+        super().tearDownClass()
+
+    @staticmethod
+    def find_item_page_data(soup: BeautifulSoup) -> tuple:
+        ratings = [float(rating.find('span', class_='fdbk-detail-seller-rating__value').text)
+                   for rating in soup.find_all('div', class_='fdbk-detail-seller-rating')]
+        positive_feedback_percentage = nb_items_sold = None
+        for info in soup.find_all('div', class_='d-stores-info-categories__container__info__section__item'):
+            info_str = info.find('span', class_='ux-textspans ux-textspans--BOLD').text
+            if '%' in info_str:
+                positive_feedback_percentage = float(info_str.strip('%'))
+            else:
+                nb_items_sold = NbItems.from_str(info_str)
+        return round(sum(ratings) / len(ratings), 3), positive_feedback_percentage, nb_items_sold
+
+    def test_item_pages(self) -> None:
+        for path in sorted(Path(self.corpus_dir.name, 'ebay').glob('item_*')):
+            with self.subTest(page=path.name):
+                content = path.read_bytes()
+                self.assertEqual(EBayScraper.item_data_from_dict(parse_item_page(content)),
+                                 self.find_item_page_data(BeautifulSoup(content, 'html.parser')))
+
+    def test_last_store_info_values_are_kept(self) -> None:
+        store_info = ''.join(
+            f'<div class="d-stores-info-categories__container__info__section__item">'
+            f'<span class="ux-textspans ux-textspans--BOLD">{value}</span></div>'
+            for value in ('99.5%', '1.2K', '98%', '340')
+        )
+        content = f'<html><body>{store_info}</body></html>'.encode()
+        _, positive_feedback_percentage, nb_items_sold = EBayScraper.item_data_from_dict(parse_item_page(content))
+        self.assertEqual(positive_feedback_percentage, 98.0)
+        self.assertEqual(nb_items_sold, NbItems(340))
+
+    def test_search_page(self) -> None:
+        soup = BeautifulSoup(search_page_path(self.corpus_dir.name, 'ebay', 1).read_bytes(), 'html.parser')
+        li_tags = soup.find_all('li', class_='s-item s-item__pl-on-bottom')[1:]
+        self.assertEqual(len(li_tags), 30)
+        self.assertEqual(EBayScraper.get_item_tags(soup), li_tags)
+        for li_tag in li_tags:
+            self.assertEqual(EBayScraper.extract_search_item_data(li_tag), {
+                'title': li_tag.find('span', role='heading').text,
+                'price_dollars': float(li_tag.find('span', class_='s-item__price').text.split()[-1]
+                                       .replace(',', '').replace('$', '')),
+                'item_url': li_tag.find('a', class_='s-item__link').get('href'),
+            })
+
+
+class EnrichmentPlannerTests(SimpleTestCase):
+
+    @staticmethod
+    def make_candidates(titles: list[str], first_id: int = 0, price: float | None = 10.0) -> list[dict]:
+        return [{'title': title, 'price_dollars': price, 'item_url': f'https://www.ebay.com/itm/{first_id + i}'}
+                for i, title in enumerate(titles)]
+
+    @staticmethod
+    def enrich(items: list[dict]) -> list[dict]:
+        return [{**item, 'rating_avg': 5.0, 'positive_feedback_percentage': 100.0, 'nb_items_sold': NbItems(1)}
+                for item in items]
+
+    def test_matching_items_are_enriched_page_by_page_within_the_budget(self) -> None:
+        planner = EnrichmentPlanner('iphone', budget=3)
+        first_page = self.make_candidates(['iPhone 13', 'Coque', 'iphone 12'])
+        self.assertEqual(planner.plan_page(first_page), [first_page[0], first_page[2]])
+        second_page = self.make_candidates(['iPhone 14', 'iPhone 15'], first_id=3)
+        self.assertEqual(planner.plan_page(second_page), [second_page[0]])
+        self.assertEqual(planner.remaining, 0)
+        self.assertEqual([item['title'] for item in planner.get_skipped()], ['Coque', 'iPhone 15'])
+
+    def test_deferred_items_are_enriched_when_the_ranking_needs_them(self) -> None:
+        planner = EnrichmentPlanner('iphone', budget=4)
+        candidates = self.make_candidates(['iPhone 13', 'Coque', 'Chargeur', 'Câble', 'Étui'])
+        for item in self.enrich(planner.plan_page(candidates)):
+            planner.add_enriched(item)
+        self.assertEqual([item['title'] for item in planner.get_fallback()], ['Coque', 'Chargeur', 'Câble'])
+        self.assertEqual(planner.get_skipped(), [{**candidates[4], **MISSING_ITEM_PAGE_DATA}])
+
+    def test_deferred_items_are_skipped_with_enough_matching_items(self) -> None:
+        planner = EnrichmentPlanner('iphone')
+        candidates = self.make_candidates([f'iPhone {i}' for i in range(11)] + ['Coque'])
+        for item in self.enrich(planner.plan_page(candidates)):
+            planner.add_enriched(item)
+        self.assertEqual(planner.get_fallback(), [])
+        self.assertEqual([item['title'] for item in planner.get_skipped()], ['Coque'])
+
+    def test_duplicates_and_unrankable_items_are_not_enriched(self) -> None:
+        planner = EnrichmentPlanner('iphone', min_price=5, max_price=50)
+        candidates = self.make_candidates(['iPhone 13', 'iPhone 14'])
+        duplicate = {**candidates[0], 'item_url': candidates[0]['item_url'] + '?hash=item1'}
+        too_expensive = {**self.make_candidates(['iPhone 15'], first_id=5)[0], 'price_dollars': 900.0}
+        without_price = self.make_candidates(['iPhone 16'], first_id=6, price=None)[0]
+        without_url = {**self.make_candidates(['iPhone 17'], first_id=7)[0], 'item_url': None}
+        planned = planner.plan_page([*candidates, duplicate, too_expensive, without_price, without_url])
+        self.assertEqual(planned, candidates)
+        self.assertEqual(planner.duplicates, {2})
+        self.assertEqual([item['title'] for item in planner.get_skipped()], ['iPhone 15', 'iPhone 16', 'iPhone 17'])
+
+class ParserPoolTests(SimpleTestCase):
+
+    def test_restart_keeps_the_new_executor(self) -> None:
+        pool = ParserPool(max_workers=1)
+        broken = pool.get_executor()
+        pool.restart(broken)
+        new = pool.get_executor()
+        self.assertIsNot(new, broken)
+        # A thread finding the old executor broken later does not replace the new one
+        pool.restart(broken)
+        self.assertIs(pool.get_executor(), new)
+        pool.shutdown()
+
+    def test_calls_run_in_process_when_a_worker_dies(self) -> None:
+        pool = ParserPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        worker_pid = pool.run(os.getpid)
+        self.assertNotEqual(worker_pid, os.getpid())
+        # The worker is busy, so that the next call waits for it when it is killed
+        pool.submit(time.sleep, 5)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pid = executor.submit(pool.run, os.getpid)
+            time.sleep(0.2)
+            os.kill(worker_pid, signal.SIGKILL)
+            self.assertEqual(pid.result(timeout=10), os.getpid())
+        new_worker_pid = pool.run(os.getpid)
+        self.assertNotIn(new_worker_pid, (worker_pid, os.getpid()))
+
+
+class ResultCacheTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.cache = ResultCache(MemoryCacheBackend(), ttl=60, stale_ttl=600)
+        self.calls = 0
+
+    def make_result(self) -> ResultSet:
+        self.calls += 1
+        return ResultSet.from_items([{'title': f'computation {self.calls}', 'price_dollars': 10.0}])
+
+    def test_query_in_flight_is_computed_once(self) -> None:
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute() -> ResultSet:
+            started.set()
+            release.wait(5)
+            return self.make_result()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            first = executor.submit(self.cache.get_or_compute, 'ebay', 'iPhone', compute)
+            started.wait(5)
+            others = [executor.submit(self.cache.get_or_compute, 'ebay', ' iphone ', compute) for _ in range(3)]
+            time.sleep(0.05)
+            release.set()
+            results = [first.result()] + [future.result() for future in others]
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({result[0].title for result in results}, {'computation 1'})
+        # Each caller gets its own copy of the cached result
+        self.assertEqual(len({id(result) for result in results}), 4)
+        results[0].attrs['stale'] = True
+        self.assertNotIn('stale', self.cache.get('ebay', 'iphone').attrs)
+
+    def test_cached_result_is_not_computed_again(self) -> None:
+        self.cache.get_or_compute('ebay', 'iphone', self.make_result)
+        self.cache.get_or_compute('ebay', 'IPHONE', self.make_result)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_stale_result_is_served_when_scraping_fails(self) -> None:
+        self.cache.set('ebay', 'iphone', self.make_result())
+        self.cache.ttl = 0
+
+        def fail() -> ResultSet:
+            raise requests.ConnectionError('unreachable')
+
+        result = self.cache.get_or_compute('ebay', 'iphone', fail)
+        self.assertEqual(result[0].title, 'computation 1')
+        self.assertTrue(result.attrs['stale'])
+        with self.assertRaises(requests.ConnectionError):
+            self.cache.get_or_compute('ebay', 'ipad', fail)
+
+    def test_refresh_waits_for_the_query_in_flight(self) -> None:
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute() -> ResultSet:
+            started.set()
+            release.wait(5)
+            return self.make_result()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(self.cache.get_or_compute, 'ebay', 'iphone', compute)
+            started.wait(5)
+            refreshed = executor.submit(self.cache.compute_once, 'ebay', 'iphone', self.make_result,
+                                        serve_stale=False)
+            time.sleep(0.05)
+            release.set()
+            self.assertEqual(refreshed.result()[0].title, first.result()[0].title)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.compute_once('ebay', 'iphone', self.make_result)[0].title, 'computation 2')
+
+    def test_refresh_does_not_serve_stale_results(self) -> None:
+        self.cache.set('ebay', 'iphone', self.make_result())
+
+        def fail() -> ResultSet:
+            raise requests.ConnectionError('unreachable')
+
+        with self.assertRaises(requests.ConnectionError):
+            self.cache.compute_once('ebay', 'iphone', fail, serve_stale=False)
+        self.assertEqual(self.cache.compute_once('ebay', 'iphone', fail)[0].title, 'computation 1')
+
+    def test_cancelled_computation_is_computed_again_by_a_waiter(self) -> None:
+        async def compute() -> ResultSet:
+            await asyncio.sleep(0.1)
+            return self.make_result()
+
+        async def run() -> tuple[asyncio.Task, ResultSet]:
+            first = asyncio.create_task(self.cache.aget_or_compute('ebay', 'iphone', compute))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(self.cache.aget_or_compute('ebay', 'iphone', compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return first, await waiter
+
+        first, result = asyncio.run(run())
+        self.assertTrue(first.cancelled())
+        self.assertEqual(result[0].title, 'computation 1')
+        self.assertEqual(self.cache.get('ebay', 'iphone')[0].title, 'computation 1')
+
+    def test_async_query_is_shared_with_get_or_compute(self) -> None:
+        started = threading.Event()
+        release = threading.Event()
+
+        async def compute() -> ResultSet:
+            started.set()
+            await asyncio.to_thread(release.wait, 5)
+            return self.make_result()
+
+        async def run(executor: ThreadPoolExecutor) -> tuple[ResultSet, ResultSet]:
+            first = asyncio.create_task(self.cache.aget_or_compute('ebay', 'iphone', compute))
+            await asyncio.to_thread(started.wait, 5)
+            waiter = executor.submit(self.cache.get_or_compute, 'ebay', ' iPhone', self.make_result)
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiter.done())
+            release.set()
+            return await first, await asyncio.wrap_future(waiter)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            results = asyncio.run(run(executor))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([result[0].title for result in results], ['computation 1', 'computation 1'])
+
+    def test_blocking_backend_is_not_called_in_the_event_loop(self) -> None:
+        threads = set()
+
+        class BlockingBackend(MemoryCacheBackend):
+            is_blocking = True
+
+            def get(self, key: str):
+                threads.add(threading.get_ident())
+                return super().get(key)
+
+            def set(self, key: str, value, ttl: float) -> None:
+                threads.add(threading.get_ident())
+                super().set(key, value, ttl)
+
+        async def compute() -> ResultSet:
+            return self.make_result()
+
+        async def run() -> int:
+            await cache.aget_or_compute('ebay', 'iphone', compute)
+            return threading.get_ident()
+
+        cache = ResultCache(BlockingBackend(), ttl=60, stale_ttl=600)
+        loop_thread = asyncio.run(run())
+        self.assertTrue(threads)
+        self.assertNotIn(loop_thread, threads)
+        self.assertEqual(cache.get('ebay', 'iphone')[0].title, 'computation 1')
+
+    def test_streamed_query_is_shared_with_get_or_compute(self) -> None:
+        def scrape():
+            yield 'item 1'
+            yield 'item 2'
+            return self.make_result()
+
+        stream = self.cache.stream_once('ebay', 'iphone', scrape)
+        self.assertEqual(next(stream), 'item 1')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            waiter = executor.submit(self.cache.get_or_compute, 'ebay', 'iphone', self.make_result)
+            time.sleep(0.05)
+            self.assertFalse(waiter.done())
+            self.assertEqual(list(stream), ['item 2'])
+            self.assertEqual(waiter.result(timeout=5)[0].title, 'computation 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_closed_stream_is_computed_again_by_a_waiter(self) -> None:
+        def scrape():
+            yield 'item 1'
+            return self.make_result()
+
+        stream = self.cache.stream_once('ebay', 'iphone', scrape)
+        next(stream)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            waiter = executor.submit(self.cache.get_or_compute, 'ebay', 'iphone', self.make_result)
+            time.sleep(0.05)
+            stream.close()
+            self.assertEqual(waiter.result(timeout=5)[0].title, 'computation 1')
+
+
+class StreamResultsViewTests(SimpleTestCase):
+
+    class ListScraper:
+        def __init__(self, user_input: str) -> None:
+            self.user_input = user_input
+
+        def iter_items(self):
+            for i in range(3):
+                yield {'title': f'iPhone {i}', 'price_dollars': 10.0 + i, 'item_url': f'https://ebay.com/itm/{i}'}
+
+    def setUp(self) -> None:
+        from .src import main
+        from .src.scripts.ranking import FirstItems
+
+        self.previous_cache = get_result_cache()
+        set_result_cache(ResultCache(MemoryCacheBackend()))
+        patcher = mock.patch.dict(main.STREAMING_FUNCTIONS, {'ebay': (self.ListScraper, FirstItems)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        set_result_cache(self.previous_cache)
+
+    def get_events(self) -> list[tuple[str, str]]:
+        response = self.client.get('/stream/', {'option': 'ebay', 'text_input': 'iphone'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = b''.join(response.streaming_content).decode()
+        return [tuple(line.split(': ', 1)[1] for line in message.splitlines())
+                for message in content.split('\n\n') if message]
+
+    @override_settings(SCRAPER_LISTING_STORE={'ENABLED': False})
+    def test_items_are_streamed_before_the_result(self) -> None:
+        events = self.get_events()
+        self.assertEqual([event for event, _ in events], ['item', 'item', 'item', 'result'])
+        self.assertEqual(json.loads(events[0][1])['title'], 'iPhone 0')
+        self.assertEqual([record['title'] for record in json.loads(events[-1][1])],
+                         ['iPhone 0', 'iPhone 1', 'iPhone 2'])
+        # The result is cached, and streamed again without items
+        self.assertEqual([event for event, _ in self.get_events()], ['result'])
+
+
+class ProcessInputTests(SimpleTestCase):
+
+    def test_invalid_form_is_rendered_with_its_errors(self) -> None:
+        response = self.client.post('/', {'option': 'unknown', 'text_input': 'iphone'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'blog/index.html')
+        self.assertTrue(response.context['form'].errors['option'])
+        self.assertContains(response, 'iphone')
+
+    def test_async_view_renders_the_results(self) -> None:
+        from .src import main
+
+        output = ResultSet.from_items([{'title': 'iPhone 15', 'price_dollars': 10.0, 'item_url': 'https://ebay.com/1'}])
+        with mock.patch('blog.views.record_query'), \
+                mock.patch.object(main, 'amain', mock.AsyncMock(return_value=output)) as amain:
+            response = self.client.post('/async/', {'option': 'ebay', 'text_input': 'iphone'})
+        amain.assert_awaited_once_with('iphone', 'ebay')
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'blog/index.html')
+        self.assertContains(response, 'iPhone 15')
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    def test_prometheus_text_format(self) -> None:
+        registry = MetricsRegistry()
+        registry.describe('scraping_responses_total', "Responses received.")
+        registry.increment('scraping_responses_total', host='www.ebay.com', status='200')
+        registry.increment('scraping_responses_total', 2, host='a"b\\c\nd', status='503')
+        registry.observe(STAGE_SECONDS, 0.02, stage='fetch', website='ebay')
+        registry.observe(STAGE_SECONDS, 3.0, stage='fetch', website='ebay')
+        with mock.patch.object(metrics, 'registry', registry):
+            response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        content = response.content.decode()
+        self.assertTrue(content.endswith('\n'))
+        lines = content.splitlines()
+        for line in ('# HELP scraping_responses_total Responses received.',
+                     '# TYPE scraping_responses_total counter',
+                     'scraping_responses_total{host="www.ebay.com",status="200"} 1',
+                     'scraping_responses_total{host="a\\"b\\\\c\\nd",status="503"} 2',
+                     f'# HELP {STAGE_SECONDS} {STAGE_SECONDS}',
+                     f'# TYPE {STAGE_SECONDS} histogram',
+                     f'{STAGE_SECONDS}_bucket{{stage="fetch",website="ebay",le="0.01"}} 0',
+                     f'{STAGE_SECONDS}_bucket{{stage="fetch",website="ebay",le="0.025"}} 1',
+                     f'{STAGE_SECONDS}_bucket{{stage="fetch",website="ebay",le="2.5"}} 1',
+                     f'{STAGE_SECONDS}_bucket{{stage="fetch",website="ebay",le="5"}} 2',
+                     f'{STAGE_SECONDS}_bucket{{stage="fetch",website="ebay",le="+Inf"}} 2',
+                     f'{STAGE_SECONDS}_sum{{stage="fetch",website="ebay"}} 3.020000',
+                     f'{STAGE_SECONDS}_count{{stage="fetch",website="ebay"}} 2'):
+            self.assertIn(line, lines)
+        buckets = [line for line in lines if line.startswith(f'{STAGE_SECONDS}_bucket')]
+        self.assertEqual(len(buckets), len(metrics.DEFAULT_BUCKETS) + 1)
+
+
+class ItemRankerTests(SimpleTestCase):
+
+    @staticmethod
+    def make_items(nb_items: int, seed: int) -> list[dict]:
+        """Random eBay items, with few distinct values so that keys are often tied, and missing data."""
+        rng = random.Random(seed)
+        return [{
+            'title': f"{rng.choice(['iPhone 13', 'iphone 13 pro', 'Coque iPhone', 'Samsung'])} #{i}",
+            'price_dollars': rng.choice([9.99, 19.5, 120.0, 340.0]),
+            'rating_avg': rng.choice([4.0, 4.5, 5.0, math.nan]),
+            'positive_feedback_percentage': rng.choice([98.5, 99.0, 100.0, None]),
+            'nb_items_sold': rng.choice([NbItems.from_str(text) for text in ('12', '1.2K', '3K', '1M')]),
+            'item_url': f'https://www.ebay.com/itm/{i}',
+        } for i in range(nb_items)]
+
+    def rank(self, items: list[dict], user_input: str, k: int) -> list[str]:
+        ranker = ItemRanker(user_input, k=k)
+        for item in items:
+            ranker.add(item)
+        return [record.title for record in ranker.result()]
+
+    def test_same_ranking_as_compute_item_data(self) -> None:
+        for seed in range(5):
+            items = self.make_items(200, seed)
+            df = pd.DataFrame(items)
+            for user_input, k in (('iphone 13', 10), ('samsung', 25), ('unknown', 10)):
+                with self.subTest(seed=seed, user_input=user_input, k=k):
+                    ranking = self.rank(items, user_input, k)
+                    self.assertEqual(ranking, compute_item_data.main(df, user_input).head(k).title.tolist())
+                    self.assertEqual(ranking, compute_item_data.main(df, user_input, k=k).title.tolist())
+
+    def test_few_matching_items_rank_all_items(self) -> None:
+        items = self.make_items(40, seed=0)
+        for item in items:
+            item['title'] = item['title'].replace('Samsung', 'Pixel')
+        items[0]['title'] = 'Samsung Galaxy'
+        self.assertEqual(self.rank(items, 'samsung', 10), self.rank(items, '', 10))
+
+    def test_top_k_keeps_insertion_order_of_ties(self) -> None:
+        top_k = TopK(3)
+        for i in range(6):
+            top_k.add({'title': str(i), 'nb_items_int': i % 2, 'positive_feedback_percentage': 100.0,
+                       'rating_avg': 5.0, 'price_dollars': 10.0})
+        self.assertEqual([item['title'] for item in top_k.result()], ['1', '3', '5'])
+
+
+class MakeListingsTests(SimpleTestCase):
+
+    def test_long_queries_are_truncated(self) -> None:
+        max_length = ScrapedListing._meta.get_field('query').max_length
+        items = [{'item_url': 'https://www.ebay.com/itm/1', 'title': 'iPhone'}]
+        listings = make_listings('eBay', ' IPHONE ' * 100, items, scraped_at=datetime.now(timezone.utc))
+        self.assertEqual(len(listings[0].query), max_length)
+        self.assertTrue(listings[0].query.startswith('iphone iphone'))
+        listings[0].clean_fields(exclude=['price_dollars', 'rating_avg', 'positive_feedback_percentage',
+                                          'nb_items_sold'])
+
+
+class GetCheapnessTests(SimpleTestCase):
+
+    def test_cheapest_item_gets_one_with_missing_prices(self) -> None:
+        cheapness = get_cheapness([30.0, math.nan, 10.0, 20.0, math.nan])
+        self.assertEqual(cheapness[2], 1)
+        self.assertAlmostEqual(cheapness[3], 2 / 3)
+        self.assertAlmostEqual(cheapness[0], 1 / 3)
+        self.assertTrue(math.isnan(cheapness[1]))
+
+
+class NbItemsArrayTests(SimpleTestCase):
+
+    def test_parse_nb_items(self) -> None:
+        values = pd.Series(['2.6K', '1M', '340', 'Bonjour', '2.6', None, math.nan], index=list('abcdefg'))
+        parsed = parse_nb_items(values)
+        self.assertEqual(list(parsed.index), list('abcdefg'))
+        self.assertEqual(parsed.dtype, 'Int64')
+        self.assertEqual(parsed.iloc[:3].tolist(), [2600, 1_000_000, 340])
+        self.assertTrue(parsed.iloc[3:].isna().all())
+
+    def test_round_trips(self) -> None:
+        strings = ['2.6K', '340', None, '1M', '340']
+        array = NbItemsArray._from_sequence_of_strings(strings)
+        self.assertEqual([None if pd.isna(item) else item for item in array],
+                         [NbItems.from_str('2.6K'), NbItems(340), None, NbItems.from_str('1M'), NbItems(340)])
+        self.assertEqual([repr(item) for item in NbItemsArray._from_sequence(list(array))],
+                         ['2.6K', '340', 'nan', '1.0M', '340'])
+        series = pd.Series(array)
+        self.assertEqual(series.dtype, 'nb_items')
+        self.assertEqual(series.take([3, 2, 0]).astype(object).tolist()[0], NbItems.from_str('1M'))
+        self.assertEqual(len(pd.concat([series, series])), 10)
+        self.assertEqual(series.sort_values().index.tolist(), [1, 4, 0, 3, 2])
+
+    def test_comparisons_and_value_counts(self) -> None:
+        series = pd.Series(NbItemsArray._from_sequence(['2.6K', '340', None, '1M', '340']))
+        self.assertEqual((series < NbItems(1000)).tolist(), [False, True, False, False, True])
+        self.assertEqual((series >= NbItems.from_str('2.6K')).tolist(), [True, False, False, True, False])
+        self.assertEqual((series == NbItems(340)).tolist(), [False, True, False, False, True])
+        self.assertEqual((series != NbItems(340)).tolist(), [True, False, True, True, False])
+        counts = series.value_counts()
+        self.assertEqual(counts[NbItems(340)], 2)
+        self.assertEqual(counts.sum(), 4)
+        self.assertEqual(series.value_counts(dropna=False).sum(), 5)
+
+
+class ParseRetryAfterTests(SimpleTestCase):
+
+    def test_seconds(self) -> None:
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertEqual(parse_retry_after('-5'), 0.0)
+
+    def test_http_date(self) -> None:
+        date = datetime.now(timezone.utc) + timedelta(seconds=60)
+        self.assertAlmostEqual(parse_retry_after(format_datetime(date, usegmt=True)), 60, delta=2)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+    def test_missing_or_invalid(self) -> None:
+        for value in (None, '', 'soon'):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_retry_after(value))
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_burst_then_wait(self) -> None:
+        bucket = TokenBucket(rate=10, capacity=3)
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        wait = bucket.try_acquire()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.1)
+        self.assertTrue(bucket.acquire(timeout=1))
+
+    def test_penalize_and_reward_adapt_the_rate(self) -> None:
+        bucket = TokenBucket(rate=8, min_rate=1, max_rate=9)
+        bucket.penalize()
+        self.assertEqual(bucket.rate, 4)
+        for _ in range(5):
+            bucket.penalize()
+        self.assertEqual(bucket.rate, 1)
+        for _ in range(100):
+            bucket.reward()
+        self.assertEqual(bucket.rate, 9)
+
+    def test_retry_after_blocks_the_bucket(self) -> None:
+        bucket = TokenBucket(rate=100)
+        bucket.penalize(retry_after=5)
+        self.assertGreater(bucket.try_acquire(), 4)
+        self.assertFalse(bucket.acquire(timeout=0.01))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_failures_in_a_row(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            breaker.record_failure()
+        breaker.record_success()
+        for _ in range(2):
+            breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_lets_a_single_request_through(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+
+class MarkerScannerTests(SimpleTestCase):
+
+    @staticmethod
+    def split(body: bytes, size: int) -> list[bytes]:
+        return [body[i:i + size] for i in range(0, len(body), size)]
+
+    def test_reading_stops_tail_bytes_after_the_last_marker(self) -> None:
+        body = b'a' * 50 + b'<seller>' + b'b' * 50 + b'<rating>' + b'c' * 500
+        content, truncated = read_until_markers(self.split(body, 10), (b'<seller>', b'<rating>'), tail_bytes=20)
+        self.assertTrue(truncated)
+        end_of_markers = body.index(b'<rating>') + len(b'<rating>')
+        self.assertGreaterEqual(len(content), end_of_markers + 20)
+        self.assertLess(len(content), end_of_markers + 20 + 10)
+        self.assertTrue(body.startswith(content))
+
+    def test_markers_split_between_chunks_are_found(self) -> None:
+        body = b'x' * 7 + b'<seller>' + b'y' * 200
+        for size in range(1, 10):
+            with self.subTest(chunk_size=size):
+                scanner = MarkerScanner((b'<seller>',), tail_bytes=0)
+                stopped_at = next((position for position, chunk in enumerate(self.split(body, size))
+                                   if scanner.feed(chunk)), None)
+                self.assertEqual(scanner.stop_at, 15)
+                self.assertEqual(stopped_at, (15 + size - 1) // size - 1)
+
+    def test_body_without_all_markers_is_read_entirely(self) -> None:
+        body = b'<seller>' + b'z' * 300
+        content, truncated = read_until_markers(self.split(body, 64), (b'<seller>', b'<rating>'), tail_bytes=0)
+        self.assertFalse(truncated)
+        self.assertEqual(content, body)
+
+
+class CacheWarmerSettingsTests(SimpleTestCase):
+
+    def test_disabled_by_default(self) -> None:
+        with override_settings(SCRAPER_CACHE_WARMER={}):
+            self.assertIsNone(get_cache_warmer())
+
+    def test_not_started_with_the_memory_backend(self) -> None:
+        with override_settings(SCRAPER_CACHE_WARMER={'ENABLED': True}):
+            self.assertIsNone(get_cache_warmer())
+
+
+class QueryRecorderTests(TransactionTestCase):
+
+    def test_queries_are_written_in_background(self) -> None:
+        recorder = QueryRecorder()
+        recorder.record('eBay', 'iphone')
+        recorder.record('all', 'ipad')
+        recorder.flush()
+        self.assertEqual(sorted(UserInput.objects.values_list('website', 'text_input')),
+                         [('all', 'ipad'), ('ebay', 'iphone')])
+
+    def test_queries_are_dropped_when_the_recorder_is_full(self) -> None:
+        recorder = QueryRecorder(max_pending=1)
+        recorder._thread = threading.Thread()  # not started, so that queries stay pending
+        recorder.record('ebay', 'iphone')
+        with self.assertLogs('blog.warming', 'WARNING'):
+            recorder.record('ebay', 'ipad')
+        self.assertEqual(recorder.queue.qsize(), 1)
+
+
+class ResultsViewTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        from .src import main
+
+        self.main = main
+        self.previous_cache = get_result_cache()
+        set_result_cache(ResultCache(MemoryCacheBackend()))
+        for website in main.SCRAPING_FUNCTIONS:
+            get_result_cache().set(website, 'iphone', ResultSet.from_items(
+                [{'title': f'{website} iPhone', 'price_dollars': 10.0, 'item_url': f'https://{website}.com/1'}]
+            ))
+
+    def tearDown(self) -> None:
+        set_result_cache(self.previous_cache)
+
+    def test_conditional_request_is_answered_without_computing(self) -> None:
+        for website in ('ebay', 'all'):
+            with self.subTest(website=website):
+                response = self.client.get('/results/', {'option': website, 'text_input': 'iPhone'})
+                self.assertEqual(response.status_code, 200)
+                with mock.patch.object(self.main, 'main', side_effect=AssertionError('computed')):
+                    for method in (self.client.get, self.client.head):
+                        not_modified = method('/results/', {'option': website, 'text_input': 'iphone'},
+                                              HTTP_IF_NONE_MATCH=response['ETag'])
+                        self.assertEqual(not_modified.status_code, 304)
+                        self.assertEqual(not_modified['ETag'], response['ETag'])
+                        self.assertIn('max-age', not_modified['Cache-Control'])
+
+    def test_changed_results_are_sent_again(self) -> None:
+        response = self.client.get('/results/', {'option': 'ebay', 'text_input': 'iphone'})
+        get_result_cache().set('ebay', 'iphone', ResultSet.from_items([{'title': 'iPhone 15', 'price_dollars': 5.0}]))
+        response = self.client.get('/results/', {'option': 'ebay', 'text_input': 'iphone'},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'iPhone 15')
+
+    def test_results_have_a_strong_etag(self) -> None:
+        response = self.client.get('/results/', {'option': 'ebay', 'text_input': 'iphone'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age', response['Cache-Control'])
+        head = self.client.head('/results/', {'option': 'ebay', 'text_input': 'iphone'})
+        self.assertEqual(head.status_code, 200)
+        self.assertEqual(head['ETag'], response['ETag'])
+
+    def test_invalid_or_empty_queries_are_rejected(self) -> None:
+        with mock.patch.object(self.main, 'main', side_effect=AssertionError('computed')):
+            for params in ({'option': 'ebay'}, {'option': 'ebay', 'text_input': '  '},
+                           {'option': 'unknown', 'text_input': 'iphone'}):
+                with self.subTest(params=params):
+                    self.assertEqual(self.client.get('/results/', params).status_code, 400)
+
+    def test_stale_results_are_not_cached(self) -> None:
+        stale_cache = ResultCache(MemoryCacheBackend(), ttl=0, stale_ttl=600)
+        stale_cache.set('ebay', 'iphone', ResultSet.from_items([{'title': 'iPhone', 'price_dollars': 10.0}]))
+        set_result_cache(stale_cache)
+
+        def fail(user_input: str) -> ResultSet:
+            raise requests.ConnectionError('unreachable')
+
+        with mock.patch.dict(self.main.SCRAPING_FUNCTIONS, {'ebay': fail}):
+            response = self.client.get('/results/', {'option': 'ebay', 'text_input': 'iphone'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'iPhone')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_scraping_errors_are_not_cached(self) -> None:
+        for error, status_code in ((requests.ConnectionError('unreachable'), 502),
+                                   (HostUnavailableError('circuit open'), 503)):
+            with self.subTest(status_code=status_code), mock.patch.object(self.main, 'main', side_effect=error):
+                response = self.client.get('/results/', {'option': 'ebay', 'text_input': 'ipad'})
+                self.assertEqual(response.status_code, status_code)
+                self.assertIn('no-cache', response['Cache-Control'])
+
+
+class BulkQueriesTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        from .src import main
+
+        self.scraped = []
+        self.previous_cache = get_result_cache()
+        set_result_cache(ResultCache(MemoryCacheBackend()))
+        scraping_functions = {'ebay': self.scrape, 'amazon': self.scrape_unreachable}
+        for patcher in (mock.patch.dict(main.SCRAPING_FUNCTIONS, scraping_functions),
+                        mock.patch('blog.api.record_query')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        set_result_cache(self.previous_cache)
+
+    def scrape(self, user_input: str) -> ResultSet:
+        self.scraped.append(user_input)
+        time.sleep(0.05)
+        return ResultSet.from_items([{'index': 1, 'title': f'{user_input} 1', 'price_dollars': 10.0,
+                                      'rating_avg': 4.5, 'item_url': 'https://ebay.com/itm/1'}])
+
+    @staticmethod
+    def scrape_unreachable(user_input: str) -> ResultSet:
+        raise requests.ConnectionError('unreachable')
+
+    def post(self, body):
+        return self.client.post('/api/queries/', body if isinstance(body, str) else json.dumps(body),
+                                content_type='application/json')
+
+    def get_lines(self, queries: list[dict]) -> list[dict]:
+        response = self.post({'queries': queries})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.endswith('\n'))
+        return [json.loads(line) for line in content.splitlines()]
+
+    @override_settings(SCRAPER_API={'MAX_QUERIES': 2})
+    def test_invalid_batches_are_rejected(self) -> None:
+        for body, error_key in (('not json', 'body'), ({'query': []}, 'body'), ({'queries': []}, 'queries'),
+                                ({'queries': [{'website': 'ebay', 'query': 'iphone'}] * 3}, 'queries'),
+                                ({'queries': {'website': 'ebay'}}, 'queries')):
+            with self.subTest(body=body):
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(error_key, response.json()['errors'])
+        response = self.post({'queries': [{'website': 'ebay', 'query': 'iphone'}, {'website': 'fnac', 'query': 'x'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']['queries']), ['1'])
+        self.assertEqual(self.scraped, [])
+
+    def test_repeated_queries_are_scraped_once(self) -> None:
+        lines = self.get_lines([{'website': 'ebay', 'query': 'iphone'}, {'website': 'ebay', 'query': 'iPhone '},
+                                {'website': 'ebay', 'query': 'ipad'}])
+        self.assertEqual(sorted(self.scraped), ['ipad', 'iphone'])
+        results, summary = lines[:-1], lines[-1]
+        self.assertEqual(sorted(result['query'] for result in results), ['iPhone', 'ipad', 'iphone'])
+        self.assertEqual(set(summary), {'summary'})
+        self.assertEqual(summary['summary']['done'], 3)
+        self.assertEqual(summary['summary']['failed'], 0)
+
+    def test_result_lines(self) -> None:
+        failed, done, summary = sorted(
+            self.get_lines([{'website': 'ebay', 'query': 'iphone'}, {'website': 'amazon', 'query': 'iphone'}]),
+            key=lambda line: line.get('website', 'z'),
+        )
+        self.assertEqual({key: failed[key] for key in ('website', 'query', 'status', 'cached', 'stale')},
+                         {'website': 'amazon', 'query': 'iphone', 'status': 'failed', 'cached': False,
+                          'stale': False})
+        self.assertIn('unreachable', failed['error'])
+        self.assertEqual(done['status'], 'done')
+        self.assertIsInstance(done['duration_ms'], float)
+        # Only the RESULT_COLUMNS of the results are sent
+        self.assertEqual(done['results'], [{'index': 1, 'title': 'iphone 1', 'price_dollars': 10.0,
+                                            'rating_avg': 4.5, 'item_url': 'https://ebay.com/itm/1'}])
+        self.assertEqual((summary['summary']['done'], summary['summary']['failed']), (1, 1))
@@ -1,7 +1,15 @@
 from django.urls import path
 
-from .views import process_input
+from .views import bulk_queries, job_status, metrics_view, process_input, process_input_async, results, \
+    stream_results, submit_job
 
 urlpatterns = [
     path('', process_input, name='process_input'),
+    path('async/', process_input_async, name='process_input_async'),
+    path('jobs/', submit_job, name='submit_job'),
+    path('jobs/<str:job_id>/', job_status, name='job_status'),
+    path('results/', results, name='results'),
+    path('stream/', stream_results, name='stream_results'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('api/queries/', bulk_queries, name='bulk_queries'),
 ]
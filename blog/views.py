@@ -1,7 +1,21 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST, require_safe
 
+from .api import InvalidQueriesError, iter_ndjson, parse_queries
 from .forms import UserInputForm
-from .src import main
+from .fragments import get_cache_control, get_etag, render_results_table
+from .jobs import get_job_queue
+from .serializers import item_to_record, output_to_records
+from .src.scripts import metrics
+from .warming import record_query
 
 
 def process_input(request):
@@ -11,15 +25,175 @@ def process_input(request):
         if form.is_valid():
             website_name = form.cleaned_data['option']
             user_input = form.cleaned_data['text_input']
+            record_query(website_name, user_input)
+            from .src import main
+
             output = main.main(user_input, website_name)
-            context = {'form': UserInputForm(),
-                       'output': output.to_dict(orient='records'),
-                       'scroll_position': scroll_position}
+            with metrics.timer('render', website=website_name):
+                context = {'form': UserInputForm(),
+                           'results_table': render_results_table(output),
+                           'scroll_position': scroll_position}
 
-            return render(request, 'blog/index.html', context)
-        else:
-            output = None
+                return render(request, 'blog/index.html', context)
+        return render(request, 'blog/index.html', {'form': form, 'scroll_position': scroll_position})
     else:
         form = UserInputForm()
         return render(request, 'blog/index.html',
                       {'form': form, 'scroll_position': scroll_position})
+
+
+async def process_input_async(request):
+    """
+    Asynchronous version of process_input, for ASGI servers: while a query is scraped, the worker
+    serves other requests instead of holding a thread. Templates are rendered in a thread, their
+    fragments being read from the cache.
+    """
+    context = {'form_url': reverse('process_input_async'),
+               'scroll_position': await sync_to_async(request.session.get)('scrollPosition', 0)}
+    form = UserInputForm(request.POST if request.method == 'POST' else None)
+    if not form.is_valid():
+        return await sync_to_async(render)(request, 'blog/index.html',
+                                           {**context, 'form': form if form.is_bound else UserInputForm()})
+    website_name = form.cleaned_data['option']
+    user_input = form.cleaned_data['text_input']
+    await sync_to_async(record_query)(website_name, user_input)
+    from .src import main
+
+    output = await main.amain(user_input, website_name)
+    with metrics.timer('render', website=website_name):
+        results_table = await sync_to_async(render_results_table)(output)
+        return await sync_to_async(render)(request, 'blog/index.html', {**context, 'form': UserInputForm(),
+                                                                         'results_table': results_table})
+
+
+@require_safe
+def results(request):
+    """
+    Returns the table of results of a query (?option=ebay&text_input=iphone), with a strong ETag: a
+    conditional request for results which did not change gets a 304 response, without rendering them.
+    Cached results are served without scraping the website, and the ETag of fresh cached results is
+    validated before computing anything. If the website cannot be scraped (and there are no stale
+    results), the response is a 502, or a 503 if its host is not requested for now, never cached.
+    """
+    form = UserInputForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    website_name = form.cleaned_data['option']
+    user_input = form.cleaned_data['text_input'].strip()
+    if not user_input:
+        return JsonResponse({'errors': {'text_input': ['This field is required.']}}, status=400)
+    from .src import main
+    from .src.scripts.scraper import SCRAPING_ERRORS
+    from .src.scripts.throttling import HostUnavailableError
+
+    cached = main.peek(user_input, website_name)
+    if cached is not None:
+        response = get_conditional_response(request, etag=quote_etag(get_etag(cached)))
+        if response is not None:
+            metrics.increment('scraping_results_tables_total', result='not_modified')
+            return set_results_headers(response, cached)
+    try:
+        output = main.main(user_input, website_name)
+    except SCRAPING_ERRORS as error:
+        metrics.increment('scraping_results_tables_total', result='failed')
+        response = JsonResponse({'error': str(error)},
+                                status=503 if isinstance(error, HostUnavailableError) else 502)
+        patch_cache_control(response, no_cache=True)
+        return response
+    response = get_conditional_response(request, etag=quote_etag(get_etag(output)))
+    if response is None:
+        with metrics.timer('render', website=website_name):
+            response = HttpResponse(render_results_table(output))
+    else:
+        metrics.increment('scraping_results_tables_total', result='not_modified')
+    return set_results_headers(response, output)
+
+
+def set_results_headers(response: HttpResponse, output) -> HttpResponse:
+    """Sets the ETag and Cache-Control headers of a response of the results view."""
+    response['ETag'] = quote_etag(get_etag(output))
+    patch_cache_control(response, **get_cache_control(output))
+    return response
+
+
+@require_POST
+def submit_job(request):
+    """Enqueues the scraping of the submitted query and returns the id of its job."""
+    form = UserInputForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    record_query(form.cleaned_data['option'], form.cleaned_data['text_input'])
+    job = get_job_queue().submit(website=form.cleaned_data['option'],
+                                 user_input=form.cleaned_data['text_input'])
+    return JsonResponse({'id': job.id, 'status': job.status,
+                         'status_url': reverse('job_status', args=[job.id])}, status=202)
+
+
+@require_GET
+def job_status(request, job_id):
+    """Returns the status of a job, and its output once it is done."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise Http404(f'No job with id {job_id}')
+    return JsonResponse(job.to_dict())
+
+
+def format_event(event: str, data) -> str:
+    """Formats a server-sent event with JSON data."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@require_GET
+def stream_results(request):
+    """
+    Streams the results of a query as server-sent events: an 'item' event for each scraped item,
+    then a 'result' event with the ranked items (or a 'failed' event).
+    """
+    form = UserInputForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    website_name = form.cleaned_data['option']
+    user_input = form.cleaned_data['text_input']
+    record_query(website_name, user_input)
+    from .src import main
+
+    def events():
+        try:
+            for event, data in main.stream(user_input, website_name):
+                with metrics.timer('render', website=website_name):
+                    if event == 'item':
+                        message = format_event('item', item_to_record(data))
+                    else:
+                        message = format_event('result', output_to_records(data))
+                yield message
+        except Exception as error:
+            yield format_event('failed', {'error': str(error)})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_POST
+def bulk_queries(request):
+    """
+    Runs a batch of queries, sent as JSON: {"queries": [{"website": "ebay", "query": "iphone"}, ...]}.
+    Streams a JSON line with the ranked rows, duration and cache status of each query as soon as it
+    is finished, then a summary line.
+    """
+    try:
+        queries = parse_queries(request.body)
+    except InvalidQueriesError as error:
+        return JsonResponse({'errors': error.errors}, status=400)
+    response = StreamingHttpResponse(iter_ndjson(queries), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def metrics_view(request):
+    """Exposes the metrics of the process in the Prometheus text format."""
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
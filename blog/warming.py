@@ -0,0 +1,261 @@
+"""
+Warming of the result cache: queries submitted on the page are recorded as UserInput rows (by a
+background thread), and the most popular ones are scraped again in background before their cached
+results expire, so that users running them get cache hits. The warmer runs in a thread of the web
+process, or in its own process with the warm_cache command. In both cases, results must be cached
+in a Django cache shared by the workers: the in-process warmer is not started with the 'memory'
+backend.
+"""
+import logging
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import UserInput
+from .src.scripts import metrics
+from .src.scripts.result_cache import MemoryCacheBackend, get_result_cache, normalize_query
+
+logger = logging.getLogger(__name__)
+
+metrics.registry.describe('scraping_cache_warmer_refreshes_total',
+                          "Queries scraped again by the cache warmer, by result.")
+metrics.registry.describe('scraping_dropped_queries_total',
+                          "Submitted queries not recorded because the recorder was full.")
+
+
+def record_query(website: str, user_input: str) -> None:
+    """
+    Records a query submitted on the page (written in background by the QueryRecorder), and starts
+    the in-process cache warmer if it is enabled.
+    :param website: name of the website chosen in the form
+    :param user_input: user input given from website's form
+    """
+    get_query_recorder().record(website, user_input)
+    warmer = get_cache_warmer()
+    if warmer is not None and getattr(settings, 'SCRAPER_CACHE_WARMER', {}).get('IN_PROCESS', True):
+        warmer.start()
+
+
+class QueryRecorder:
+    """
+    Writes submitted queries as UserInput rows in a background thread, in bulk, so that requests do
+    not wait for the database. When max_pending queries wait to be written, new ones are dropped.
+    """
+
+    def __init__(self, max_pending: int = 1000) -> None:
+        """
+        Constructor of QueryRecorder class.
+        :param max_pending: maximum number of queries waiting to be written
+        """
+        self.queue: queue.Queue[UserInput] = queue.Queue(maxsize=max_pending)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def record(self, website: str, user_input: str) -> None:
+        """
+        Enqueues a submitted query, to be written in background.
+        :param website: name of the website chosen in the form
+        :param user_input: user input given from website's form
+        """
+        self._start()
+        try:
+            self.queue.put_nowait(UserInput(website=website.lower(), text_input=user_input))
+        except queue.Full:
+            metrics.increment('scraping_dropped_queries_total')
+            logger.warning("Query recorder is full, query '%s' dropped", user_input)
+
+    def flush(self) -> None:
+        """Blocks until all enqueued queries are written."""
+        self.queue.join()
+
+    def _start(self) -> None:
+        """Starts the writing thread on first call."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='query-recorder', daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        """Writes enqueued queries, the ones waiting at the same time being inserted by a single query."""
+        while True:
+            queries = [self.queue.get()]
+            while True:
+                try:
+                    queries.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                close_old_connections()
+                UserInput.objects.bulk_create(queries)
+            except DatabaseError as error:
+                logger.warning("%d queries not recorded: %s", len(queries), error)
+            finally:
+                for _ in queries:
+                    self.queue.task_done()
+
+
+_query_recorder: QueryRecorder | None = None
+_query_recorder_lock = threading.Lock()
+
+
+def get_query_recorder() -> QueryRecorder:
+    """Returns the QueryRecorder of the process, created on first call."""
+    global _query_recorder
+    if _query_recorder is None:
+        with _query_recorder_lock:
+            if _query_recorder is None:
+                config = getattr(settings, 'SCRAPER_CACHE_WARMER', {})
+                _query_recorder = QueryRecorder(max_pending=config.get('MAX_PENDING_QUERIES', 1000))
+    return _query_recorder
+
+
+class CacheWarmer:
+    """
+    Refreshes the cached results of the top_n queries submitted during the last window seconds,
+    when they are missing or expire within refresh_margin seconds. Queries on all websites count
+    for each website (merged results are computed from the results of each one).
+    """
+
+    def __init__(self, top_n: int = 20, max_workers: int = 2, interval: float = 60,
+                 refresh_margin: float = 180, window: float = 7 * 24 * 3600) -> None:
+        """
+        Constructor of CacheWarmer class.
+        :param top_n: number of popular queries kept warm
+        :param max_workers: number of queries scraped at the same time
+        :param interval: number of seconds between two checks of the popular queries
+        :param refresh_margin: a cached result is refreshed when it expires within this number of
+            seconds (it should be greater than interval plus the duration of a scraping)
+        :param window: number of seconds during which submitted queries are counted
+        """
+        self.top_n = top_n
+        self.max_workers = max_workers
+        self.interval = interval
+        self.refresh_margin = refresh_margin
+        self.window = window
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def get_popular_queries(self) -> list[tuple[str, str]]:
+        """
+        Returns the most submitted queries of the window, the most popular first.
+        :return: list of (website, normalized user input) tuples
+        """
+        from .src import main
+
+        since = timezone.now() - timedelta(seconds=self.window)
+        rows = (UserInput.objects.filter(created_at__gte=since).exclude(website='')
+                .values('website', 'text_input').annotate(nb_queries=Count('id')))
+        counts: Counter[tuple[str, str]] = Counter()
+        for row in rows:
+            query = normalize_query(row['text_input'])
+            if not query:
+                continue
+            websites = main.SCRAPING_FUNCTIONS if row['website'] == main.ALL_WEBSITES else [row['website']]
+            for website in websites:
+                if website in main.SCRAPING_FUNCTIONS:
+                    counts[website, query] += row['nb_queries']
+        return [query for query, _ in counts.most_common(self.top_n)]
+
+    def needs_refresh(self, website: str, query: str) -> bool:
+        """True if the cached result of a query is missing or expires within refresh_margin seconds."""
+        expires_in = get_result_cache().get_expiration(website, query)
+        return expires_in is None or expires_in <= self.refresh_margin
+
+    def refresh(self, website: str, query: str) -> bool:
+        """
+        Scrapes a query again and caches its result.
+        :return: True if the query was scraped, False if the scraping failed
+        """
+        from .src import main
+
+        try:
+            main.refresh(query, website)
+        except Exception as error:
+            metrics.increment('scraping_cache_warmer_refreshes_total', website=website, result='failed')
+            logger.warning("Cache of %s not refreshed for '%s': %s", website, query, error)
+            return False
+        metrics.increment('scraping_cache_warmer_refreshes_total', website=website, result='refreshed')
+        logger.debug("Cache of %s refreshed for '%s'", website, query)
+        return True
+
+    def run_once(self) -> int:
+        """
+        Refreshes the popular queries which need it, max_workers at a time.
+        :return: number of refreshed queries
+        """
+        queries = [query for query in self.get_popular_queries() if self.needs_refresh(*query)]
+        if not queries:
+            return 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='cache-warmer') as executor:
+            return sum(executor.map(lambda query: self.refresh(*query), queries))
+
+    def run(self) -> None:
+        """Refreshes the popular queries every interval seconds, until stop is called."""
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                self.run_once()
+            except DatabaseError as error:
+                logger.warning("Popular queries not loaded: %s", error)
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        """Runs the warmer in a background thread of the process, if it is not running yet."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run, name='cache-warmer', daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background thread after its current refreshes."""
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+
+def create_cache_warmer(config: dict) -> CacheWarmer:
+    """Creates a CacheWarmer from a SCRAPER_CACHE_WARMER-like dict."""
+    return CacheWarmer(top_n=config.get('TOP_N', 20), max_workers=config.get('MAX_WORKERS', 2),
+                       interval=config.get('INTERVAL', 60), refresh_margin=config.get('REFRESH_MARGIN', 180),
+                       window=config.get('WINDOW', 7 * 24 * 3600))
+
+
+_cache_warmer: CacheWarmer | None = None
+_cache_warmer_lock = threading.Lock()
+_memory_backend_warned = False
+
+
+def get_cache_warmer() -> CacheWarmer | None:
+    """
+    Returns the CacheWarmer of the process, created from the SCRAPER_CACHE_WARMER setting on first
+    call, or None if the warmer is disabled or if results are cached in the memory of each process.
+    """
+    global _cache_warmer, _memory_backend_warned
+    config = getattr(settings, 'SCRAPER_CACHE_WARMER', {})
+    if not config.get('ENABLED', False):
+        return None
+    if isinstance(get_result_cache().backend, MemoryCacheBackend):
+        # Each worker would scrape the popular queries again for its own cache
+        if not _memory_backend_warned:
+            _memory_backend_warned = True
+            logger.warning("Cache warmer disabled: SCRAPER_RESULT_CACHE must use the 'django' backend")
+        return None
+    if _cache_warmer is None:
+        with _cache_warmer_lock:
+            if _cache_warmer is None:
+                _cache_warmer = create_cache_warmer(config)
+    return _cache_warmer